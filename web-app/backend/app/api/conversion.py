@@ -4,9 +4,10 @@
 """
 import os
 import shutil
+import asyncio
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.responses import FileResponse
-from typing import List
+from typing import List, Optional
 from app.models.data_models import (
     ConversionResult, BatchConversionResult, ConversionStatus
 )
@@ -14,8 +15,15 @@ from pydantic import BaseModel
 from app.services.conversion_service import ConversionService
 from app.services.api_service import APIService
 from app.services.enhanced_conversion_service import EnhancedConversionService
-from app.api.websocket import manager
+from app.api.websocket import manager, StreamRelay
 from app.services.cancel_manager import cancel_manager
+from app.services.preview_service import preview_service
+from app.services.image_triage import image_triage
+from app.services.llm_cache import llm_cache
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_usage import llm_usage
+from app.services.progressive_enrichment import progressive_enrichment
+from app.services.range_selector import RangeSelector
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,6 +39,53 @@ class URLConversionRequest(BaseModel):
     url: str
     use_api_enhancement: bool = False
 
+def parse_range_selector(pages: Optional[str], sheets: Optional[str]) -> Optional[RangeSelector]:
+    """クエリパラメータの範囲指定を解析（不正な場合は400）"""
+    try:
+        return RangeSelector.parse(pages, sheets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"範囲指定が不正です: {str(e)}")
+
+def _remove_quietly(path: str):
+    """一時ファイルを削除（存在しなくてもエラーにしない）"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _retain_upload(upload_path: str, conversion_id: str) -> str:
+    """
+    段階的モードの第2段階用にアップロードファイルをジョブ専用の場所へ移動
+    
+    第2段階は数分かかることがあり、その間に同名ファイルがアップロードされると
+    ./uploads/{ファイル名} は上書き・削除されるため、変換IDのディレクトリに移す
+    （ファイル名は変えないので変換結果は第1段階と一致する）
+    
+    Args:
+        upload_path: 保存済みのアップロードファイル
+        conversion_id: 変換ID
+        
+    Returns:
+        str: 移動後のパス
+    """
+    job_dir = os.path.join("./uploads", f".enrich_{conversion_id}")
+    os.makedirs(job_dir, exist_ok=True)
+    job_path = os.path.join(job_dir, os.path.basename(upload_path))
+    os.replace(upload_path, job_path)
+    return job_path
+
+def _release_upload(job_path: str):
+    """_retain_upload で移動したファイルとそのディレクトリを削除"""
+    _remove_quietly(job_path)
+    try:
+        os.rmdir(os.path.dirname(job_path))
+    except OSError:
+        pass
+
+def _enrichment_output(conversion_id: str) -> str:
+    """段階的モードの第2段階の出力ファイル名（保存済みの結果は上書きせず、後からセクション単位で反映）"""
+    return f".enrich_{conversion_id}.md"
+
 class EnhancedConversionRequest(BaseModel):
     """Enhanced conversion request with AI mode"""
     use_ai_mode: bool = False
@@ -40,6 +95,9 @@ async def upload_and_convert(
     file: UploadFile = File(...),
     use_api_enhancement: bool = False,
     use_ai_mode: bool = False,
+    pages: Optional[str] = None,
+    sheets: Optional[str] = None,
+    progressive: bool = False,
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
@@ -48,10 +106,16 @@ async def upload_and_convert(
     Args:
         file: アップロードするファイル
         use_api_enhancement: OpenAI APIによる強化を使用するか
+        pages: 変換するPDFページ/PPTXスライド（例: "1-10,15"）
+        sheets: 変換するXLSXシート（シート名または番号、例: "Summary,3"）
+        progressive: AI処理を後回しにし、AIなしの結果をすぐ返すか
+            （AI結果は保存済みMarkdownをセクション単位で更新し、WebSocketの "enrichment" で通知）
     
     Returns:
         ConversionResult: 変換結果
     """
+    selector = parse_range_selector(pages, sheets)
+    
     # ファイル形式の確認
     if not conversion_service.is_supported_format(file.filename):
         raise HTTPException(
@@ -87,19 +151,60 @@ async def upload_and_convert(
         # Use the pre-generated conversion_id for consistency
         await manager.send_progress(conversion_id, progress, status, step, filename or file.filename)
     
-    result = await conversion_service.convert_file(
-        upload_path, 
-        output_filename, 
-        use_ai_mode=use_ai_mode,
-        progress_callback=progress_callback
-    )
+    # 段階的モードでは第1段階をAIなしで変換（体感待ち時間は通常モードと同じ）
+    progressive = progressive and (use_ai_mode or use_api_enhancement)
+    
+    # LLM使用量はこの変換IDに集計
+    with llm_usage.track(conversion_id, file.filename) as usage:
+        result = await conversion_service.convert_file(
+            upload_path, 
+            output_filename, 
+            use_ai_mode=use_ai_mode and not progressive,
+            progress_callback=progress_callback,
+            selector=selector
+        )
     
     # Update result with our conversion_id
     if result:
         result.id = conversion_id
+        result.llm_usage = usage.summary()
         # Send final progress
         await manager.send_progress(conversion_id, 100, "completed", "変換完了", file.filename)
     
+    if progressive and result.status == ConversionStatus.COMPLETED:
+        previous_usage = result.llm_usage
+        job_upload_path = _retain_upload(upload_path, conversion_id)
+        
+        async def enrich() -> Optional[str]:
+            # 第2段階: AI変換とAPI強化（生成中の出力は type: "stream" で配信）
+            relay = StreamRelay(manager, conversion_id)
+            try:
+                with llm_usage.track(conversion_id, file.filename, previous=previous_usage):
+                    if use_ai_mode:
+                        temp_output = _enrichment_output(conversion_id)
+                        ai_result = await conversion_service.convert_file(
+                            job_upload_path, temp_output, save_to_db=False, use_ai_mode=True, selector=selector
+                        )
+                        _remove_quietly(os.path.join("./converted", temp_output))
+                        if ai_result.status != ConversionStatus.COMPLETED:
+                            return None
+                        content = ai_result.markdown_content
+                    else:
+                        content = result.markdown_content
+                    if use_api_enhancement:
+                        content = await api_service.enhance_markdown(content, on_delta=relay.write)
+                    return content
+            finally:
+                await relay.close()
+        
+        # アップロードファイルは第2段階の終了後に削除
+        progressive_enrichment.start(
+            conversion_id, os.path.join("./converted", output_filename), enrich,
+            manager.send_enrichment, cleanup=lambda: _release_upload(job_upload_path)
+        )
+        result.enrichment_pending = True
+        return result
+    
     # API強化が有効な場合
     if use_api_enhancement and result.status == ConversionStatus.COMPLETED:
         try:
@@ -107,7 +212,14 @@ async def upload_and_convert(
             with open(output_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
-            enhanced_content = await api_service.enhance_markdown(content)
+            # 強化結果は生成されながらWebSocketで配信（type: "stream"）
+            relay = StreamRelay(manager, conversion_id)
+            try:
+                with llm_usage.track(conversion_id, file.filename, previous=result.llm_usage) as usage:
+                    enhanced_content = await api_service.enhance_markdown(content, on_delta=relay.write)
+                result.llm_usage = usage.summary()
+            finally:
+                await relay.close()
             
             with open(output_path, 'w', encoding='utf-8') as f:
                 f.write(enhanced_content)
@@ -124,6 +236,8 @@ async def batch_convert(
     files: List[UploadFile] = File(...),
     use_api_enhancement: bool = False,
     use_ai_mode: bool = False,
+    pages: Optional[str] = None,
+    sheets: Optional[str] = None,
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
@@ -132,10 +246,13 @@ async def batch_convert(
     Args:
         files: アップロードするファイルのリスト
         use_api_enhancement: OpenAI APIによる強化を使用するか
+        pages: 各ファイルで変換するPDFページ/PPTXスライド
+        sheets: 各ファイルで変換するXLSXシート
     
     Returns:
         BatchConversionResult: バッチ変換結果
     """
+    selector = parse_range_selector(pages, sheets)
     upload_paths = []
     
     # すべてのファイルをアップロード
@@ -152,7 +269,7 @@ async def batch_convert(
             logger.error(f"ファイルアップロードエラー: {e}")
     
     # ファイルを一括変換
-    results = await conversion_service.batch_convert(upload_paths, use_ai_mode=use_ai_mode)
+    results = await conversion_service.batch_convert(upload_paths, use_ai_mode=use_ai_mode, selector=selector)
     
     # API強化が有効な場合
     if use_api_enhancement:
@@ -163,7 +280,9 @@ async def batch_convert(
                     with open(output_path, 'r', encoding='utf-8') as f:
                         content = f.read()
                     
-                    enhanced_content = await api_service.enhance_markdown(content)
+                    with llm_usage.track(result.id, result.input_file, previous=result.llm_usage) as usage:
+                        enhanced_content = await api_service.enhance_markdown(content)
+                    result.llm_usage = usage.summary()
                     
                     with open(output_path, 'w', encoding='utf-8') as f:
                         f.write(enhanced_content)
@@ -207,6 +326,60 @@ async def download_converted_file(filename: str):
         media_type="text/markdown"
     )
 
+@router.get("/preview/{preview_id}")
+async def get_image_preview(preview_id: str, size: int = 200, format: str = "webp"):
+    """
+    抽出画像のサムネイルを取得（初回リクエスト時に生成してキャッシュ）
+    
+    Args:
+        preview_id: 変換結果に含まれるプレビューID
+        size: 長辺のピクセル数（128/200/400/800に切り上げ）
+        format: webp または jpeg
+    
+    Returns:
+        FileResponse: サムネイル画像
+    """
+    try:
+        thumbnail = await asyncio.to_thread(preview_service.get_thumbnail, preview_id, size, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not thumbnail:
+        raise HTTPException(status_code=404, detail="プレビューが見つかりません")
+    
+    path, media_type = thumbnail
+    # IDは内容のハッシュなので、同じURLの画像は変わらない
+    return FileResponse(
+        path=path,
+        media_type=media_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+@router.get("/image-triage/stats")
+async def get_image_triage_stats():
+    """画像トリアージの判定件数（skip / ocr / ocr_vision）と閾値を取得"""
+    return image_triage.get_stats()
+
+@router.get("/llm-cache/stats")
+async def get_llm_cache_stats():
+    """LLM応答キャッシュのヒット率・件数・サイズを取得"""
+    return await asyncio.to_thread(llm_cache.get_stats)
+
+@router.get("/llm-gateway/status")
+async def get_llm_gateway_status():
+    """LLMゲートウェイの状態（呼び出し・リトライ・拒否件数、サーキットブレーカー状態）を取得"""
+    return llm_gateway.get_stats()
+
+@router.get("/enrichment/stats")
+async def get_enrichment_stats():
+    """段階的モードのバックグラウンドAI処理の件数・実行中ジョブ数・平均所要時間を取得"""
+    return progressive_enrichment.get_stats()
+
+@router.get("/llm-usage/stats")
+async def get_llm_usage_stats():
+    """LLM使用量の集計（トークン数・レイテンシ・推定コスト、機能別/モデル別、直近のジョブ）を取得"""
+    return llm_usage.get_stats()
+
 @router.get("/supported-formats")
 async def get_supported_formats():
     """サポートされているファイル形式を取得"""
@@ -224,6 +397,8 @@ async def cancel_conversion(conversion_id: str):
         dict: キャンセル結果
     """
     success = cancel_manager.cancel_conversion(conversion_id)
+    # 段階的モードのバックグラウンドAI処理も中止
+    progressive_enrichment.cancel(conversion_id)
     
     # WebSocketでキャンセル通知を送信
     if success:
@@ -263,7 +438,9 @@ async def convert_url(request: URLConversionRequest):
             with open(output_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
-            enhanced_content = await api_service.enhance_markdown(content)
+            with llm_usage.track(result.id, request.url, previous=result.llm_usage) as usage:
+                enhanced_content = await api_service.enhance_markdown(content)
+            result.llm_usage = usage.summary()
             
             with open(output_path, 'w', encoding='utf-8') as f:
                 f.write(enhanced_content)
@@ -278,6 +455,9 @@ async def convert_url(request: URLConversionRequest):
 async def upload_and_convert_enhanced(
     file: UploadFile = File(...),
     use_ai_mode: bool = False,
+    pages: Optional[str] = None,
+    sheets: Optional[str] = None,
+    progressive: bool = False,
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
@@ -286,10 +466,16 @@ async def upload_and_convert_enhanced(
     Args:
         file: File to upload
         use_ai_mode: Enable AI-enhanced conversion mode
+        pages: PDF pages / PPTX slides to convert, e.g. "1-10,15"
+        sheets: XLSX sheet names or positions to convert, e.g. "Summary,3"
+        progressive: Return the result without AI right away and run the AI
+            conversion in the background (sections patched, "enrichment" events)
     
     Returns:
         ConversionResult: Conversion result
     """
+    selector = parse_range_selector(pages, sheets)
+    
     # Check file format
     file_ext = os.path.splitext(file.filename)[1].lower()[1:]
     supported_formats = ['doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'pdf', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 
@@ -316,11 +502,63 @@ async def upload_and_convert_enhanced(
     
     # Convert file with enhanced service
     output_filename = f"{os.path.splitext(file.filename)[0]}.md"
-    result = await enhanced_service.convert_file_enhanced(
-        upload_path, 
-        output_filename,
-        use_ai_mode=use_ai_mode
-    )
+    
+    import uuid
+    conversion_id = str(uuid.uuid4())
+    
+    async def progress_callback(conv_id: str, progress: int, status: str, step: str, filename: str):
+        # Use the pre-generated conversion_id for consistency
+        await manager.send_progress(conversion_id, progress, status, step, filename or file.filename)
+    
+    progressive = progressive and use_ai_mode
+    
+    # AI説明は生成されながらWebSocketで配信（type: "stream"）
+    relay = StreamRelay(manager, conversion_id) if use_ai_mode and not progressive else None
+    try:
+        # LLM使用量はこの変換IDに集計
+        with llm_usage.track(conversion_id, file.filename) as usage:
+            result = await enhanced_service.convert_file_enhanced(
+                upload_path, 
+                output_filename,
+                use_ai_mode=use_ai_mode and not progressive,
+                progress_callback=progress_callback,
+                selector=selector,
+                on_delta=relay.write if relay else None
+            )
+    finally:
+        if relay:
+            await relay.close()
+    
+    if result:
+        result.id = conversion_id
+        result.llm_usage = usage.summary()
+        await manager.send_progress(conversion_id, 100, "completed", "変換完了", file.filename)
+    
+    if progressive and result.status == ConversionStatus.COMPLETED:
+        previous_usage = result.llm_usage
+        job_upload_path = _retain_upload(upload_path, conversion_id)
+        
+        async def enrich() -> Optional[str]:
+            # Second phase: the same conversion with AI, streamed while it is generated
+            relay = StreamRelay(manager, conversion_id)
+            try:
+                with llm_usage.track(conversion_id, file.filename, previous=previous_usage):
+                    temp_output = _enrichment_output(conversion_id)
+                    ai_result = await enhanced_service.convert_file_enhanced(
+                        job_upload_path, temp_output, use_ai_mode=True, selector=selector, on_delta=relay.write
+                    )
+                    _remove_quietly(os.path.join("./converted", temp_output))
+                    return ai_result.markdown_content if ai_result.status == ConversionStatus.COMPLETED else None
+            finally:
+                await relay.close()
+        
+        # The upload is removed once the second phase is done
+        progressive_enrichment.start(
+            conversion_id, os.path.join("./converted", output_filename), enrich,
+            manager.send_enrichment, cleanup=lambda: _release_upload(job_upload_path)
+        )
+        result.enrichment_pending = True
+        return result
     
     # Clean up uploaded file in background
     background_tasks.add_task(os.remove, upload_path)
@@ -330,7 +568,8 @@ async def upload_and_convert_enhanced(
 @router.post("/convert-youtube-enhanced", response_model=ConversionResult)
 async def convert_youtube_enhanced(
     url: str,
-    use_ai_mode: bool = False
+    use_ai_mode: bool = False,
+    progressive: bool = False
 ):
     """
     Convert YouTube URL with optional AI enhancement
@@ -338,6 +577,8 @@ async def convert_youtube_enhanced(
     Args:
         url: YouTube URL to convert
         use_ai_mode: Enable AI-enhanced description
+        progressive: Return the transcript right away and add the AI analysis
+            in the background (sections patched, "enrichment" events)
     
     Returns:
         ConversionResult: Conversion result
@@ -355,15 +596,47 @@ async def convert_youtube_enhanced(
         use_ai_mode=use_ai_mode
     )
     
+    if progressive and use_ai_mode and result.status == ConversionStatus.COMPLETED:
+        base_content, previous_usage = result.markdown_content, result.llm_usage
+        
+        async def enrich() -> Optional[str]:
+            relay = StreamRelay(manager, result.id)
+            try:
+                with llm_usage.track(result.id, url, previous=previous_usage):
+                    return await asyncio.to_thread(
+                        enhanced_service.llm_client.enhance_document_content,
+                        base_content,
+                        "youtube_video",
+                        [],
+                        on_delta=relay.write
+                    )
+            finally:
+                await relay.close()
+        
+        progressive_enrichment.start(
+            result.id, os.path.join("./converted", output_filename), enrich, manager.send_enrichment
+        )
+        result.enrichment_pending = True
+        return result
+    
     # Add AI-enhanced metadata if enabled
     if use_ai_mode and result.status == ConversionStatus.COMPLETED:
         try:
-            # Enhance with AI analysis
-            enhanced_content = enhanced_service.llm_client.enhance_document_content(
-                result.markdown_content,
-                "youtube_video",
-                []
-            )
+            # Enhance with AI analysis, streamed over WebSocket under the result id
+            await manager.send_progress(result.id, 90, "processing", "AI分析中...", url)
+            relay = StreamRelay(manager, result.id)
+            try:
+                with llm_usage.track(result.id, url, previous=result.llm_usage) as usage:
+                    enhanced_content = await asyncio.to_thread(
+                        enhanced_service.llm_client.enhance_document_content,
+                        result.markdown_content,
+                        "youtube_video",
+                        [],
+                        on_delta=relay.write
+                    )
+                result.llm_usage = usage.summary()
+            finally:
+                await relay.close()
             result.markdown_content = enhanced_content
             
             # Save enhanced version
@@ -2,10 +2,13 @@
 WebSocket endpoint for real-time progress updates
 """
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Dict, Set, List, Any
+import os
+import time
 import asyncio
 import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -99,6 +102,93 @@ class ConnectionManager:
         # Clear progress data for completed conversion
         self.progress_data.pop(conversion_id, None)
 
+    async def send_stream_chunk(self, conversion_id: str, section: str, delta: str, done: bool = False):
+        """Send a piece of streamed LLM output (AI enhancement, image description, ...)"""
+        message = {
+            "type": "stream",
+            "conversion_id": conversion_id,
+            "section": section,
+            "delta": delta,
+            "done": done
+        }
+        
+        disconnected = set()
+        for connection in self.active_connections:
+            try:
+                await connection.send_json(message)
+            except Exception as e:
+                logger.error(f"Error sending stream chunk: {e}")
+                disconnected.add(connection)
+        
+        for conn in disconnected:
+            self.disconnect(conn)
+
+    async def send_enrichment(self, event: Dict[str, Any]):
+        """Send a section patch or the final document of a background AI enrichment"""
+        message = {"type": "enrichment", **event}
+        
+        disconnected = set()
+        for connection in self.active_connections:
+            try:
+                await connection.send_json(message)
+            except Exception as e:
+                logger.error(f"Error sending enrichment: {e}")
+                disconnected.add(connection)
+        
+        for conn in disconnected:
+            self.disconnect(conn)
+
+
+class StreamRelay:
+    """Forwards streamed LLM output of one conversion to the WebSocket clients
+    
+    Create it on the event loop, then pass ``write`` as the ``on_delta``
+    callback of the services; it is called from worker threads. Deltas are
+    coalesced per section (env: STREAM_FLUSH_MS / STREAM_FLUSH_CHARS) so
+    clients get a few messages per second instead of one per token. ``close``
+    sends what is left and marks every section done.
+    """
+    
+    def __init__(self, manager: "ConnectionManager", conversion_id: str):
+        self.manager = manager
+        self.conversion_id = conversion_id
+        self.loop = asyncio.get_running_loop()
+        self.flush_seconds = int(os.getenv("STREAM_FLUSH_MS", "100")) / 1000
+        self.flush_chars = int(os.getenv("STREAM_FLUSH_CHARS", "200"))
+        self._buffers: Dict[str, List[str]] = {}
+        self._flushed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def write(self, section: str, delta: str):
+        """Queue a delta of a section (worker threads only, never the event loop thread)"""
+        with self._lock:
+            buffer = self._buffers.setdefault(section, [])
+            buffer.append(delta)
+            now = time.monotonic()
+            if (now - self._flushed_at.get(section, 0.0) < self.flush_seconds
+                    and sum(len(part) for part in buffer) < self.flush_chars):
+                return
+            text = "".join(buffer)
+            buffer.clear()
+            self._flushed_at[section] = now
+            # Send while holding the lock so the deltas of a section stay in order
+            future = asyncio.run_coroutine_threadsafe(
+                self.manager.send_stream_chunk(self.conversion_id, section, text), self.loop
+            )
+        try:
+            future.result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Stream chunk not delivered: {e}")
+    
+    async def close(self):
+        """Send remaining deltas and mark all sections done"""
+        with self._lock:
+            pending = {section: "".join(buffer) for section, buffer in self._buffers.items()}
+            self._buffers.clear()
+        for section, text in pending.items():
+            await self.manager.send_stream_chunk(self.conversion_id, section, text, done=True)
+
+
 # Global connection manager instance
 manager = ConnectionManager()
 
@@ -6,6 +6,7 @@ from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
+import asyncio
 import logging
 try:
     # Render.com環境での絶対インポート
@@ -13,12 +14,14 @@ try:
     from app.api.websocket import websocket_endpoint
     from app.services.config_manager import ConfigManager
     from app.services.conversion_service import ConversionService
+    from app.services.openai_client_factory import openai_client_factory
 except ImportError:
     # ローカル環境での相対インポート
     from api import conversion, settings, health
     from api.websocket import websocket_endpoint
     from services.config_manager import ConfigManager
     from services.conversion_service import ConversionService
+    from services.openai_client_factory import openai_client_factory
 
 # ログレベルの設定
 logging.basicConfig(level=logging.INFO)
@@ -37,6 +40,9 @@ async def lifespan(app: FastAPI):
     os.makedirs("./uploads", exist_ok=True)
     os.makedirs("./converted", exist_ok=True)
     
+    # OpenAIの非同期コネクションプールはこのイベントループで共有する
+    openai_client_factory.bind_loop(asyncio.get_running_loop())
+    
     # データベースサービスの初期化（必要なパッケージがインストールされている場合のみ）
     try:
         # 一時的に無効化
@@ -48,6 +54,7 @@ async def lifespan(app: FastAPI):
     yield
     # 終了時の処理
     # 一時ファイルのクリーンアップなど
+    await openai_client_factory.aclose()
 
 # FastAPIアプリケーションの作成
 app = FastAPI(
@@ -3,7 +3,7 @@
 APIのリクエスト/レスポンスモデルとビジネスロジック用のデータクラス
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
 
@@ -60,6 +60,8 @@ class ConversionResult(BaseModel):
     markdown_content: Optional[str] = Field(None, description="変換されたMarkdownコンテンツ")
     created_at: datetime = Field(default_factory=datetime.now, description="作成日時")
     completed_at: Optional[datetime] = Field(None, description="完了日時")
+    llm_usage: Optional[Dict[str, Any]] = Field(None, description="LLM使用量（トークン数・レイテンシ・推定コスト・キャッシュヒット、機能別/モデル別内訳）")
+    enrichment_pending: bool = Field(False, description="AI処理をバックグラウンドで実行中か（段階的モード、完了はWebSocketで通知）")
 
 class BatchConversionRequest(BaseModel):
     """バッチ変換リクエストモデル"""
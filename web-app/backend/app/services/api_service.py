@@ -3,37 +3,51 @@ OpenAI API統合サービス
 Markdown変換結果の強化処理を実行
 """
 import os
-from typing import Optional
-from openai import OpenAI
+import asyncio
+from typing import Optional, Tuple, Callable
 from dotenv import load_dotenv
 import logging
 
+from .llm_cache import llm_cache
+from .llm_gateway import llm_gateway, LLMUnavailableError
+from .markdown_chunker import split_markdown, DEFAULT_CHUNK_TOKENS
+from .openai_client_factory import openai_client_factory
+
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 class APIService:
     """OpenAI APIを使用したMarkdown強化サービス"""
     
+    # プロンプトのバージョン（変更したら上げる。キャッシュキーに含まれる）
+    ENHANCE_PROMPT_VERSION = 1
+    
     def __init__(self):
-        self.client = None
-        self._initialize_client()
+        # 長文を分割して強化するときの同時リクエスト数
+        self.max_concurrency = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
     
-    def _initialize_client(self):
-        """APIクライアントの初期化"""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            try:
-                self.client = OpenAI(api_key=api_key)
-            except Exception as e:
-                logger.error(f"OpenAI APIクライアント初期化エラー: {e}")
-                self.client = None
+    @property
+    def client(self):
+        """共有OpenAIクライアント（キーの切り替えを反映するため毎回ファクトリから取得）"""
+        try:
+            return openai_client_factory.get_client()
+        except Exception as e:
+            logger.error(f"OpenAI APIクライアント初期化エラー: {e}")
+            return None
     
-    async def enhance_markdown(self, content: str) -> str:
+    async def enhance_markdown(self, content: str,
+                               on_delta: Optional[Callable[[str, str], None]] = None) -> str:
         """
         Markdownコンテンツを強化
         
+        長い文書は見出し・表の境界でチャンクに分割し、共有レート制限の下で
+        並列に強化してから元の順序で連結する（map-reduce）。失敗したチャンクは
+        元の内容のまま残す。
+        
         Args:
             content: 元のMarkdownコンテンツ
+            on_delta: 生成中の出力を受け取るコールバック (section, text)。ワーカースレッドから
+                呼ばれる。section は "enhanced_markdown"、分割時は "enhanced_markdown:番号"
             
         Returns:
             強化されたMarkdownコンテンツ
@@ -42,15 +56,59 @@ class APIService:
             logger.warning("APIクライアントが初期化されていません")
             return content
         
+        chunks = split_markdown(content, DEFAULT_CHUNK_TOKENS)
+        if len(chunks) == 1:
+            return await self._enhance_chunk(content, on_delta=on_delta)
+        
+        logger.info(f"Markdownを{len(chunks)}チャンクに分割して強化します")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def enhance(index: int, chunk: str) -> str:
+            async with semaphore:
+                return await self._enhance_chunk(chunk, part=(index + 1, len(chunks)), on_delta=on_delta)
+        
+        enhanced = await asyncio.gather(*(enhance(i, chunk) for i, chunk in enumerate(chunks)))
+        return "\n\n".join(enhanced)
+    
+    async def _enhance_chunk(self, content: str, part: Optional[Tuple[int, int]] = None,
+                             on_delta: Optional[Callable[[str, str], None]] = None) -> str:
+        """
+        Markdown（またはその一部）を1リクエストで強化
+        
+        Args:
+            content: Markdownコンテンツ
+            part: 分割時の (番号, 総数)。Noneなら文書全体
+            on_delta: 生成中の出力を受け取るコールバック (section, text)
+            
+        Returns:
+            強化されたMarkdown（失敗時は元の内容）
+        """
+        system_prompt = ("あなたはMarkdownドキュメントを改善する専門家です。"
+                         "与えられたMarkdownを、より読みやすく、構造化された形式に改善してください。"
+                         "フォーマットを整え、見出しを適切に配置し、リストや表を最適化してください。")
+        if part:
+            # 連結したときに1つの文書として読めるよう、部分であることを伝える
+            system_prompt += (f"これは長い文書の一部（{part[0]}/{part[1]}）です。"
+                              "見出しレベルを維持し、前置きやまとめを追加せず、この部分だけを改善して返してください。")
+        
         try:
-            response = self.client.chat.completions.create(
+            # 同じ内容の再処理はキャッシュから返す（トークン消費なし）
+            cache_key = llm_cache.make_key("enhance_markdown", self.ENHANCE_PROMPT_VERSION,
+                                           "gpt-3.5-turbo", 4000, llm_cache.hash_text(content), 0.3,
+                                           *(part or ()))
+            section = f"enhanced_markdown:{part[0]}" if part else "enhanced_markdown"
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                if on_delta:
+                    await asyncio.to_thread(on_delta, section, cached)
+                return cached
+            
+            request = dict(
                 model="gpt-3.5-turbo",
                 messages=[
                     {
                         "role": "system",
-                        "content": "あなたはMarkdownドキュメントを改善する専門家です。"
-                                   "与えられたMarkdownを、より読みやすく、構造化された形式に改善してください。"
-                                   "フォーマットを整え、見出しを適切に配置し、リストや表を最適化してください。"
+                        "content": system_prompt
                     },
                     {
                         "role": "user",
@@ -61,9 +119,21 @@ class APIService:
                 temperature=0.3
             )
             
-            enhanced_content = response.choices[0].message.content
+            # レート制限・リトライ待ちでイベントループを止めないようスレッドで実行
+            if on_delta:
+                enhanced_content = await asyncio.to_thread(
+                    llm_gateway.stream, self.client, lambda delta: on_delta(section, delta), feature="enhance_markdown", **request
+                )
+            else:
+                response = await asyncio.to_thread(llm_gateway.complete, self.client, feature="enhance_markdown", **request)
+                enhanced_content = response.choices[0].message.content
+            if enhanced_content:
+                llm_cache.set(cache_key, enhanced_content)
             return enhanced_content if enhanced_content else content
             
+        except LLMUnavailableError:
+            logger.warning("LLMが利用できないため、強化せずに返します")
+            return content
         except Exception as e:
             logger.error(f"Markdown強化エラー: {e}")
             return content
@@ -79,9 +149,12 @@ class APIService:
             (有効性, エラーメッセージ)
         """
         try:
-            test_client = OpenAI(api_key=api_key)
+            # 共有コネクションプール上の一時クライアントで確認（イベントループを止めない）
+            test_client = openai_client_factory.get_client(api_key)
+            if test_client is None:
+                return False, "OpenAIライブラリが利用できません"
             # 簡単なAPIコールでキーの有効性を確認
-            test_client.models.list()
+            await asyncio.to_thread(test_client.models.list)
             return True, None
         except Exception as e:
             error_message = str(e)
@@ -93,9 +166,9 @@ class APIService:
                 return False, f"API接続エラー: {error_message}"
     
     def update_api_key(self, api_key: str):
-        """APIキーを更新"""
+        """APIキーを更新（全サービス共有のクライアントをアトミックに切り替え）"""
         os.environ["OPENAI_API_KEY"] = api_key
-        self._initialize_client()
+        openai_client_factory.rotate(api_key)
     
     def get_api_status(self) -> dict:
         """API接続状態を取得"""
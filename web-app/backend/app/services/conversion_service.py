@@ -3,6 +3,7 @@
 markitdownライブラリを使用してファイルをMarkdown形式に変換
 """
 import os
+import asyncio
 import time
 import uuid
 from typing import Optional, Dict, Any, List
@@ -13,6 +14,9 @@ from .mock_firebase_service import MockFirebaseService
 from .enhanced_conversion_service import EnhancedConversionService
 from .legacy_converter import LegacyConverter
 from .markitdown_ai_service import MarkItDownAIService
+from .scratch_workspace import ScratchWorkspace
+from .range_selector import RangeSelector, create_subset, restore_page_numbers, SUBSET_FORMATS
+from .pdf_text_backend import pdf_text_backend
 import logging
 
 logger = logging.getLogger(__name__)
@@ -59,7 +63,7 @@ class ConversionService:
         #     logger.error(f"Failed to initialize database services: {str(e)}")
         #     self.enable_database = False
     
-    async def convert_file(self, input_path: str, output_filename: str, save_to_db: bool = True, metadata: Optional[Dict[str, Any]] = None, use_ai_mode: bool = False, progress_callback = None) -> ConversionResult:
+    async def convert_file(self, input_path: str, output_filename: str, save_to_db: bool = True, metadata: Optional[Dict[str, Any]] = None, use_ai_mode: bool = False, progress_callback = None, selector: Optional[RangeSelector] = None) -> ConversionResult:
         """
         単一ファイルの変換処理
         
@@ -68,10 +72,42 @@ class ConversionService:
             output_filename: 出力ファイル名
             save_to_db: データベースに保存するかどうか
             metadata: ファイルのメタデータ
+            selector: 変換するページ/スライド/シートの範囲（Noneの場合は全体）
             
         Returns:
             ConversionResult: 変換結果
         """
+        file_ext = os.path.splitext(input_path)[1].lower()[1:]
+        if selector is None or file_ext not in SUBSET_FORMATS:
+            return await self._convert_file(input_path, output_filename, save_to_db, metadata, use_ai_mode, progress_callback)
+        
+        # 選択範囲だけを含むコピーを作成し、以降の処理ではそれだけを解析・OCRする
+        workspace = ScratchWorkspace()
+        try:
+            try:
+                subset_path, page_map = create_subset(input_path, selector, workspace)
+            except ValueError as e:
+                return ConversionResult(
+                    id=str(uuid.uuid4()),
+                    input_file=os.path.basename(input_path),
+                    status=ConversionStatus.FAILED,
+                    error_message=f"範囲指定エラー: {str(e)}"
+                )
+            result = await self._convert_file(subset_path, output_filename, save_to_db, metadata, use_ai_mode, progress_callback)
+            
+            # サブセットは1ページ目から振り直されているため、元のページ/スライド番号に戻して保存し直す
+            if result.status == ConversionStatus.COMPLETED and result.markdown_content:
+                restored = restore_page_numbers(result.markdown_content, page_map)
+                if restored != result.markdown_content:
+                    result.markdown_content = restored
+                    with open(os.path.join(self.output_dir, result.output_file or output_filename), 'w', encoding='utf-8') as f:
+                        f.write(restored)
+            return result
+        finally:
+            workspace.cleanup()
+    
+    async def _convert_file(self, input_path: str, output_filename: str, save_to_db: bool = True, metadata: Optional[Dict[str, Any]] = None, use_ai_mode: bool = False, progress_callback = None) -> ConversionResult:
+        """単一ファイルの変換処理（範囲指定適用後）"""
         # Check if it's a URL (YouTube)
         if input_path.startswith('http://') or input_path.startswith('https://'):
             if self.enhanced_service.is_youtube_url(input_path):
@@ -126,9 +162,12 @@ class ConversionService:
             if progress_callback:
                 await progress_callback(conversion_id, 50, "processing", "変換中...", os.path.basename(input_path))
             
-            # markitdownでファイルを変換
-            result = self.md.convert(input_path)
-            markdown_content = result.text_content
+            # markitdownでファイルを変換（PDFは設定されたテキストバックエンドで抽出）
+            if file_ext == 'pdf':
+                markdown_content = await asyncio.to_thread(pdf_text_backend.convert, input_path, self.md)
+            else:
+                result = self.md.convert(input_path)
+                markdown_content = result.text_content
             
             if progress_callback:
                 await progress_callback(conversion_id, 90, "processing", "保存中...", os.path.basename(input_path))
@@ -176,8 +215,14 @@ class ConversionService:
             if file_ext in ['ppt', 'doc', 'xls'] and "No converter attempted a conversion" in str(e):
                 logger.info(f"Attempting legacy conversion for {file_ext} file")
                 
-                # Try legacy converter
-                success, result_or_error = self.legacy_converter.convert(input_path)
+                # Try legacy converter; its output goes to a scratch workspace, not next to the upload
+                workspace = ScratchWorkspace(conversion_id)
+                try:
+                    success, result_or_error = self.legacy_converter.convert(input_path, output_dir=workspace.path)
+                    if success:
+                        workspace.track(result_or_error)
+                except Exception as legacy_error:
+                    success, result_or_error = False, f"レガシー形式の変換に失敗しました: {str(legacy_error)}"
                 
                 if success:
                     # Successfully converted to modern format, try again
@@ -194,10 +239,6 @@ class ConversionService:
                         with open(output_path, 'w', encoding='utf-8') as output_file:
                             output_file.write(markdown_content)
                         
-                        # Clean up temporary converted file
-                        if os.path.exists(converted_path):
-                            os.remove(converted_path)
-                        
                         processing_time = time.time() - start_time
                         
                         if progress_callback:
@@ -214,7 +255,11 @@ class ConversionService:
                     except Exception as conv_error:
                         logger.error(f"Legacy conversion retry failed: {conv_error}")
                         error_msg = f"レガシー形式の変換に失敗しました: {str(conv_error)}"
+                    finally:
+                        # Clean up temporary converted file
+                        workspace.cleanup()
                 else:
+                    workspace.cleanup()
                     # Provide helpful error message for legacy format
                     error_msg = result_or_error
             else:
@@ -228,12 +273,13 @@ class ConversionService:
                 processing_time=time.time() - start_time
             )
     
-    async def batch_convert(self, file_paths: list[str], use_ai_mode: bool = False) -> list[ConversionResult]:
+    async def batch_convert(self, file_paths: list[str], use_ai_mode: bool = False, selector: Optional[RangeSelector] = None) -> list[ConversionResult]:
         """
         複数ファイルの一括変換
         
         Args:
             file_paths: 変換するファイルパスのリスト
+            selector: 各ファイルに適用する範囲指定
             
         Returns:
             list[ConversionResult]: 各ファイルの変換結果
@@ -246,7 +292,7 @@ class ConversionService:
             output_filename = f"{base_name}.md"
             
             # ファイルを変換
-            result = await self.convert_file(file_path, output_filename, use_ai_mode=use_ai_mode)
+            result = await self.convert_file(file_path, output_filename, use_ai_mode=use_ai_mode, selector=selector)
             results.append(result)
             
         return results
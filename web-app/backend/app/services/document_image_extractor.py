@@ -4,40 +4,30 @@ Extracts images from Office documents and PDFs, then applies OCR
 """
 import os
 import io
+import uuid
+import hashlib
 import tempfile
+import threading
 import logging
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Iterable, List, Dict, Any, Optional, Callable
 from PIL import Image
-import base64
+
+from .ooxml_media_extractor import OOXMLMediaExtractor
+from .pdf_page_analyzer import PDFPageAnalyzer
+from .pdf_dpi_planner import PDFDPIPlanner
+from .scratch_workspace import ScratchWorkspace
+from .range_selector import RangeSelector
+from .preview_service import preview_service
+from .image_triage import image_triage, ImageTriage
 
 logger = logging.getLogger(__name__)
 
 # Import document processing libraries
-try:
-    from docx import Document as DocxDocument
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
-    logger.warning("python-docx not available")
-
-try:
-    from pptx import Presentation
-    PPTX_AVAILABLE = True
-except ImportError:
-    PPTX_AVAILABLE = False
-    logger.warning("python-pptx not available")
-
-try:
-    import openpyxl
-    from openpyxl.drawing.image import Image as XlsxImage
-    XLSX_AVAILABLE = True
-except ImportError:
-    XLSX_AVAILABLE = False
-    logger.warning("openpyxl not available")
-
 try:
     import PyPDF2
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     PDF_AVAILABLE = True
 except ImportError:
     PDF_AVAILABLE = False
@@ -56,189 +46,95 @@ class DocumentImageExtractor:
         """
         self.ocr_service = ocr_service
         self.temp_dir = tempfile.gettempdir()
+        self.media_extractor = OOXMLMediaExtractor()
+        self.pdf_analyzer = PDFPageAnalyzer()
+        self.dpi_planner = PDFDPIPlanner()
+        # Number of PDF pages rasterized at a time
+        self.pdf_window_pages = max(1, int(os.getenv("PDF_RASTER_WINDOW_PAGES", "4")))
+        # pdftoppm threads used to render a window
+        self.pdf_render_threads = max(1, int(os.getenv("PDF_RENDER_THREADS", str(os.cpu_count() or 1))))
+        # OCR text of recently seen images by content hash, shared across documents
+        self.ocr_cache_size = int(os.getenv("IMAGE_OCR_CACHE_SIZE", "512"))
+        self._ocr_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._ocr_cache_lock = threading.Lock()
     
-    def extract_from_docx(self, file_path: str) -> List[Dict[str, Any]]:
+    def extract_from_docx(self, file_path: str, workspace: Optional[ScratchWorkspace] = None) -> List[Dict[str, Any]]:
         """
         Extract images from Word document
         
         Returns:
-            List of image data with OCR results
+            List of image data with OCR results, located by paragraph
         """
-        if not DOCX_AVAILABLE:
-            logger.warning("python-docx not available for Word document processing")
-            return []
-        
-        extracted_images = []
-        
-        try:
-            doc = DocxDocument(file_path)
-            
-            # Extract images from document relationships
-            for i, rel in enumerate(doc.part.rels.values()):
-                if "image" in rel.reltype:
-                    try:
-                        image_data = rel.target_part.blob
-                        image = Image.open(io.BytesIO(image_data))
-                        
-                        # Save temporarily for OCR
-                        temp_path = os.path.join(self.temp_dir, f"docx_image_{i}.png")
-                        image.save(temp_path)
-                        
-                        # Apply OCR if available
-                        ocr_text = self._apply_ocr(temp_path)
-                        
-                        # Convert to base64 for preview
-                        buffered = io.BytesIO()
-                        image.save(buffered, format="PNG")
-                        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-                        
-                        extracted_images.append({
-                            'index': i + 1,
-                            'format': image.format or 'Unknown',
-                            'size': image.size,
-                            'mode': image.mode,
-                            'ocr_text': ocr_text,
-                            'preview': f"data:image/png;base64,{img_base64[:100]}...",
-                            'temp_path': temp_path  # Keep for AI analysis
-                        })
-                        
-                        # Don't clean up yet - keep for AI analysis
-                        # Cleanup will happen after all processing
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing DOCX image {i}: {e}")
-                        
-        except Exception as e:
-            logger.error(f"Error extracting from DOCX: {e}")
-        
-        return extracted_images
+        # Keep temp files for AI analysis - cleaned up with the workspace
+        return self._extract_from_ooxml(file_path, "docx_image", workspace)
     
-    def extract_from_pptx(self, file_path: str) -> List[Dict[str, Any]]:
+    def extract_from_pptx(self, file_path: str, workspace: Optional[ScratchWorkspace] = None,
+                          selector: Optional[RangeSelector] = None) -> List[Dict[str, Any]]:
         """
         Extract images from PowerPoint presentation
         
         Returns:
-            List of image data with OCR results
+            List of image data with OCR results, located by slide
         """
-        if not PPTX_AVAILABLE:
-            logger.warning("python-pptx not available for PowerPoint processing")
-            return []
-        
-        extracted_images = []
-        
-        try:
-            prs = Presentation(file_path)
-            image_count = 0
-            
-            for slide_num, slide in enumerate(prs.slides, 1):
-                for shape in slide.shapes:
-                    if hasattr(shape, "image"):
-                        try:
-                            image_data = shape.image.blob
-                            image = Image.open(io.BytesIO(image_data))
-                            
-                            # Save temporarily for OCR
-                            temp_path = os.path.join(self.temp_dir, f"pptx_image_{image_count}.png")
-                            image.save(temp_path)
-                            
-                            # Apply OCR if available
-                            ocr_text = self._apply_ocr(temp_path)
-                            
-                            # Convert to base64 for preview
-                            buffered = io.BytesIO()
-                            image.save(buffered, format="PNG")
-                            img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-                            
-                            extracted_images.append({
-                                'slide': slide_num,
-                                'index': image_count + 1,
-                                'format': image.format or 'Unknown',
-                                'size': image.size,
-                                'mode': image.mode,
-                                'ocr_text': ocr_text,
-                                'preview': f"data:image/png;base64,{img_base64[:100]}...",
-                                'temp_path': temp_path  # Keep for AI analysis
-                            })
-                            
-                            image_count += 1
-                            
-                            # Keep temp file for AI analysis - will be cleaned up later
-                                
-                        except Exception as e:
-                            logger.error(f"Error processing PPTX image on slide {slide_num}: {e}")
-                            
-        except Exception as e:
-            logger.error(f"Error extracting from PPTX: {e}")
-        
-        return extracted_images
+        return self._extract_from_ooxml(file_path, "pptx_image", workspace, selector)
     
-    def extract_from_xlsx(self, file_path: str) -> List[Dict[str, Any]]:
+    def extract_from_xlsx(self, file_path: str, workspace: Optional[ScratchWorkspace] = None,
+                          selector: Optional[RangeSelector] = None) -> List[Dict[str, Any]]:
         """
         Extract images from Excel spreadsheet
         
         Returns:
-            List of image data with OCR results
+            List of image data with OCR results, located by sheet and anchor cell
         """
-        if not XLSX_AVAILABLE:
-            logger.warning("openpyxl not available for Excel processing")
-            return []
+        return self._extract_from_ooxml(file_path, "xlsx_image", workspace, selector)
+    
+    def _extract_from_ooxml(self, file_path: str, temp_prefix: str,
+                            workspace: Optional[ScratchWorkspace] = None,
+                            selector: Optional[RangeSelector] = None) -> List[Dict[str, Any]]:
+        """
+        Extract images of a DOCX/PPTX/XLSX file straight from its zip archive
         
-        extracted_images = []
+        Media entries are streamed one at a time from the package, so the
+        document is never loaded through python-docx/python-pptx/openpyxl.
         
-        try:
-            wb = openpyxl.load_workbook(file_path)
-            image_count = 0
+        Args:
+            file_path: Path to the document
+            temp_prefix: Temp file name prefix
+            workspace: Scratch workspace of the conversion job
+            selector: Only slides/sheets selected here are read
             
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-                
-                # Check for images in the sheet
-                if hasattr(sheet, '_images'):
-                    for img in sheet._images:
-                        try:
-                            # Extract image data
-                            image_data = img._data()
-                            image = Image.open(io.BytesIO(image_data))
-                            
-                            # Save temporarily for OCR
-                            temp_path = os.path.join(self.temp_dir, f"xlsx_image_{image_count}.png")
-                            image.save(temp_path)
-                            
-                            # Apply OCR if available
-                            ocr_text = self._apply_ocr(temp_path)
-                            
-                            # Convert to base64 for preview
-                            buffered = io.BytesIO()
-                            image.save(buffered, format="PNG")
-                            img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-                            
-                            extracted_images.append({
-                                'sheet': sheet_name,
-                                'index': image_count + 1,
-                                'format': image.format or 'Unknown',
-                                'size': image.size,
-                                'mode': image.mode,
-                                'ocr_text': ocr_text,
-                                'preview': f"data:image/png;base64,{img_base64[:100]}...",
-                                'temp_path': temp_path  # Keep for AI analysis
-                            })
-                            
-                            image_count += 1
-                            
-                            # Keep temp file for AI analysis - will be cleaned up later
-                                
-                        except Exception as e:
-                            logger.error(f"Error processing XLSX image in sheet {sheet_name}: {e}")
-                            
+        Returns:
+            List of image data with OCR results
+        """
+        try:
+            media = self.media_extractor.iter_media(file_path, selector)
+            return self._process_embedded_images(media, temp_prefix, workspace)
         except Exception as e:
-            logger.error(f"Error extracting from XLSX: {e}")
-        
-        return extracted_images
+            logger.error(f"Error extracting images from {os.path.basename(file_path)}: {e}")
+            return []
     
-    def extract_from_pdf(self, file_path: str) -> List[Dict[str, Any]]:
+    def extract_from_pdf(self, file_path: str,
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         workspace: Optional[ScratchWorkspace] = None,
+                         selector: Optional[RangeSelector] = None) -> List[Dict[str, Any]]:
         """
         Extract images from PDF document
         
+        Pages without a usable text layer (scans) are rasterized in windows of
+        ``pdf_window_pages`` straight to disk, so memory use is bounded by the
+        window and not the page count. Each page is rendered at the DPI chosen
+        by the DPI planner rather than a fixed 200. Pages that have a text layer but carry
+        significant figures get those figures pulled out as embedded images
+        instead of rendering the whole page.
+        All pages of a window are handed to the OCR service at once so a
+        batching scheduler or worker pool can recognize them in parallel.
+        
+        Args:
+            file_path: Path to the PDF file
+            progress_callback: Optional callable(pages_done, total_pages) called per page
+            workspace: Scratch workspace of the conversion job
+            selector: Only selected pages are analyzed, rendered and OCRed
+        
         Returns:
             List of image data with OCR results
         """
@@ -252,33 +148,71 @@ class DocumentImageExtractor:
             # Convert PDF pages to images for OCR
             # This requires poppler-utils to be installed
             try:
-                images = convert_from_path(file_path, dpi=200)
+                ocr_pages, figure_pages, dpi_plan = self._select_pdf_pages(file_path, selector)
                 
-                for i, image in enumerate(images):
-                    # Save temporarily for OCR
-                    temp_path = os.path.join(self.temp_dir, f"pdf_page_{i}.png")
-                    image.save(temp_path)
-                    
-                    # Apply OCR if available
-                    ocr_text = self._apply_ocr(temp_path)
+                # Digital pages: only the embedded figures go through the image pipeline
+                if figure_pages:
+                    extracted_images.extend(self._extract_pdf_figures(file_path, figure_pages, workspace))
+                
+                if workspace:
+                    scratch_dir = workspace.subdir("pdf_pages")
+                else:
+                    scratch_dir = tempfile.mkdtemp(prefix="pdf_pages_", dir=self.temp_dir)
+                pages_done = 0
+                
+                for first_page, last_page in self._page_windows(ocr_pages, dpi_plan):
+                    # Render this window to files only; no PIL images are held
+                    # pdf2image returns every file in the folder starting with output_file,
+                    # so each window gets its own prefix to keep earlier windows' pages out
+                    page_paths = convert_from_path(
+                        file_path,
+                        dpi=dpi_plan.get(first_page, self.dpi_planner.default_dpi),
+                        first_page=first_page,
+                        last_page=last_page,
+                        output_folder=scratch_dir,
+                        output_file=f"pdf_page_{first_page:05d}_",
+                        fmt="png",
+                        paths_only=True,
+                        thread_count=min(self.pdf_render_threads, last_page - first_page + 1)
+                    )
                     
-                    # Create thumbnail for preview
-                    thumbnail = image.copy()
-                    thumbnail.thumbnail((200, 200))
-                    buffered = io.BytesIO()
-                    thumbnail.save(buffered, format="PNG")
-                    img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+                    if workspace:
+                        for temp_path in page_paths:
+                            workspace.track(temp_path)
                     
-                    extracted_images.append({
-                        'page': i + 1,
-                        'type': 'page_as_image',
-                        'size': image.size,
-                        'ocr_text': ocr_text,
-                        'preview': f"data:image/png;base64,{img_base64[:100]}...",
-                        'temp_path': temp_path  # Keep for AI analysis
-                    })
+                    # Queue OCR for the whole window before waiting on any page
+                    ocr_futures = [self._submit_ocr(temp_path) for temp_path in page_paths]
                     
-                    # Keep temp file for AI analysis - will be cleaned up later
+                    for offset, (temp_path, ocr_future) in enumerate(zip(page_paths, ocr_futures)):
+                        page_num = first_page + offset
+                        
+                        # Collect OCR results in page order
+                        ocr_text = self._ocr_result(ocr_future, temp_path)
+                        
+                        # Only the header is read here; the preview is rendered on request
+                        with Image.open(temp_path) as image:
+                            page_size = image.size
+                        preview_id = preview_service.register_file(temp_path)
+                        
+                        extracted_images.append({
+                            'page': page_num,
+                            'type': 'page_as_image',
+                            'size': page_size,
+                            'dpi': dpi_plan.get(page_num, self.dpi_planner.default_dpi),
+                            'ocr_text': ocr_text,
+                            'preview_id': preview_id,
+                            'preview': preview_service.url(preview_id),
+                            'temp_path': temp_path  # Keep for AI analysis
+                        })
+                        
+                        # Keep temp file for AI analysis - will be cleaned up later
+                        
+                        pages_done += 1
+                        if progress_callback:
+                            progress_callback(pages_done, len(ocr_pages))
+                
+                if not workspace and not os.listdir(scratch_dir):
+                    os.rmdir(scratch_dir)
                         
             except Exception as e:
                 logger.warning(f"Could not convert PDF pages to images: {e}")
@@ -289,6 +223,253 @@ class DocumentImageExtractor:
         
         return extracted_images
     
+    def _select_pdf_pages(self, file_path: str, selector: Optional[RangeSelector] = None) -> tuple:
+        """
+        Pick the pages that need rasterization and the pages whose figures are extracted directly
+        
+        Args:
+            file_path: Path to the PDF file
+            selector: Page selection; unselected pages are not even analyzed
+            
+        Returns:
+            Tuple of (pages to rasterize, pages to extract embedded images from,
+            DPI per rasterized page); page lists are sorted 1-based page numbers
+        """
+        try:
+            analysis = self.pdf_analyzer.analyze(file_path, selector.pages if selector else None)
+            if analysis:
+                raster_pages = [page for page in analysis if page['reason'] == 'no_text_layer']
+                figure_pages = [page['page'] for page in analysis if page['reason'] == 'embedded_images']
+                dpi_plan = self.dpi_planner.plan(file_path, raster_pages)
+                return [page['page'] for page in raster_pages], figure_pages, dpi_plan
+        except Exception as e:
+            logger.warning(f"PDF page analysis failed, OCRing every page: {e}")
+        
+        all_pages = list(range(1, self._get_pdf_page_count(file_path) + 1))
+        return (selector.filter_pages(all_pages) if selector else all_pages), [], {}
+    
+    def _extract_pdf_figures(self, file_path: str, page_numbers: List[int],
+                             workspace: Optional[ScratchWorkspace] = None) -> List[Dict[str, Any]]:
+        """
+        Pull significant embedded images out of the given PDF pages
+        
+        JPEG and JPEG 2000 streams are written as-is; other images are
+        decoded by PyPDF2. Each unique image then goes through the same
+        OCR/LLM pipeline as DOCX/PPTX images.
+        
+        Args:
+            file_path: Path to the PDF file
+            page_numbers: 1-based page numbers to extract figures from
+            workspace: Scratch workspace of the conversion job
+            
+        Returns:
+            List of image data with OCR results, page number and position
+        """
+        try:
+            figures = self.pdf_analyzer.extract_images(file_path, page_numbers)
+        except Exception as e:
+            logger.error(f"Error extracting embedded PDF images: {e}")
+            return []
+        
+        blobs = []
+        for figure in figures:
+            location = {'page': figure['page']}
+            if figure.get('position'):
+                location['position'] = figure['position']
+            blobs.append((figure['data'], [location], figure['ext']))
+        
+        images = self._process_embedded_images(blobs, "pdf_image", workspace)
+        for image_info in images:
+            image_info['type'] = 'embedded_image'
+        return images
+    
+    def _process_embedded_images(self, blobs: Iterable[tuple], temp_prefix: str,
+                                 workspace: Optional[ScratchWorkspace] = None) -> List[Dict[str, Any]]:
+        """
+        Decode, OCR and describe each distinct embedded image once
+        
+        Blobs are hashed before decoding. Repeats of an image (a logo on every
+        slide, the same figure on several pages) are added to the first
+        occurrence's ``occurrences`` list instead of being processed again, and
+        OCR text is reused across documents through a content-hash cache.
+        Blobs may come from a generator; only unique images are kept.
+        
+        Each unique image is triaged first: decorative images (icons,
+        bullets, solid shapes) are dropped without being staged or OCRed, and
+        the rest are tagged ``triage`` = 'ocr' or 'ocr_vision' so only the
+        latter get an LLM description.
+        
+        Args:
+            blobs: (image bytes, list of location dicts, native extension or None)
+                in document order
+            temp_prefix: Temp file name prefix
+            workspace: Scratch workspace of the conversion job
+            
+        Returns:
+            One image data dict per unique image with content_hash, occurrences and OCR text
+        """
+        unique: Dict[str, Dict[str, Any]] = {}
+        skipped = set()
+        pending = []
+        occurrence_count = 0
+        
+        for image_data, locations, native_ext in blobs:
+            occurrence_count += max(1, len(locations))
+            content_hash = hashlib.sha256(image_data).hexdigest()
+            
+            if content_hash in unique:
+                unique[content_hash]['occurrences'].extend(locations)
+                continue
+            if content_hash in skipped:
+                continue
+            
+            triage = image_triage.classify(image_data)
+            if triage['decision'] == ImageTriage.SKIP:
+                skipped.add(content_hash)
+                continue
+            
+            index = len(unique) + 1
+            try:
+                image_info = self._stage_image_data(
+                    image_data, f"{temp_prefix}_{index}", workspace,
+                    native_ext=native_ext, index=index, **(locations[0] if locations else {})
+                )
+            except Exception as e:
+                logger.error(f"Error processing {temp_prefix} {index} ({locations[:1]}): {e}")
+                continue
+            
+            image_info['content_hash'] = content_hash
+            image_info['occurrences'] = list(locations)
+            image_info['triage'] = triage['decision']
+            unique[content_hash] = image_info
+            
+            # Queue OCR for every unique image before waiting on any of them
+            cached_text = self._cached_ocr(content_hash)
+            if cached_text is None:
+                pending.append((image_info, self._submit_ocr(image_info['temp_path'])))
+            else:
+                image_info['ocr_text'] = cached_text
+        
+        for image_info, ocr_future in pending:
+            image_info['ocr_text'] = self._ocr_result(ocr_future, image_info['temp_path'])
+            if ocr_future.exception() is None:
+                self._store_ocr(image_info['content_hash'], image_info['ocr_text'])
+        
+        if occurrence_count > len(unique):
+            logger.info(
+                f"{temp_prefix}: {occurrence_count} occurrences, {len(unique) + len(skipped)} unique images, "
+                f"{len(skipped)} skipped by triage"
+            )
+        return list(unique.values())
+    
+    def _cached_ocr(self, content_hash: str) -> Optional[str]:
+        """OCR text for a previously processed image, or None"""
+        with self._ocr_cache_lock:
+            text = self._ocr_cache.get(content_hash)
+            if text is not None:
+                self._ocr_cache.move_to_end(content_hash)
+            return text
+    
+    def _store_ocr(self, content_hash: str, text: str):
+        """Remember OCR text by image content hash (LRU, IMAGE_OCR_CACHE_SIZE entries)"""
+        if self.ocr_cache_size <= 0 or not self.ocr_service:
+            return
+        with self._ocr_cache_lock:
+            self._ocr_cache[content_hash] = text
+            self._ocr_cache.move_to_end(content_hash)
+            while len(self._ocr_cache) > self.ocr_cache_size:
+                self._ocr_cache.popitem(last=False)
+    
+    def _page_windows(self, page_numbers: List[int], dpi_plan: Optional[Dict[int, int]] = None) -> List[tuple]:
+        """
+        Group sorted page numbers into contiguous (first_page, last_page) windows
+        no longer than ``pdf_window_pages`` whose pages share the same planned DPI
+        """
+        dpi_plan = dpi_plan or {}
+        windows = []
+        for page in page_numbers:
+            if windows:
+                first_page, last_page = windows[-1]
+                if (page == last_page + 1 and page - first_page < self.pdf_window_pages
+                        and dpi_plan.get(page) == dpi_plan.get(first_page)):
+                    windows[-1] = (first_page, page)
+                    continue
+            windows.append((page, page))
+        return windows
+    
+    def _get_pdf_page_count(self, file_path: str) -> int:
+        """
+        Get the number of pages without rendering anything
+        
+        Args:
+            file_path: Path to the PDF file
+            
+        Returns:
+            Number of pages
+        """
+        try:
+            return len(PyPDF2.PdfReader(file_path).pages)
+        except Exception as e:
+            logger.debug(f"PyPDF2 could not count pages, using pdfinfo: {e}")
+            return int(pdfinfo_from_path(file_path)["Pages"])
+    
+    def _temp_file_path(self, name: str, workspace: Optional[ScratchWorkspace] = None) -> str:
+        """
+        Get a temp file path, inside the job workspace when there is one
+        
+        Without a workspace the name is made unique so concurrent jobs sharing
+        the system temp dir never collide.
+        """
+        if workspace:
+            return workspace.file_path(name)
+        return os.path.join(self.temp_dir, f"{uuid.uuid4().hex[:12]}_{name}")
+    
+    def _stage_image_data(self, image_data: bytes, temp_name: str,
+                          workspace: Optional[ScratchWorkspace] = None,
+                          native_ext: Optional[str] = None, **metadata) -> Dict[str, Any]:
+        """
+        Save an embedded image for OCR and AI analysis and describe it
+        
+        Args:
+            image_data: Raw image bytes from the document
+            temp_name: Temp file name without extension
+            workspace: Scratch workspace of the conversion job
+            native_ext: Write the bytes unchanged with this extension (e.g. "jpg")
+                instead of re-encoding to PNG
+            **metadata: Location keys (index, slide, sheet, page, ...) for the result
+            
+        Returns:
+            Image data dict without OCR text
+        """
+        image = Image.open(io.BytesIO(image_data))
+        
+        # Save temporarily for OCR
+        if native_ext:
+            temp_path = self._temp_file_path(f"{temp_name}.{native_ext}", workspace)
+            if workspace:
+                workspace.charge(len(image_data))
+            with open(temp_path, 'wb') as f:
+                f.write(image_data)
+        else:
+            temp_path = self._temp_file_path(f"{temp_name}.png", workspace)
+            image.save(temp_path)
+            if workspace:
+                workspace.track(temp_path)
+        
+        # Store a reference only; the preview endpoint renders thumbnails on demand
+        preview_id = preview_service.register_bytes(image_data)
+        
+        image_info = dict(metadata)
+        image_info.update({
+            'format': image.format or 'Unknown',
+            'size': image.size,
+            'mode': image.mode,
+            'preview_id': preview_id,
+            'preview': preview_service.url(preview_id),
+            'temp_path': temp_path  # Keep for AI analysis
+        })
+        return image_info
+    
     def _apply_ocr(self, image_path: str) -> str:
         """
         Apply OCR to an image file
@@ -313,12 +494,59 @@ class DocumentImageExtractor:
             logger.error(f"OCR error on {image_path}: {e}")
             return ""
     
-    def extract_all_images(self, file_path: str) -> Dict[str, Any]:
+    def _submit_ocr(self, image_path: str) -> Future:
+        """
+        Start OCR for an image without waiting for the result
+        
+        Uses the OCR service's own queue (batch scheduler or worker pool) when
+        it has one; otherwise runs OCR immediately.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Future resolving to the extracted text
+        """
+        if self.ocr_service and hasattr(self.ocr_service, 'submit'):
+            try:
+                return self.ocr_service.submit(image_path)
+            except Exception as e:
+                logger.error(f"OCR submit error on {image_path}: {e}")
+        
+        future: Future = Future()
+        future.set_result(self._apply_ocr(image_path))
+        return future
+    
+    def _ocr_result(self, future: Future, image_path: str) -> str:
+        """
+        Wait for a submitted OCR job
+        
+        Args:
+            future: Future returned by _submit_ocr
+            image_path: Path to the image file, used for logging
+            
+        Returns:
+            Extracted text or empty string
+        """
+        try:
+            text = future.result()
+            return text if text else ""
+        except Exception as e:
+            logger.error(f"OCR error on {image_path}: {e}")
+            return ""
+    
+    def extract_all_images(self, file_path: str,
+                           progress_callback: Optional[Callable[[int, int], None]] = None,
+                           workspace: Optional[ScratchWorkspace] = None,
+                           selector: Optional[RangeSelector] = None) -> Dict[str, Any]:
         """
         Extract images from any supported document type
         
         Args:
             file_path: Path to the document
+            progress_callback: Optional callable(pages_done, total_pages) for PDF page progress
+            workspace: Scratch workspace for temp files; removed by the caller when the job ends
+            selector: Pages/slides/sheets to extract from (all when None)
             
         Returns:
             Dictionary with extracted images and metadata
@@ -334,13 +562,13 @@ class DocumentImageExtractor:
         }
         
         if file_ext == '.docx':
-            result['images'] = self.extract_from_docx(file_path)
+            result['images'] = self.extract_from_docx(file_path, workspace)
         elif file_ext == '.pptx':
-            result['images'] = self.extract_from_pptx(file_path)
+            result['images'] = self.extract_from_pptx(file_path, workspace, selector)
         elif file_ext == '.xlsx':
-            result['images'] = self.extract_from_xlsx(file_path)
+            result['images'] = self.extract_from_xlsx(file_path, workspace, selector)
         elif file_ext == '.pdf':
-            result['images'] = self.extract_from_pdf(file_path)
+            result['images'] = self.extract_from_pdf(file_path, progress_callback, workspace, selector)
         else:
             logger.warning(f"Unsupported file type: {file_ext}")
         
@@ -366,4 +594,13 @@ class DocumentImageExtractor:
                     os.remove(temp_path)
                     logger.debug(f"Cleaned up temp file: {temp_path}")
                 except Exception as e:
-                    logger.warning(f"Could not remove temp file {temp_path}: {e}")
\ No newline at end of file
+                    logger.warning(f"Could not remove temp file {temp_path}: {e}")
+            
+            # Remove PDF page directories created without a workspace once empty
+            if temp_path:
+                temp_dir = os.path.dirname(temp_path)
+                if os.path.basename(temp_dir).startswith("pdf_pages_") and os.path.isdir(temp_dir) and not os.listdir(temp_dir):
+                    try:
+                        os.rmdir(temp_dir)
+                    except OSError:
+                        pass
\ No newline at end of file
@@ -2,8 +2,14 @@
 Enhanced document processor that includes image extraction and OCR
 """
 import os
+import asyncio
 import logging
-from typing import Optional
+from typing import Optional, Callable, List, Tuple
+from .scratch_workspace import ScratchWorkspace
+from .image_triage import image_triage
+from .range_selector import RangeSelector
+from .openai_client_factory import openai_client_factory
+from .llm_usage import llm_usage
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +20,18 @@ class DocumentProcessor:
         self.doc_extractor = doc_extractor
         self.llm_client = llm_client
     
-    def process_document_with_images(self, file_path: str, use_ai_mode: bool = False) -> str:
+    def process_document_with_images(self, file_path: str, use_ai_mode: bool = False,
+                                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                                     workspace: Optional[ScratchWorkspace] = None,
+                                     selector: Optional[RangeSelector] = None) -> str:
         """
         Process document and extract images with OCR
         
         Args:
             file_path: Path to document file
+            progress_callback: Optional callable(pages_done, total_pages) for PDF page progress
+            workspace: Scratch workspace of the conversion job (a private one is used if omitted)
+            selector: Pages/slides/sheets to process (all when None)
             
         Returns:
             Markdown content including extracted images and OCR text
@@ -27,103 +39,173 @@ class DocumentProcessor:
         if not self.doc_extractor:
             return ""
         
-        # Extract images from document
-        extraction_result = self.doc_extractor.extract_all_images(file_path)
+        # Temp files live in the job's scratch workspace; create one if the caller did not
+        own_workspace = workspace is None
+        if own_workspace:
+            workspace = ScratchWorkspace()
         
-        if not extraction_result['images']:
-            return ""
-        
-        # Build markdown content
-        markdown_parts = []
-        markdown_parts.append("\n## Embedded Images\n")
-        markdown_parts.append(f"*Found {extraction_result['total_images']} embedded images in the document*\n")
-        
-        for img_data in extraction_result['images']:
-            markdown_parts.append(f"\n### Image {img_data.get('index', 'N/A')}")
+        try:
+            # Extract images from document
+            extraction_result = self.doc_extractor.extract_all_images(file_path, progress_callback, workspace, selector)
             
-            # Add location info
-            if 'slide' in img_data:
-                markdown_parts.append(f"*Location: Slide {img_data['slide']}*")
-            elif 'sheet' in img_data:
-                markdown_parts.append(f"*Location: Sheet {img_data['sheet']}*")
-            elif 'page' in img_data:
-                markdown_parts.append(f"*Location: Page {img_data['page']}*")
+            if not extraction_result['images']:
+                return ""
             
-            # Add image properties
-            if 'size' in img_data:
-                markdown_parts.append(f"\n**Properties:**")
-                markdown_parts.append(f"- Size: {img_data['size'][0]} x {img_data['size'][1]} pixels")
-                if 'format' in img_data:
-                    markdown_parts.append(f"- Format: {img_data['format']}")
-                if 'mode' in img_data:
-                    markdown_parts.append(f"- Mode: {img_data['mode']}")
+            # Build markdown content
+            markdown_parts = []
+            markdown_parts.append("\n## Embedded Images\n")
+            total_occurrences = sum(len(img.get('occurrences') or [img]) for img in extraction_result['images'])
+            if total_occurrences > extraction_result['total_images']:
+                markdown_parts.append(
+                    f"*Found {extraction_result['total_images']} unique embedded images "
+                    f"({total_occurrences} occurrences) in the document*\n"
+                )
+            else:
+                markdown_parts.append(f"*Found {extraction_result['total_images']} embedded images in the document*\n")
+            
+            # AI descriptions are requested together after the loop; each gets a placeholder slot
+            ai_slots = []
             
-            # Add OCR text if available
-            ocr_text = img_data.get('ocr_text', '').strip()
-            if ocr_text:
-                markdown_parts.append(f"\n**画像内のテキスト (OCR抽出):**")
-                markdown_parts.append("```")
-                # Preserve full text for better accuracy
-                # Remove low confidence markers for cleaner output
-                clean_text = ocr_text.replace(' [low confidence:', '').replace(']', '')
-                clean_text = clean_text.replace(' [unverified]', '')
+            for img_data in extraction_result['images']:
+                markdown_parts.append(f"\n### Image {img_data.get('index', 'N/A')}")
+                
+                # Add location info (every place a repeated image appears)
+                locations = [self._format_location(loc) for loc in img_data.get('occurrences') or [img_data]]
+                locations = [loc for loc in locations if loc]
+                if len(locations) > 1:
+                    markdown_parts.append(f"*Locations ({len(locations)}): {', '.join(locations)}*")
+                elif locations:
+                    markdown_parts.append(f"*Location: {locations[0]}*")
                 
-                # Limit OCR text length for each image if needed
-                if len(clean_text) > 2000:
-                    markdown_parts.append(clean_text[:2000])
-                    markdown_parts.append("... [テキストが長いため省略]")
+                # Add image properties
+                if 'size' in img_data:
+                    markdown_parts.append(f"\n**Properties:**")
+                    markdown_parts.append(f"- Size: {img_data['size'][0]} x {img_data['size'][1]} pixels")
+                    if 'format' in img_data:
+                        markdown_parts.append(f"- Format: {img_data['format']}")
+                    if 'mode' in img_data:
+                        markdown_parts.append(f"- Mode: {img_data['mode']}")
+                    if img_data.get('position'):
+                        pos = img_data['position']
+                        markdown_parts.append(f"- Position: ({pos['x']}, {pos['y']}), {pos['width']} x {pos['height']} pt")
+                
+                # Add OCR text if available
+                ocr_text = img_data.get('ocr_text', '').strip()
+                if ocr_text:
+                    markdown_parts.append(f"\n**画像内のテキスト (OCR抽出):**")
+                    markdown_parts.append("```")
+                    # Preserve full text for better accuracy
+                    # Remove low confidence markers for cleaner output
+                    clean_text = ocr_text.replace(' [low confidence:', '').replace(']', '')
+                    clean_text = clean_text.replace(' [unverified]', '')
+                    
+                    # Limit OCR text length for each image if needed
+                    if len(clean_text) > 2000:
+                        markdown_parts.append(clean_text[:2000])
+                        markdown_parts.append("... [テキストが長いため省略]")
+                    else:
+                        markdown_parts.append(clean_text)
+                    markdown_parts.append("```")
                 else:
-                    markdown_parts.append(clean_text)
-                markdown_parts.append("```")
-            else:
-                markdown_parts.append(f"\n*画像内にテキストが検出されませんでした*")
-            
-            # Add AI analysis if enabled and available
-            if use_ai_mode and self.llm_client and self.llm_client.is_available():
-                # Get temp file path if available
-                temp_path = img_data.get('temp_path')
-                if temp_path and os.path.exists(temp_path):
-                    try:
+                    markdown_parts.append(f"\n*画像内にテキストが検出されませんでした*")
+                
+                # Add AI analysis if enabled and available (triage keeps icons and plain text images out)
+                if use_ai_mode and self.llm_client and self.llm_client.is_available() and image_triage.wants_vision(img_data):
+                    # Get temp file path if available
+                    temp_path = img_data.get('temp_path')
+                    if temp_path and os.path.exists(temp_path):
                         # Get location context
-                        location = ""
-                        if 'slide' in img_data:
-                            location = f"Slide {img_data['slide']}"
-                        elif 'sheet' in img_data:
-                            location = f"Sheet {img_data['sheet']}"
-                        elif 'page' in img_data:
-                            location = f"Page {img_data['page']}"
-                        
-                        ai_description = self.llm_client.describe_image(
-                            temp_path,
-                            context=f"Embedded image from document, {location}"
-                        )
-                        
-                        markdown_parts.append(f"\n**AI Analysis:**")
-                        markdown_parts.append(ai_description)
-                    except Exception as e:
-                        logger.error(f"AI analysis error for embedded image: {e}")
+                        location = ", ".join(locations)
+                        ai_slots.append((len(markdown_parts), temp_path, f"Embedded image from document, {location}"))
+                        markdown_parts.append(None)
+                
+                markdown_parts.append("")  # Empty line between images
+            
+            if ai_slots:
+                descriptions = self._describe_images([(path, context) for _, path, context in ai_slots])
+                for (slot, _, _), ai_description in zip(ai_slots, descriptions):
+                    markdown_parts[slot] = f"\n**AI Analysis:**\n{ai_description}" if ai_description else None
             
-            markdown_parts.append("")  # Empty line between images
+            return "\n".join(part for part in markdown_parts if part is not None)
+        finally:
+            # Clean up temporary files after all processing, even on errors or cancellation
+            if own_workspace:
+                workspace.cleanup()
+    
+    def _describe_images(self, requests: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Describe all images of a document with bounded concurrency, keeping request order
         
-        # Clean up temporary files after all processing
-        if self.doc_extractor and hasattr(self.doc_extractor, 'cleanup_temp_files'):
-            self.doc_extractor.cleanup_temp_files(extraction_result['images'])
+        Args:
+            requests: List of (image_path, context) tuples
+            
+        Returns:
+            Descriptions in request order (None where an image failed)
+        """
+        if hasattr(self.llm_client, 'describe_images'):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # Normal case: running in a worker thread without an event loop
+                try:
+                    main_loop = openai_client_factory.main_loop
+                    if main_loop is not None and main_loop.is_running():
+                        # Run on the server loop so the pooled async connections are reused
+                        # The loop runs the coroutine in its own context; keep the calls on this job
+                        job = llm_usage.current()
+                        
+                        async def describe_in_job():
+                            with llm_usage.activate(job):
+                                return await self.llm_client.describe_images(requests)
+                        
+                        future = asyncio.run_coroutine_threadsafe(describe_in_job(), main_loop)
+                        return future.result()
+                    return asyncio.run(self.llm_client.describe_images(requests))
+                except Exception as e:
+                    logger.error(f"Concurrent AI analysis failed, describing images one by one: {e}")
         
-        return "\n".join(markdown_parts)
+        descriptions = []
+        for image_path, context in requests:
+            try:
+                descriptions.append(self.llm_client.describe_image(image_path, context=context))
+            except Exception as e:
+                logger.error(f"AI analysis error for embedded image: {e}")
+                descriptions.append(None)
+        return descriptions
+    
+    def _format_location(self, location: dict) -> str:
+        """Human readable location of an image occurrence"""
+        if 'slide' in location:
+            return f"Slide {location['slide']}"
+        elif 'sheet' in location:
+            if location.get('cell'):
+                return f"Sheet {location['sheet']}!{location['cell']}"
+            return f"Sheet {location['sheet']}"
+        elif 'page' in location:
+            return f"Page {location['page']}"
+        elif 'paragraph' in location:
+            return f"Paragraph {location['paragraph']}"
+        return ""
     
-    def enhance_markdown_with_images(self, original_markdown: str, file_path: str, use_ai_mode: bool = False) -> str:
+    def enhance_markdown_with_images(self, original_markdown: str, file_path: str, use_ai_mode: bool = False,
+                                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                                     workspace: Optional[ScratchWorkspace] = None,
+                                     selector: Optional[RangeSelector] = None) -> str:
         """
         Enhance existing markdown with extracted images and OCR
         
         Args:
             original_markdown: Original markdown from document
             file_path: Path to document file
+            progress_callback: Optional callable(pages_done, total_pages) for PDF page progress
+            workspace: Scratch workspace of the conversion job
+            selector: Pages/slides/sheets to process (all when None)
             
         Returns:
             Enhanced markdown with image content
         """
         # Get image content
-        image_content = self.process_document_with_images(file_path, use_ai_mode)
+        image_content = self.process_document_with_images(file_path, use_ai_mode, progress_callback, workspace, selector)
         
         if not image_content:
             return original_markdown
@@ -14,8 +14,8 @@ import csv
 import zipfile
 import tempfile
 import re
-import base64
-from typing import Optional, Dict, Any, List
+import asyncio
+from typing import Optional, Dict, Any, List, Callable
 from markitdown import MarkItDown
 from dotenv import load_dotenv
 
@@ -24,10 +24,17 @@ load_dotenv()
 from app.models.data_models import ConversionResult, ConversionStatus
 from .mock_firebase_service import MockFirebaseService
 from .mock_ocr_service import MockOCRService
-from .paddle_ocr_service import PaddleOCRService
+from .paddle_ocr_service import PaddleOCRService, PADDLE_AVAILABLE
 from .document_image_extractor import DocumentImageExtractor
+from .ocr_batch_scheduler import OCRBatchScheduler
+from .ocr_worker_pool import OCRProcessPool, configured_processes
+from .scratch_workspace import ScratchWorkspace
+from .preview_service import preview_service
+from .range_selector import RangeSelector, create_subset, restore_page_numbers
+from .pdf_text_backend import pdf_text_backend
 from .document_processor import DocumentProcessor
 from .llm_client_service import LLMClientService, MockLLMService
+from .llm_usage import llm_usage
 import logging
 
 try:
@@ -59,12 +66,22 @@ class EnhancedConversionService:
         self.md = MarkItDown()
         self.firebase_service = MockFirebaseService()
         self.mock_ocr = MockOCRService()
-        self.paddle_ocr = PaddleOCRService()
         self.enable_database = True
+        self.ocr_scheduler = None
+        
+        # With OCR worker processes each worker loads the model, so none is loaded here
+        ocr_processes = configured_processes() if PADDLE_AVAILABLE else 0
+        self.paddle_ocr = OCRProcessPool(ocr_processes) if ocr_processes > 1 else PaddleOCRService()
         
         # Initialize document image extractor with OCR service
         if self.paddle_ocr.is_available():
-            self.doc_extractor = DocumentImageExtractor(ocr_service=self.paddle_ocr)
+            # OCR from concurrent conversions is micro-batched; with worker
+            # processes a batch must be large enough to keep all of them busy
+            batch_size = int(os.getenv("OCR_BATCH_MAX_SIZE", "8"))
+            if ocr_processes > 1:
+                batch_size = max(batch_size, ocr_processes)
+            self.ocr_scheduler = OCRBatchScheduler(self.paddle_ocr, max_batch_size=batch_size)
+            self.doc_extractor = DocumentImageExtractor(ocr_service=self.ocr_scheduler)
             logger.info("PaddleOCR is available for text extraction")
         else:
             self.doc_extractor = DocumentImageExtractor(ocr_service=self.mock_ocr)
@@ -84,7 +101,7 @@ class EnhancedConversionService:
             if api_key:
                 logger.info("OpenAI API key found in environment")
             
-            self.llm_client = LLMClientService(api_key=api_key)
+            self.llm_client = LLMClientService()
             if not self.llm_client.is_available():
                 logger.info("Using mock LLM service - configure OpenAI API key for AI features")
                 self.llm_client = MockLLMService()
@@ -152,7 +169,7 @@ class EnhancedConversionService:
 """
         return markdown
     
-    async def convert_zip_file(self, zip_path: str) -> str:
+    async def convert_zip_file(self, zip_path: str, workspace: Optional[ScratchWorkspace] = None) -> str:
         """Convert ZIP file contents to markdown"""
         markdown_parts = [f"# ZIP Archive: {os.path.basename(zip_path)}\n"]
         
@@ -166,7 +183,7 @@ class EnhancedConversionService:
             markdown_parts.append("\n## Extracted Content\n")
             
             # Extract and convert each supported file
-            with tempfile.TemporaryDirectory() as temp_dir:
+            with tempfile.TemporaryDirectory(dir=workspace.path if workspace else None) as temp_dir:
                 for file_info in zip_file.filelist:
                     if file_info.is_dir():
                         continue
@@ -176,6 +193,8 @@ class EnhancedConversionService:
                     
                     try:
                         # Extract file
+                        if workspace:
+                            workspace.charge(file_info.file_size)
                         extracted_path = zip_file.extract(file_name, temp_dir)
                         
                         # Try to convert with markitdown
@@ -231,13 +250,29 @@ class EnhancedConversionService:
         
         return markdown
     
-    async def convert_image_file(self, image_path: str, use_ai_mode: bool = False) -> str:
+    async def convert_image_file(self, image_path: str, use_ai_mode: bool = False,
+                                 workspace: Optional[ScratchWorkspace] = None,
+                                 on_delta: Optional[Callable[[str, str], None]] = None) -> str:
         """Convert image file to markdown with metadata and OCR
         
         Args:
             image_path: Path to image file
             use_ai_mode: Whether to use AI-enhanced description
+            workspace: Scratch workspace of the conversion job
+            on_delta: Optional callback (section, text) receiving the AI description as it is generated
         """
+        own_workspace = workspace is None
+        if own_workspace:
+            workspace = ScratchWorkspace()
+        try:
+            return await self._convert_image_file(image_path, use_ai_mode, workspace, on_delta)
+        finally:
+            if own_workspace:
+                workspace.cleanup()
+    
+    async def _convert_image_file(self, image_path: str, use_ai_mode: bool, workspace: ScratchWorkspace,
+                                  on_delta: Optional[Callable[[str, str], None]] = None) -> str:
+        """Build the image markdown; temp files go to the given workspace"""
         markdown = f"# Image File: {os.path.basename(image_path)}\n\n"
         
         if PIL_AVAILABLE:
@@ -275,15 +310,17 @@ class EnhancedConversionService:
                     markdown += "\n## Text Content (OCR)\n\n"
                     text_extracted = False
                     
-                    # Try PaddleOCR first (best option)
-                    if self.paddle_ocr.is_available():
+                    # Try PaddleOCR first (best option), through the batching scheduler
+                    # that owns the shared OCR model
+                    if self.ocr_scheduler is not None:
                         try:
                             # Save image temporarily for PaddleOCR
-                            temp_path = f"/tmp/temp_paddle_ocr_{os.getpid()}.png"
+                            temp_path = workspace.file_path("paddle_ocr_input.png")
                             img.save(temp_path)
+                            workspace.track(temp_path)
                             
                             # Perform OCR with PaddleOCR
-                            extracted_text = self.paddle_ocr.extract_text(temp_path)
+                            extracted_text = self.ocr_scheduler.extract_text(temp_path)
                             
                             if extracted_text and extracted_text != "No text detected in the image.":
                                 markdown += "### Extracted Text (PaddleOCR):\n\n"
@@ -293,7 +330,7 @@ class EnhancedConversionService:
                                 text_extracted = True
                                 
                                 # Also get detailed results with confidence
-                                details = self.paddle_ocr.extract_text_with_details(temp_path)
+                                details = self.ocr_scheduler.extract_text_with_details(temp_path)
                                 if details:
                                     markdown += "\n### Detection Confidence:\n\n"
                                     for text, confidence in details[:10]:  # Show first 10 items
@@ -334,8 +371,9 @@ class EnhancedConversionService:
                     if not text_extracted:
                         try:
                             # Save image temporarily for mock OCR
-                            temp_path = f"/tmp/temp_mock_ocr_{os.getpid()}.png"
+                            temp_path = workspace.file_path("mock_ocr_input.png")
                             img.save(temp_path)
+                            workspace.track(temp_path)
                             
                             # Use mock OCR service
                             mock_text = self.mock_ocr.extract_text(temp_path)
@@ -357,43 +395,26 @@ class EnhancedConversionService:
                     
                     # AI-enhanced description if enabled
                     if use_ai_mode and self.llm_client.is_available():
-                        markdown += "\n## AI Image Analysis\n\n"
                         try:
-                            # Get AI description
-                            ai_description = self.llm_client.describe_image(
+                            # One structured vision call: description, text and chart data
+                            # ({} when the LLM is unavailable: no AI section).
+                            # Off the event loop: the call blocks, and the description is relayed through it
+                            analysis = await asyncio.to_thread(
+                                self.llm_client.analyze_image,
                                 image_path,
-                                context=f"Image file: {os.path.basename(image_path)}, Format: {img.format}, Size: {img.width}x{img.height}"
+                                context=f"Image file: {os.path.basename(image_path)}, Format: {img.format}, Size: {img.width}x{img.height}",
+                                on_delta=on_delta
                             )
-                            markdown += ai_description + "\n"
-                            
-                            # If it might be a chart, get chart analysis
-                            if any(keyword in ai_description.lower() for keyword in ['chart', 'graph', 'diagram', 'plot']):
-                                chart_analysis = self.llm_client.analyze_chart_data(image_path)
-                                if 'analysis' in chart_analysis:
-                                    markdown += "\n### Chart/Graph Analysis:\n\n"
-                                    markdown += chart_analysis['analysis'] + "\n"
+                            markdown += self._render_image_analysis(analysis)
                         except Exception as ai_error:
                             logger.error(f"AI analysis error: {ai_error}")
                             markdown += f"*AI analysis failed: {str(ai_error)}*\n"
                     
-                    # Create thumbnail and base64 representation
+                    # Link to the preview endpoint; the thumbnail is rendered when first requested
                     markdown += "\n## Image Preview\n\n"
                     try:
-                        # Create a thumbnail for preview
-                        max_size = (800, 800)
-                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                        
-                        # Convert to base64 for embedding
-                        import io
-                        buffer = io.BytesIO()
-                        img.save(buffer, format=img.format if img.format else 'PNG')
-                        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                        
-                        # Add base64 image as markdown
-                        markdown += f"![Image]("
-                        markdown += f"data:image/{img.format.lower() if img.format else 'png'};"
-                        markdown += f"base64,{img_base64[:100]}...)"
-                        markdown += "\n\n*Note: Base64 preview truncated. Full image data available in original file.*\n"
+                        preview_id = preview_service.register_file(image_path)
+                        markdown += f"![Image]({preview_service.url(preview_id, size=800)})\n"
                         
                     except Exception as preview_error:
                         markdown += f"*Could not generate preview: {str(preview_error)}*\n"
@@ -420,6 +441,40 @@ class EnhancedConversionService:
         
         return markdown
     
+    def _render_image_analysis(self, analysis: Dict[str, Any]) -> str:
+        """Markdown for a structured image analysis ("" when there is none)"""
+        if not analysis or not analysis.get("description"):
+            return ""
+        
+        markdown = "\n## AI Image Analysis\n\n"
+        markdown += f"- **Content Type**: {analysis.get('content_type', 'other')}\n\n"
+        markdown += analysis["description"] + "\n"
+        
+        if analysis.get("visible_text"):
+            markdown += "\n### Visible Text:\n\n"
+            markdown += "```\n" + analysis["visible_text"] + "\n```\n"
+        
+        chart = analysis.get("chart")
+        if chart:
+            markdown += "\n### Chart/Graph Analysis:\n\n"
+            if chart.get("type"):
+                markdown += f"- **Chart Type**: {chart['type']}\n\n"
+            if chart.get("columns") and chart.get("rows"):
+                width = len(chart["columns"])
+                
+                def cell(value: str) -> str:
+                    return value.replace("|", "\\|").replace("\n", " ")
+                
+                markdown += "| " + " | ".join(cell(c) for c in chart["columns"]) + " |\n"
+                markdown += "|" + " --- |" * width + "\n"
+                for row in chart["rows"]:
+                    row = (row + [""] * width)[:width]
+                    markdown += "| " + " | ".join(cell(c) for c in row) + " |\n"
+                markdown += "\n"
+            if chart.get("insights"):
+                markdown += chart["insights"] + "\n"
+        return markdown
+    
     async def convert_csv_file(self, csv_path: str) -> str:
         """Convert CSV file to markdown table"""
         markdown = f"# CSV File: {os.path.basename(csv_path)}\n\n"
@@ -444,9 +499,12 @@ class EnhancedConversionService:
         
         return markdown
     
+    @llm_usage.track_conversion
     async def convert_file_enhanced(self, input_path: str, output_filename: str, 
                                    is_url: bool = False, url_content: str = None,
-                                   use_ai_mode: bool = False) -> ConversionResult:
+                                   use_ai_mode: bool = False, progress_callback = None,
+                                   selector: Optional[RangeSelector] = None,
+                                   on_delta: Optional[Callable[[str, str], None]] = None) -> ConversionResult:
         """
         Enhanced file conversion with support for various formats
         
@@ -456,9 +514,16 @@ class EnhancedConversionService:
             is_url: Whether input is a URL
             url_content: Content if it's a URL (e.g., YouTube URL)
             use_ai_mode: Whether to use AI-enhanced conversion mode
+            progress_callback: Optional async progress callback (PDF OCR reports per page)
+            selector: PDF pages / PPTX slides / XLSX sheets to convert (all when None)
+            on_delta: Optional callback (section, text) receiving AI output as it is
+                generated; called from worker threads
         """
         conversion_id = str(uuid.uuid4())
         start_time = time.time()
+        page_progress = self._make_page_progress(progress_callback, conversion_id, input_path)
+        # All temp files of this job go here; removed in finally, also on cancellation
+        workspace = ScratchWorkspace(conversion_id)
         
         try:
             output_path = os.path.join(self.output_dir, output_filename)
@@ -471,17 +536,23 @@ class EnhancedConversionService:
                 file_ext = os.path.splitext(input_path)[1].lower()[1:]
                 
                 if file_ext == 'zip':
-                    markdown_content = await self.convert_zip_file(input_path)
+                    markdown_content = await self.convert_zip_file(input_path, workspace)
                 elif file_ext == 'json':
                     markdown_content = await self.convert_json_file(input_path)
                 elif file_ext == 'csv':
                     markdown_content = await self.convert_csv_file(input_path)
                 elif file_ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
-                    markdown_content = await self.convert_image_file(input_path, use_ai_mode)
+                    markdown_content = await self.convert_image_file(input_path, use_ai_mode, workspace, on_delta)
                 else:
-                    # Use markitdown for all other formats
-                    result = self.md.convert(input_path)
-                    markdown_content = result.text_content
+                    # Use markitdown for all other formats; only the selected parts are handed to it
+                    source_path, page_map = create_subset(input_path, selector, workspace)
+                    if file_ext == 'pdf':
+                        markdown_content = await asyncio.to_thread(pdf_text_backend.convert, source_path, self.md)
+                    else:
+                        result = self.md.convert(source_path)
+                        markdown_content = result.text_content
+                    # Image locations below use the original numbering; so must the text
+                    markdown_content = restore_page_numbers(markdown_content, page_map)
                     if not markdown_content:
                         # Fallback for unsupported formats
                         markdown_content = f"# File: {os.path.basename(input_path)}\n\n"
@@ -493,10 +564,15 @@ class EnhancedConversionService:
                     if file_ext in ['docx', 'pptx', 'xlsx', 'pdf']:
                         try:
                             # Enhance markdown with extracted images and OCR
-                            enhanced_markdown = self.doc_processor.enhance_markdown_with_images(
+                            # Run off the event loop so concurrent jobs can share OCR batches
+                            enhanced_markdown = await asyncio.to_thread(
+                                self.doc_processor.enhance_markdown_with_images,
                                 original_markdown=markdown_content,
                                 file_path=input_path,
-                                use_ai_mode=use_ai_mode
+                                use_ai_mode=use_ai_mode,
+                                progress_callback=page_progress,
+                                workspace=workspace,
+                                selector=selector
                             )
                             markdown_content = enhanced_markdown
                             logger.info(f"Enhanced {file_ext} document with extracted images")
@@ -544,6 +620,30 @@ class EnhancedConversionService:
                 error_message=f"Conversion error: {str(e)}",
                 processing_time=time.time() - start_time
             )
+        finally:
+            workspace.cleanup()
+    
+    def _make_page_progress(self, progress_callback, conversion_id: str, input_path: str):
+        """
+        Bridge the async progress callback to the per-page callback used by the extractor
+        
+        The extractor runs in a worker thread, so updates are scheduled onto the event loop.
+        """
+        if not progress_callback:
+            return None
+        
+        loop = asyncio.get_running_loop()
+        file_name = os.path.basename(input_path)
+        
+        def page_progress(pages_done: int, total_pages: int):
+            progress = 40 + int(50 * pages_done / max(total_pages, 1))
+            asyncio.run_coroutine_threadsafe(
+                progress_callback(conversion_id, progress, "processing",
+                                  f"OCR処理中... ({pages_done}/{total_pages}ページ)", file_name),
+                loop
+            )
+        
+        return page_progress
     
     async def batch_convert_enhanced(self, items: List[Dict[str, Any]]) -> List[ConversionResult]:
         """
@@ -0,0 +1,156 @@
+"""
+Image Triage
+Classifies embedded images so decorative ones skip OCR and only content-rich ones reach the vision model
+"""
+import io
+import os
+import threading
+import logging
+from typing import Dict, Any, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTriage:
+    """Route images to skip, OCR-only or OCR + vision description
+
+    Statistics are computed on an RGB copy downscaled to at most
+    ``ANALYSIS_SIZE`` pixels per side (JPEGs are decoded at reduced size via
+    draft mode), so triage costs far less than the OCR it saves:
+
+    - too small in either dimension or in area (bullets, spacers, icons) -> skip
+    - near-constant luminance and almost no edges (solid fills, blank
+      backgrounds) -> skip; both must hold, since text, charts and line
+      drawings are mostly background (low entropy) with a few sharp edges
+    - otherwise OCR, and additionally a vision description when the image is
+      large and has enough edges to be a photo, chart or diagram
+    """
+
+    SKIP = 'skip'
+    OCR_ONLY = 'ocr'
+    OCR_VISION = 'ocr_vision'
+
+    ANALYSIS_SIZE = 256
+    # Luminance step (0-255) between neighbouring pixels that counts as an edge
+    EDGE_STEP = 32
+
+    def __init__(self):
+        """Load thresholds from the environment (IMAGE_TRIAGE_*)"""
+        self.enabled = os.getenv("IMAGE_TRIAGE_ENABLED", "true").lower() == "true"
+        self.min_side = int(os.getenv("IMAGE_TRIAGE_MIN_SIDE", "24"))
+        self.min_pixels = int(os.getenv("IMAGE_TRIAGE_MIN_PIXELS", "4096"))
+        self.min_stddev = float(os.getenv("IMAGE_TRIAGE_MIN_STDDEV", "6.0"))
+        self.min_edge_density = float(os.getenv("IMAGE_TRIAGE_MIN_EDGE_DENSITY", "0.005"))
+        self.vision_min_side = int(os.getenv("IMAGE_TRIAGE_VISION_MIN_SIDE", "128"))
+        self.vision_min_edge_density = float(os.getenv("IMAGE_TRIAGE_VISION_MIN_EDGE_DENSITY", "0.01"))
+
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {self.SKIP: 0, self.OCR_ONLY: 0, self.OCR_VISION: 0}
+        self.reasons: Dict[str, int] = {}
+
+    def classify(self, image_data: bytes) -> Dict[str, Any]:
+        """
+        Classify an encoded image
+
+        Args:
+            image_data: Raw image bytes
+
+        Returns:
+            Dict with decision (SKIP / OCR_ONLY / OCR_VISION), reason and stats
+        """
+        if not self.enabled:
+            return self._count({'decision': self.OCR_VISION, 'reason': 'triage_disabled', 'stats': {}})
+
+        try:
+            with Image.open(io.BytesIO(image_data)) as img:
+                width, height = img.size
+                if min(width, height) < self.min_side or width * height < self.min_pixels:
+                    return self._count({
+                        'decision': self.SKIP,
+                        'reason': 'too_small',
+                        'stats': {'width': width, 'height': height}
+                    })
+
+                img.draft('RGB', (self.ANALYSIS_SIZE, self.ANALYSIS_SIZE))
+                img = img.convert('RGBA') if img.mode in ('P', 'LA', 'RGBA') else img.convert('RGB')
+                img.thumbnail((self.ANALYSIS_SIZE, self.ANALYSIS_SIZE))
+                stats = self._compute_stats(np.asarray(img))
+        except Exception as e:
+            # Unreadable here does not mean unreadable for OCR; let the pipeline decide
+            logger.debug(f"Image triage failed: {e}")
+            return self._count({'decision': self.OCR_ONLY, 'reason': 'analysis_failed', 'stats': {}})
+
+        stats.update({'width': width, 'height': height})
+        decision, reason = self._decide(stats)
+        return self._count({'decision': decision, 'reason': reason, 'stats': stats})
+
+    def _compute_stats(self, pixels: np.ndarray) -> Dict[str, float]:
+        """Entropy, luminance/color spread and edge density of a downscaled RGB(A) array"""
+        rgb = pixels[..., :3].astype(np.float32)
+        if pixels.shape[-1] == 4:
+            # Composite onto white so transparent regions read as background
+            alpha = pixels[..., 3:4].astype(np.float32) / 255.0
+            rgb = rgb * alpha + 255.0 * (1.0 - alpha)
+
+        luminance = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+        hist = np.bincount(luminance.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+        p = hist[hist > 0] / hist.sum()
+        entropy = float(-(p * np.log2(p)).sum())
+
+        # Mean per-channel spread of the colors; near zero for flat-colored images
+        color_std = float(rgb.reshape(-1, 3).std(axis=0).mean())
+
+        edges_x = np.abs(np.diff(luminance, axis=1)) > self.EDGE_STEP
+        edges_y = np.abs(np.diff(luminance, axis=0)) > self.EDGE_STEP
+        edge_density = float((edges_x.sum() + edges_y.sum()) / max(1, edges_x.size + edges_y.size))
+
+        return {
+            'entropy': round(entropy, 3),
+            'stddev': round(float(luminance.std()), 2),
+            'color_std': round(color_std, 2),
+            'edge_density': round(edge_density, 4)
+        }
+
+    def _decide(self, stats: Dict[str, float]) -> tuple:
+        """Apply thresholds to the computed statistics"""
+        if stats['stddev'] < self.min_stddev and stats['edge_density'] < self.min_edge_density:
+            return self.SKIP, 'flat'
+        if (min(stats['width'], stats['height']) >= self.vision_min_side
+                and stats['edge_density'] >= self.vision_min_edge_density):
+            return self.OCR_VISION, 'rich_content'
+        return self.OCR_ONLY, 'text_or_simple_graphic'
+
+    def _count(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.counters[result['decision']] += 1
+            self.reasons[result['reason']] = self.reasons.get(result['reason'], 0) + 1
+        return result
+
+    def wants_vision(self, image_info: Optional[Dict[str, Any]]) -> bool:
+        """Whether an extracted image should get an LLM description"""
+        return not image_info or image_info.get('triage', self.OCR_VISION) == self.OCR_VISION
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters per decision and reason, with the active thresholds"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'decisions': dict(self.counters),
+                'reasons': dict(self.reasons),
+                'thresholds': {
+                    'min_side': self.min_side,
+                    'min_pixels': self.min_pixels,
+                    'min_stddev': self.min_stddev,
+                    'min_edge_density': self.min_edge_density,
+                    'vision_min_side': self.vision_min_side,
+                    'vision_min_edge_density': self.vision_min_edge_density
+                }
+            }
+
+
+# グローバルインスタンス
+image_triage = ImageTriage()
@@ -25,10 +25,15 @@ class LegacyConverter:
         ext = os.path.splitext(file_path)[1].lower()[1:]
         return ext in self.supported_formats
     
-    def convert(self, file_path: str) -> Tuple[bool, str]:
+    def convert(self, file_path: str, output_dir: Optional[str] = None) -> Tuple[bool, str]:
         """
         Convert legacy file to modern format
         
+        Args:
+            file_path: Path to the legacy file
+            output_dir: Directory for the converted file (e.g. the job's scratch
+                workspace); defaults to the directory of the input file
+        
         Returns:
             Tuple of (success, converted_path_or_error_message)
         """
@@ -37,20 +42,25 @@ class LegacyConverter:
         if ext not in self.supported_formats:
             return False, f"Unsupported format: {ext}"
         
-        return self.supported_formats[ext](file_path)
+        return self.supported_formats[ext](file_path, output_dir or os.path.dirname(file_path))
+    
+    def _renamed_path(self, file_path: str, output_dir: str, new_ext: str) -> str:
+        """Path for a copy of file_path with a modern extension inside output_dir"""
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(output_dir, f"{base_name}.{new_ext}")
     
-    def _convert_ppt(self, file_path: str) -> Tuple[bool, str]:
+    def _convert_ppt(self, file_path: str, output_dir: str) -> Tuple[bool, str]:
         """Convert PPT to PPTX"""
         # First, try to detect if it's actually a renamed PPTX
         if self._is_renamed_pptx(file_path):
             # It's actually a PPTX file with PPT extension
-            new_path = file_path.replace('.ppt', '.pptx')
+            new_path = self._renamed_path(file_path, output_dir, 'pptx')
             shutil.copy2(file_path, new_path)
             return True, new_path
         
         # Try using LibreOffice if available
         if self._has_libreoffice():
-            return self._convert_with_libreoffice(file_path, 'pptx')
+            return self._convert_with_libreoffice(file_path, 'pptx', output_dir)
         
         # If it's a true binary PPT and no converter available
         return False, (
@@ -61,17 +71,17 @@ class LegacyConverter:
             "3. オンライン変換ツールを使用してPPTXに変換"
         )
     
-    def _convert_doc(self, file_path: str) -> Tuple[bool, str]:
+    def _convert_doc(self, file_path: str, output_dir: str) -> Tuple[bool, str]:
         """Convert DOC to DOCX"""
         # First, try to detect if it's actually a renamed DOCX
         if self._is_renamed_docx(file_path):
-            new_path = file_path.replace('.doc', '.docx')
+            new_path = self._renamed_path(file_path, output_dir, 'docx')
             shutil.copy2(file_path, new_path)
             return True, new_path
         
         # Try using LibreOffice if available
         if self._has_libreoffice():
-            return self._convert_with_libreoffice(file_path, 'docx')
+            return self._convert_with_libreoffice(file_path, 'docx', output_dir)
         
         return False, (
             "このファイルは古いバイナリ形式のDOCファイルです。\n"
@@ -81,17 +91,17 @@ class LegacyConverter:
             "3. オンライン変換ツールを使用してDOCXに変換"
         )
     
-    def _convert_xls(self, file_path: str) -> Tuple[bool, str]:
+    def _convert_xls(self, file_path: str, output_dir: str) -> Tuple[bool, str]:
         """Convert XLS to XLSX"""
         # First, try to detect if it's actually a renamed XLSX
         if self._is_renamed_xlsx(file_path):
-            new_path = file_path.replace('.xls', '.xlsx')
+            new_path = self._renamed_path(file_path, output_dir, 'xlsx')
             shutil.copy2(file_path, new_path)
             return True, new_path
         
         # Try using LibreOffice if available
         if self._has_libreoffice():
-            return self._convert_with_libreoffice(file_path, 'xlsx')
+            return self._convert_with_libreoffice(file_path, 'xlsx', output_dir)
         
         return False, (
             "このファイルは古いバイナリ形式のXLSファイルです。\n"
@@ -142,10 +152,9 @@ class LegacyConverter:
         except:
             return False
     
-    def _convert_with_libreoffice(self, file_path: str, output_format: str) -> Tuple[bool, str]:
+    def _convert_with_libreoffice(self, file_path: str, output_format: str, output_dir: str) -> Tuple[bool, str]:
         """Convert file using LibreOffice"""
         try:
-            output_dir = os.path.dirname(file_path)
             base_name = os.path.splitext(os.path.basename(file_path))[0]
             
             # Run LibreOffice conversion
@@ -0,0 +1,207 @@
+"""
+LLM Response Cache
+Disk-backed cache of LLM responses keyed by input content hash, prompt version, model and max_tokens
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Optional, Dict, Any
+
+from .llm_usage import llm_usage
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """SQLite cache for LLM responses
+
+    Keys are built from the hash of the input (image bytes or text), the
+    name and version of the prompt template, the model and max_tokens, so
+    changing any of them misses the cache instead of returning stale output.
+    Entries expire after ``LLM_CACHE_TTL_HOURS``; when the stored responses
+    exceed ``LLM_CACHE_MAX_MB`` the least recently used ones are evicted.
+    Only successful responses are stored by callers, never error messages.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_hours: Optional[float] = None,
+                 max_mb: Optional[float] = None):
+        """
+        Configure the cache (the database is opened on first use)
+
+        Args:
+            path: SQLite file (env: LLM_CACHE_PATH, default ./llm_cache/llm_cache.sqlite3)
+            ttl_hours: Entry lifetime (env: LLM_CACHE_TTL_HOURS, default 720)
+            max_mb: Size limit of stored responses (env: LLM_CACHE_MAX_MB, default 256)
+        """
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.path = path or os.getenv("LLM_CACHE_PATH", "./llm_cache/llm_cache.sqlite3")
+        self.ttl_seconds = (ttl_hours or float(os.getenv("LLM_CACHE_TTL_HOURS", "720"))) * 3600
+        self.max_bytes = (max_mb or float(os.getenv("LLM_CACHE_MAX_MB", "256"))) * 1024 * 1024
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(prompt: str, prompt_version: int, model: str, max_tokens: int,
+                 content_hash: str, *extra: Any) -> str:
+        """
+        Build a cache key
+
+        Args:
+            prompt: Prompt template name (e.g. "describe_image")
+            prompt_version: Template version; bump it when the prompt text changes
+            model: Model name
+            max_tokens: Completion token limit
+            content_hash: Hash of the image bytes or input text
+            *extra: Other values that end up in the prompt (context, hints, ...)
+
+        Returns:
+            Hex digest key
+        """
+        parts = [prompt, str(prompt_version), model, str(max_tokens), content_hash] + [str(e) for e in extra]
+        return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Cached response text, or None on a miss or expired entry
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] <= self.ttl_seconds:
+                    conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    self.hits += 1
+                    value = row[0]
+                else:
+                    if row:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    value = None
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+        llm_usage.record_cache(value is not None)
+        return value
+
+    def set(self, key: str, value: str):
+        """
+        Store a successful response
+
+        Args:
+            key: Key from make_key
+            value: Response text
+        """
+        if not self.enabled or not value:
+            return
+
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, size)
+                )
+                self.writes += 1
+                self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones beyond the size limit"""
+        deleted = conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > self.max_bytes:
+            # Trim to 90% so eviction does not run on every write
+            target = self.max_bytes * 0.9
+            for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall():
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                total -= size
+                deleted += 1
+        self.evictions += max(0, deleted)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use (caller holds the lock)"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            # WAL lets several server processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate and size of the cache"""
+        stats = {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / (self.hits + self.misses) if (self.hits + self.misses) else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'entries': 0,
+            'size_bytes': 0
+        }
+        if self.enabled:
+            try:
+                with self._lock:
+                    entries, size = self._connect().execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                    ).fetchone()
+                stats.update({'entries': entries, 'size_bytes': size})
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache stats failed: {e}")
+        return stats
+
+
+# グローバルインスタンス
+llm_cache = LLMCache()
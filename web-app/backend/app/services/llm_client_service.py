@@ -3,72 +3,303 @@ LLM Client Service for AI-enhanced document conversion
 Provides intelligent image description and document analysis
 """
 import os
-import base64
+import json
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from PIL import Image
 import io
+from concurrent.futures import ThreadPoolExecutor
+
+from .llm_cache import llm_cache
+from .vision_payload import vision_payload
+from .llm_gateway import llm_gateway, LLMUnavailableError
+from .llm_usage import llm_usage
+from .markdown_chunker import split_markdown, DEFAULT_CHUNK_TOKENS
+from .openai_client_factory import openai_client_factory, OPENAI_AVAILABLE
 
 logger = logging.getLogger(__name__)
 
-# Try to import OpenAI client
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+if not OPENAI_AVAILABLE:
     logger.warning("OpenAI library not available")
 
 class LLMClientService:
     """LLM client for AI-enhanced conversions"""
     
+    # Prompt template versions, part of the response cache key.
+    # Bump a version whenever its prompt text changes.
+    PROMPT_VERSIONS = {
+        "describe_image": 1,
+        "enhance_document": 2,
+        "chunk_notes": 1,
+        "chart_analysis": 1,
+        "image_analysis": 1,
+        "structured_extraction": 1,
+    }
+    
     def __init__(self, api_key: Optional[str] = None):
         """
         Initialize LLM client
         
         Args:
-            api_key: OpenAI API key (optional, can use env var)
+            api_key: OpenAI API key (optional, can use env var). Clients come
+                from the process-wide factory; a key that differs from the
+                configured one replaces it there.
         """
-        self.client = None
         self.model = "gpt-4o-mini"  # Default model for vision capabilities
+        # Maximum image descriptions in flight at once per document
+        self.max_concurrency = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
+        # Small images packed into one vision request (1 disables batching)
+        self.vision_batch_size = max(1, int(os.getenv("LLM_VISION_BATCH_SIZE", "4")))
         
         if OPENAI_AVAILABLE:
             try:
-                # Use provided API key or get from environment
-                key = api_key or os.getenv("OPENAI_API_KEY")
-                if key:
-                    self.client = OpenAI(api_key=key)
+                if api_key and api_key != openai_client_factory.api_key:
+                    openai_client_factory.rotate(api_key)
+                if self.client is not None:
                     logger.info("OpenAI client initialized successfully")
                 else:
                     logger.warning("No OpenAI API key provided")
             except Exception as e:
                 logger.error(f"Failed to initialize OpenAI client: {e}")
     
+    @property
+    def client(self):
+        """Shared OpenAI client (looked up on every use so key rotation applies)"""
+        return openai_client_factory.get_client()
+    
     def is_available(self) -> bool:
         """Check if LLM client is available"""
         return self.client is not None
     
-    def describe_image(self, image_path: str, context: str = "") -> str:
+    def describe_image(self, image_path: str, context: str = "",
+                       on_delta: Optional[Callable[[str, str], None]] = None) -> str:
         """
         Generate intelligent description of an image
         
         Args:
             image_path: Path to image file
             context: Additional context about the image (e.g., document type, location)
+            on_delta: Optional callback (section, text) receiving the description
+                as it is generated, under section "image_description"
             
         Returns:
-            AI-generated description of the image
+            AI-generated description of the image, or "" when the LLM call
+            failed (the image is then rendered without AI analysis)
         """
         if not self.is_available():
             return "AI description not available (LLM client not configured)"
         
         try:
-            # Load and encode image
-            with open(image_path, 'rb') as img_file:
-                image_data = base64.b64encode(img_file.read()).decode('utf-8')
+            cache_key = self._describe_image_key(image_path, context)
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                if on_delta:
+                    on_delta("image_description", cached)
+                return cached
+            
+            # Call OpenAI Vision API
+            request = dict(
+                model=self.model,
+                messages=self._describe_image_messages(image_path, context),
+                max_tokens=500
+            )
+            if on_delta:
+                description = llm_gateway.stream(
+                    self.client, lambda delta: on_delta("image_description", delta), feature="describe_image", **request
+                )
+            else:
+                description = llm_gateway.complete(self.client, feature="describe_image", **request).choices[0].message.content
+            llm_cache.set(cache_key, description)
+            return description
             
-            # Prepare prompt
-            prompt = f"""Please analyze this image and provide:
+        except LLMUnavailableError:
+            return ""
+        except Exception as e:
+            logger.error(f"Error describing image: {e}")
+            return ""
+    
+    async def describe_images(self, requests: List[Tuple[str, str]]) -> List[str]:
+        """
+        Describe several images concurrently
+        
+        At most ``max_concurrency`` requests (env: LLM_MAX_CONCURRENCY) are in
+        flight at once. Small images (sent with detail=low) are packed up to
+        ``vision_batch_size`` per request (env: LLM_VISION_BATCH_SIZE) with the
+        model asked for one description per image in JSON; if that answer
+        cannot be parsed, the images of the batch are described one by one.
+        Results are returned in request order, and a failure only affects its
+        own image, which gets "" like describe_image returns.
+        
+        Args:
+            requests: List of (image_path, context) tuples
+            
+        Returns:
+            List of descriptions, one per request
+        """
+        if not requests:
+            return []
+        if not self.is_available():
+            return ["AI description not available (LLM client not configured)"] * len(requests)
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results: List[Optional[str]] = [None] * len(requests)
+        cache_keys: List[Optional[str]] = [None] * len(requests)
+        
+        # Shared pooled client on the server loop; a client of its own on any other loop
+        async with openai_client_factory.async_client() as client:
+            async def lookup(index: int):
+                # Cached descriptions do not take a concurrency slot
+                image_path, context = requests[index]
+                try:
+                    cache_keys[index] = await asyncio.to_thread(self._describe_image_key, image_path, context)
+                    results[index] = llm_cache.get(cache_keys[index])
+                except Exception as e:
+                    logger.error(f"Error describing image {os.path.basename(image_path)}: {e}")
+                    results[index] = ""
+            
+            async def describe(index: int, payload: Optional[Tuple[str, str]] = None):
+                image_path, context = requests[index]
+                async with semaphore:
+                    try:
+                        response = await llm_gateway.acomplete(
+                            client,
+                            feature="describe_image",
+                            model=self.model,
+                            messages=await asyncio.to_thread(self._describe_image_messages, image_path, context, payload),
+                            max_tokens=500
+                        )
+                        results[index] = response.choices[0].message.content
+                        llm_cache.set(cache_keys[index], results[index])
+                    except LLMUnavailableError:
+                        results[index] = ""
+                    except Exception as e:
+                        logger.error(f"Error describing image {os.path.basename(image_path)}: {e}")
+                        results[index] = ""
+            
+            async def describe_batch(indexes: List[int], payloads: List[Tuple[str, str]]):
+                async with semaphore:
+                    try:
+                        response = await llm_gateway.acomplete(
+                            client,
+                            feature="describe_image_batch",
+                            model=self.model,
+                            messages=self._describe_image_batch_messages(
+                                [(requests[i][1], payload) for i, payload in zip(indexes, payloads)]
+                            ),
+                            max_tokens=min(4000, 400 * len(indexes)),
+                            response_format={"type": "json_object"}
+                        )
+                        descriptions = self._parse_batch_descriptions(response.choices[0].message.content, len(indexes))
+                    except LLMUnavailableError:
+                        for i in indexes:
+                            results[i] = ""
+                        return
+                    except Exception as e:
+                        logger.warning(f"Batched image description failed, describing {len(indexes)} images one by one: {e}")
+                        descriptions = None
+                
+                if descriptions is None:
+                    await asyncio.gather(*(describe(i, payload) for i, payload in zip(indexes, payloads)))
+                    return
+                for i, description in zip(indexes, descriptions):
+                    results[i] = description
+                    # Same cache entry as a single description of the image
+                    llm_cache.set(cache_keys[i], description)
+            
+            await asyncio.gather(*(lookup(i) for i in range(len(requests))))
+            pending = [i for i, result in enumerate(results) if result is None]
+            
+            tasks = []
+            if self.vision_batch_size > 1 and len(pending) > 1:
+                payloads = await asyncio.gather(*(asyncio.to_thread(self._prepare_payload, requests[i][0]) for i in pending))
+                small = [(i, payload) for i, payload in zip(pending, payloads) if payload and payload[1] == 'low']
+                small_indexes = {i for i, _ in small}
+                for i, payload in zip(pending, payloads):
+                    if i not in small_indexes:
+                        tasks.append(describe(i, payload))
+                for start in range(0, len(small), self.vision_batch_size):
+                    chunk = small[start:start + self.vision_batch_size]
+                    if len(chunk) == 1:
+                        tasks.append(describe(*chunk[0]))
+                    else:
+                        tasks.append(describe_batch([i for i, _ in chunk], [payload for _, payload in chunk]))
+            else:
+                tasks = [describe(i) for i in pending]
+            
+            await asyncio.gather(*tasks)
+            return results
+    
+    def _prepare_payload(self, image_path: str) -> Optional[Tuple[str, str]]:
+        """Vision payload of an image, or None if it cannot be read (it is then described alone)"""
+        try:
+            return vision_payload.prepare_file(image_path)
+        except Exception as e:
+            logger.warning(f"Could not prepare {os.path.basename(image_path)} for batching: {e}")
+            return None
+    
+    def _describe_image_batch_messages(self, items: List[Tuple[str, Tuple[str, str]]]) -> List[Dict[str, Any]]:
+        """Build one vision request for several images as (context, (data URL, detail)) pairs"""
+        prompt = f"""You will see {len(items)} images extracted from the same document, each preceded by its number and context.
+For each image provide:
+1. A brief description of what the image contains
+2. Any text visible in the image (if applicable)
+3. The type of content (diagram, chart, photo, screenshot, etc.)
+4. Key information or data points shown
+
+Answer with a JSON object of the form
+{{"descriptions": [{{"image": 1, "description": "..."}}, ...]}}
+with exactly {len(items)} entries, one per image, in order. Be concise but thorough."""
+        
+        content = [{"type": "text", "text": prompt}]
+        for number, (context, (data_url, detail)) in enumerate(items, 1):
+            content.append({
+                "type": "text",
+                "text": f"Image {number}. Context: {context if context else 'This image was extracted from a document.'}"
+            })
+            content.append(vision_payload.image_content(data_url, detail))
+        return [{"role": "user", "content": content}]
+    
+    def _parse_batch_descriptions(self, content: str, count: int) -> List[str]:
+        """
+        Read the per-image descriptions of a batched answer
+        
+        Raises:
+            ValueError: If the answer is not the expected JSON or misses an image
+        """
+        entries = json.loads(content or "").get("descriptions")
+        if not isinstance(entries, list):
+            raise ValueError("No descriptions list in batched answer")
+        
+        descriptions = {}
+        for position, entry in enumerate(entries, 1):
+            if not isinstance(entry, dict) or not isinstance(entry.get("description"), str):
+                raise ValueError(f"Malformed entry in batched answer: {entry!r}")
+            number = entry.get("image", position)
+            if isinstance(number, int) and 1 <= number <= count and entry["description"].strip():
+                descriptions[number] = entry["description"].strip()
+        
+        if len(descriptions) != count:
+            raise ValueError(f"Batched answer describes {len(descriptions)} of {count} images")
+        return [descriptions[number] for number in range(1, count + 1)]
+    
+    def _cache_key(self, prompt: str, model: str, max_tokens: int, content_hash: str, *extra: Any) -> str:
+        """Response cache key for a prompt template applied to some content"""
+        return llm_cache.make_key(prompt, self.PROMPT_VERSIONS[prompt], model, max_tokens, content_hash, *extra)
+    
+    def _describe_image_key(self, image_path: str, context: str = "") -> str:
+        """Response cache key of describe_image for an image file"""
+        return self._cache_key("describe_image", self.model, 500, llm_cache.hash_file(image_path),
+                               context, vision_payload.signature)
+    
+    def _describe_image_messages(self, image_path: str, context: str = "",
+                                 payload: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Build the vision chat messages for an image description"""
+        # Downscaled, re-encoded image and its detail level
+        data_url, detail = payload or vision_payload.prepare_file(image_path)
+        
+        # Prepare prompt
+        prompt = f"""Please analyze this image and provide:
 1. A brief description of what the image contains
 2. Any text visible in the image (if applicable)
 3. The type of content (diagram, chart, photo, screenshot, etc.)
@@ -77,44 +308,36 @@ class LLMClientService:
 Context: {context if context else 'This image was extracted from a document.'}
 
 Please be concise but thorough."""
-            
-            # Call OpenAI Vision API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_data}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=500
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error describing image: {e}")
-            return f"Error generating AI description: {str(e)}"
+        
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    vision_payload.image_content(data_url, detail)
+                ]
+            }
+        ]
     
     def enhance_document_content(self, 
                                 markdown_content: str, 
                                 document_type: str,
-                                extracted_images: List[Dict[str, Any]] = None) -> str:
+                                extracted_images: List[Dict[str, Any]] = None,
+                                on_delta: Optional[Callable[[str, str], None]] = None) -> str:
         """
         Enhance document content with AI analysis
         
+        Documents longer than one chunk (env: LLM_CHUNK_TOKENS) are analyzed
+        map-reduce style: notes on each chunk are generated in parallel, then
+        the analysis is written from the notes, so the whole document is
+        covered instead of only its beginning.
+        
         Args:
             markdown_content: Original markdown content
             document_type: Type of document (docx, pptx, pdf, etc.)
             extracted_images: List of extracted images with metadata
+            on_delta: Optional callback (section, text) receiving the analysis
+                as it is generated, under section "document_analysis"
             
         Returns:
             Enhanced markdown with AI insights
@@ -123,10 +346,26 @@ Please be concise but thorough."""
             return markdown_content
         
         try:
+            cache_key = self._cache_key("enhance_document", "gpt-4o-mini", 1000,
+                                        llm_cache.hash_text(markdown_content), document_type)
+            analysis = llm_cache.get(cache_key)
+            if analysis is not None:
+                if on_delta:
+                    on_delta("document_analysis", analysis)
+                return markdown_content + f"\n\n## AI Document Analysis\n\n{analysis}\n"
+            
+            chunks = split_markdown(markdown_content, DEFAULT_CHUNK_TOKENS)
+            if len(chunks) == 1:
+                source = f"Original content:\n{markdown_content}"
+            else:
+                notes = self._chunk_notes(chunks, document_type)
+                source = "Notes on each part of the document, in order:\n" + "\n\n".join(
+                    f"### Part {i}/{len(chunks)}\n{note}" for i, note in enumerate(notes, 1) if note
+                )
+            
             prompt = f"""You are analyzing a {document_type} document that has been converted to markdown.
             
-Original content:
-{markdown_content[:3000]}  # Limit to avoid token issues
+{source}
 
 Please provide:
 1. A brief summary of the document's main topics
@@ -136,7 +375,7 @@ Please provide:
 
 Keep the response in markdown format."""
 
-            response = self.client.chat.completions.create(
+            request = dict(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a document analysis assistant."},
@@ -145,8 +384,16 @@ Keep the response in markdown format."""
                 max_tokens=1000
             )
             
+            if on_delta:
+                analysis = llm_gateway.stream(
+                    self.client, lambda delta: on_delta("document_analysis", delta), feature="enhance_document", **request
+                )
+            else:
+                analysis = llm_gateway.complete(self.client, feature="enhance_document", **request).choices[0].message.content
+            llm_cache.set(cache_key, analysis)
+            
             # Add AI analysis section to markdown
-            ai_section = f"\n\n## AI Document Analysis\n\n{response.choices[0].message.content}\n"
+            ai_section = f"\n\n## AI Document Analysis\n\n{analysis}\n"
             
             return markdown_content + ai_section
             
@@ -154,6 +401,163 @@ Keep the response in markdown format."""
             logger.error(f"Error enhancing document: {e}")
             return markdown_content
     
+    def _chunk_notes(self, chunks: List[str], document_type: str) -> List[str]:
+        """
+        Summarize each chunk of a long document in parallel (map step)
+        
+        Args:
+            chunks: Markdown chunks in document order
+            document_type: Type of document
+            
+        Returns:
+            Notes per chunk in order ("" where a chunk failed)
+        """
+        def summarize(index: int, chunk: str) -> str:
+            cache_key = self._cache_key("chunk_notes", "gpt-4o-mini", 400, llm_cache.hash_text(chunk),
+                                        document_type, index, len(chunks))
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            try:
+                response = llm_gateway.complete(
+                    self.client,
+                    feature="chunk_notes",
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": "You are a document analysis assistant."},
+                        {"role": "user", "content": f"""This is part {index} of {len(chunks)} of a {document_type} document converted to markdown.
+
+{chunk}
+
+List the topics, key points and notable data of this part as concise markdown bullet points."""}
+                    ],
+                    max_tokens=400
+                )
+                notes = response.choices[0].message.content
+                llm_cache.set(cache_key, notes)
+                return notes
+            except LLMUnavailableError:
+                raise
+            except Exception as e:
+                logger.error(f"Error analyzing part {index}/{len(chunks)}: {e}")
+                return ""
+        
+        # Pool threads do not inherit the job context; take the job along for usage accounting
+        job = llm_usage.current()
+        
+        def summarize_in_job(index: int, chunk: str) -> str:
+            with llm_usage.activate(job):
+                return summarize(index, chunk)
+        
+        # The shared gateway rate limits; this only bounds the threads per document
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks))) as executor:
+            return list(executor.map(summarize_in_job, range(1, len(chunks) + 1), chunks))
+    
+    def analyze_image(self, image_path: str, context: str = "",
+                      on_delta: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """
+        Describe an image and extract its text and chart data in one vision call
+        
+        Args:
+            image_path: Path to image file
+            context: Additional context about the image (e.g., file name, size)
+            on_delta: Optional callback (section, text) receiving the description
+                under section "image_description" once the answer is parsed
+            
+        Returns:
+            Dict with description, visible_text, content_type and chart
+            (None, or a dict with type, columns, rows and insights); empty
+            when the LLM call failed (the image is then rendered without AI analysis)
+        """
+        if not self.is_available():
+            return {}
+        
+        try:
+            cache_key = self._cache_key("image_analysis", self.model, 900, llm_cache.hash_file(image_path),
+                                        context, vision_payload.signature)
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                analysis = self._parse_image_analysis(cached)
+            else:
+                # Structured output: the JSON is only usable once complete, so it is not streamed
+                response = llm_gateway.complete(
+                    self.client,
+                    feature="image_analysis",
+                    model=self.model,
+                    messages=self._analyze_image_messages(image_path, context),
+                    max_tokens=900,
+                    response_format={"type": "json_object"}
+                )
+                content = response.choices[0].message.content
+                analysis = self._parse_image_analysis(content)
+                llm_cache.set(cache_key, content)
+            
+            if on_delta and analysis["description"]:
+                on_delta("image_description", analysis["description"])
+            return analysis
+            
+        except LLMUnavailableError:
+            return {}
+        except Exception as e:
+            logger.error(f"Error analyzing image: {e}")
+            return {}
+    
+    def _analyze_image_messages(self, image_path: str, context: str = "") -> List[Dict[str, Any]]:
+        """Build the vision chat messages for a structured image analysis"""
+        data_url, detail = vision_payload.prepare_file(image_path)
+        
+        prompt = f"""Please analyze this image and answer with a JSON object with these keys:
+- "description": what the image contains and the key information it shows (concise but thorough)
+- "visible_text": any text visible in the image, verbatim ("" if none)
+- "content_type": one of "chart", "diagram", "table", "photo", "screenshot", "document", "other"
+- "chart": null unless the image is a chart, graph or data visualization; then an object
+  {{"type": "bar/line/pie/...", "columns": ["label", "series 1", ...], "rows": [["...", ...], ...],
+    "insights": "trends, patterns and key insights"}}
+  with the data points you can read in rows (omit values you cannot read).
+
+Context: {context if context else 'This image was extracted from a document.'}"""
+        
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    vision_payload.image_content(data_url, detail)
+                ]
+            }
+        ]
+    
+    def _parse_image_analysis(self, content: str) -> Dict[str, Any]:
+        """
+        Normalize a structured image analysis answer
+        
+        Raises:
+            ValueError: If the answer is not a JSON object with a description
+        """
+        data = json.loads(content or "")
+        if not isinstance(data, dict) or not isinstance(data.get("description"), str):
+            raise ValueError("No description in image analysis answer")
+        
+        chart = data.get("chart")
+        if isinstance(chart, dict):
+            columns = [str(column) for column in chart.get("columns") or []]
+            rows = [[str(cell) for cell in row] for row in chart.get("rows") or [] if isinstance(row, list)]
+            chart = {
+                "type": str(chart.get("type") or ""),
+                "columns": columns,
+                "rows": rows,
+                "insights": str(chart.get("insights") or "")
+            }
+        else:
+            chart = None
+        
+        return {
+            "description": data["description"].strip(),
+            "visible_text": str(data.get("visible_text") or "").strip(),
+            "content_type": str(data.get("content_type") or "other"),
+            "chart": chart
+        }
+    
     def analyze_chart_data(self, image_path: str) -> Dict[str, Any]:
         """
         Analyze chart or graph data from image
@@ -169,7 +573,15 @@ Keep the response in markdown format."""
         
         try:
             with open(image_path, 'rb') as img_file:
-                image_data = base64.b64encode(img_file.read()).decode('utf-8')
+                image_bytes = img_file.read()
+            
+            cache_key = self._cache_key("chart_analysis", self.model, 700, llm_cache.hash_bytes(image_bytes),
+                                        vision_payload.signature)
+            analysis = llm_cache.get(cache_key)
+            if analysis is not None:
+                return {"analysis": analysis, "type": "chart_analysis"}
+            
+            data_url, detail = vision_payload.prepare_bytes(image_bytes)
             
             prompt = """If this image contains a chart, graph, or data visualization:
 1. Identify the type of visualization
@@ -179,27 +591,27 @@ Keep the response in markdown format."""
 
 If it's not a data visualization, just describe what you see."""
             
-            response = self.client.chat.completions.create(
+            response = llm_gateway.complete(
+                self.client,
+                feature="chart_analysis",
                 model=self.model,
                 messages=[
                     {
                         "role": "user",
                         "content": [
                             {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_data}"
-                                }
-                            }
+                            vision_payload.image_content(data_url, detail)
                         ]
                     }
                 ],
                 max_tokens=700
             )
             
+            analysis = response.choices[0].message.content
+            llm_cache.set(cache_key, analysis)
+            
             return {
-                "analysis": response.choices[0].message.content,
+                "analysis": analysis,
                 "type": "chart_analysis"
             }
             
@@ -221,26 +633,20 @@ If it's not a data visualization, just describe what you see."""
             return "Image comparison not available"
         
         try:
-            # Encode all images
-            encoded_images = []
-            for path in image_paths[:4]:  # Limit to 4 images
-                with open(path, 'rb') as img_file:
-                    encoded_images.append(base64.b64encode(img_file.read()).decode('utf-8'))
+            # Downscale and encode all images
+            encoded_images = [vision_payload.prepare_file(path) for path in image_paths[:4]]  # Limit to 4 images
             
             # Build message content
             content = [
                 {"type": "text", "text": "Please compare these images and describe their similarities and differences. Note any progression, changes, or relationships between them."}
             ]
             
-            for i, img_data in enumerate(encoded_images):
-                content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{img_data}"
-                    }
-                })
+            for data_url, detail in encoded_images:
+                content.append(vision_payload.image_content(data_url, detail))
             
-            response = self.client.chat.completions.create(
+            response = llm_gateway.complete(
+                self.client,
+                feature="image_comparison",
                 model=self.model,
                 messages=[{"role": "user", "content": content}],
                 max_tokens=800
@@ -267,6 +673,12 @@ If it's not a data visualization, just describe what you see."""
             return {"error": "AI extraction not available"}
         
         try:
+            cache_key = self._cache_key("structured_extraction", "gpt-4o-mini", 800,
+                                        llm_cache.hash_text(text[:2000]), structure_hint)
+            extracted = llm_cache.get(cache_key)
+            if extracted is not None:
+                return {"extracted_data": extracted, "structure_type": structure_hint or "auto-detected"}
+            
             prompt = f"""Extract structured data from the following text.
 {f'Expected structure: {structure_hint}' if structure_hint else ''}
 
@@ -275,7 +687,9 @@ Text:
 
 Return the data in a clear, structured format (JSON-like structure preferred)."""
             
-            response = self.client.chat.completions.create(
+            response = llm_gateway.complete(
+                self.client,
+                feature="structured_extraction",
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a data extraction specialist. Extract and structure data clearly."},
@@ -284,8 +698,11 @@ Return the data in a clear, structured format (JSON-like structure preferred).""
                 max_tokens=800
             )
             
+            extracted = response.choices[0].message.content
+            llm_cache.set(cache_key, extracted)
+            
             return {
-                "extracted_data": response.choices[0].message.content,
+                "extracted_data": extracted,
                 "structure_type": structure_hint or "auto-detected"
             }
             
@@ -301,11 +718,16 @@ Return the data in a clear, structured format (JSON-like structure preferred).""
             "model": self.model if self.is_available() else None,
             "capabilities": [
                 "image_description",
+                "image_analysis",
                 "document_analysis", 
                 "chart_analysis",
                 "image_comparison",
                 "structured_extraction"
-            ] if self.is_available() else []
+            ] if self.is_available() else [],
+            "cache": llm_cache.get_stats(),
+            "vision_payload": vision_payload.get_stats(),
+            "gateway": llm_gateway.get_stats(),
+            "http_pool": openai_client_factory.get_status()
         }
 
 
@@ -315,17 +737,26 @@ class MockLLMService:
     def is_available(self) -> bool:
         return True
     
-    def describe_image(self, image_path: str, context: str = "") -> str:
+    def describe_image(self, image_path: str, context: str = "",
+                       on_delta: Optional[Callable[[str, str], None]] = None) -> str:
         """Mock image description"""
-        return f"""[AI Mock Description]
+        description = f"""[AI Mock Description]
 This appears to be an image from a document.
 Context: {context if context else 'Document image'}
 
 Note: This is a mock description. Configure OpenAI API key for real AI analysis."""
+        if on_delta:
+            on_delta("image_description", description)
+        return description
+    
+    async def describe_images(self, requests: List[Tuple[str, str]]) -> List[str]:
+        """Mock concurrent image descriptions"""
+        return [self.describe_image(image_path, context) for image_path, context in requests]
     
     def enhance_document_content(self, markdown_content: str, 
                                 document_type: str,
-                                extracted_images: List[Dict[str, Any]] = None) -> str:
+                                extracted_images: List[Dict[str, Any]] = None,
+                                on_delta: Optional[Callable[[str, str], None]] = None) -> str:
         """Mock document enhancement"""
         mock_analysis = f"""
 ## AI Document Analysis (Mock)
@@ -336,9 +767,21 @@ Note: This is a mock description. Configure OpenAI API key for real AI analysis.
 Configure OpenAI API key for intelligent document analysis.
 
 **Image Count:** {len(extracted_images) if extracted_images else 0} images found"""
+        if on_delta:
+            on_delta("document_analysis", mock_analysis)
         
         return markdown_content + mock_analysis
     
+    def analyze_image(self, image_path: str, context: str = "",
+                      on_delta: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """Mock structured image analysis"""
+        return {
+            "description": self.describe_image(image_path, context, on_delta),
+            "visible_text": "",
+            "content_type": "other",
+            "chart": None
+        }
+    
     def analyze_chart_data(self, image_path: str) -> Dict[str, Any]:
         return {
             "analysis": "Mock chart analysis - configure API for real analysis",
@@ -0,0 +1,422 @@
+"""
+LLM Gateway
+Shared rate limiting, retry with backoff and circuit breaker for every OpenAI call
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Callable
+
+from .llm_usage import llm_usage
+
+logger = logging.getLogger(__name__)
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+# Rough token cost of an image part by detail level
+IMAGE_TOKENS = {'low': 85, 'high': 765, 'auto': 765}
+
+
+class LLMUnavailableError(Exception):
+    """The circuit breaker is open; callers fall back to non-AI output"""
+    pass
+
+
+class LLMBudgetExceededError(LLMUnavailableError):
+    """The conversion job used up its token budget; handled like an open breaker"""
+    pass
+
+
+class TokenBucket:
+    """Per-minute limit that refills continuously
+
+    ``reserve`` takes the amount right away (the level may go negative) and
+    returns how long the caller has to wait before using it, so concurrent
+    callers queue up fairly without holding the lock while they sleep.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket and return the wait in seconds"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        """Give back an over-estimate once the real usage is known"""
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class CircuitBreaker:
+    """Stops calling the provider after repeated failures
+
+    After ``threshold`` consecutive provider failures the breaker opens and
+    calls fail immediately for ``reset_seconds``. Then a single probe call is
+    let through (half-open): success closes the breaker, failure opens it
+    again. A probe that ends without either (cancelled, or an error the
+    breaker does not count) would leave it half-open for good, so another
+    probe is let through once the previous one is ``reset_seconds`` old.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self.probe_at = now
+                return True
+            if self.state == self.HALF_OPEN and now - self.probe_at >= self.reset_seconds:
+                # The previous probe never reported back
+                self.probe_at = now
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """Open and still cooling down (no call would be let through)"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"LLM circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class LLMGateway:
+    """Single entry point for chat completion calls
+
+    Every call waits for the shared request and token buckets, is retried
+    with jittered exponential backoff on 429, timeouts, connection errors and
+    5xx (honouring Retry-After), and goes through one circuit breaker. When
+    the breaker is open, ``LLMUnavailableError`` is raised at once so callers
+    can produce their non-AI output instead of waiting on a provider that is
+    down. The OpenAI clients are created with ``max_retries=0`` so retries
+    happen only here.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(float(os.getenv("LLM_RPM", "500")))
+        self.tokens = TokenBucket(float(os.getenv("LLM_TPM", "200000")))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "4"))
+        self.retry_base = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+        self.retry_max = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+        self.breaker = CircuitBreaker(
+            threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+        )
+
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'throttled_seconds': 0.0}
+
+    def complete(self, client, feature: str = "other", **kwargs):
+        """
+        Call client.chat.completions.create through the gateway (blocking)
+
+        Args:
+            client: OpenAI client
+            feature: Prompt or code path making the call, for usage accounting
+            **kwargs: Arguments of chat.completions.create
+
+        Returns:
+            The chat completion response
+
+        Raises:
+            LLMUnavailableError: If the circuit breaker is open or the job's
+                token budget is used up
+        """
+        estimate = self._estimate_tokens(kwargs)
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            wait = self._reserve(estimate)
+            if wait:
+                time.sleep(wait)
+            try:
+                response = client.chat.completions.create(**kwargs)
+            except Exception as e:
+                delay = self._handle_error(e, attempt, kwargs, feature)
+                time.sleep(delay)
+                continue
+            return self._handle_success(response, estimate, kwargs, feature, started)
+
+    async def acomplete(self, client, feature: str = "other", **kwargs):
+        """
+        Call an AsyncOpenAI client's chat.completions.create through the gateway
+
+        Args:
+            client: AsyncOpenAI client
+            feature: Prompt or code path making the call, for usage accounting
+            **kwargs: Arguments of chat.completions.create
+
+        Returns:
+            The chat completion response
+
+        Raises:
+            LLMUnavailableError: If the circuit breaker is open or the job's
+                token budget is used up
+        """
+        estimate = self._estimate_tokens(kwargs)
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            wait = self._reserve(estimate)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await client.chat.completions.create(**kwargs)
+            except Exception as e:
+                delay = self._handle_error(e, attempt, kwargs, feature)
+                await asyncio.sleep(delay)
+                continue
+            return self._handle_success(response, estimate, kwargs, feature, started)
+
+    def stream(self, client, on_delta: Callable[[str], None], feature: str = "other", **kwargs) -> str:
+        """
+        Streaming chat completion through the gateway (blocking)
+
+        Each piece of generated text is passed to on_delta as it arrives.
+        Failures are retried only until the first piece has been delivered;
+        after that a retry would repeat output the caller already forwarded.
+
+        Args:
+            client: OpenAI client
+            on_delta: Called with each text delta, in order
+            feature: Prompt or code path making the call, for usage accounting
+            **kwargs: Arguments of chat.completions.create (stream is set here)
+
+        Returns:
+            The complete generated text
+
+        Raises:
+            LLMUnavailableError: If the circuit breaker is open or the job's
+                token budget is used up
+        """
+        estimate = self._estimate_tokens(kwargs)
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            wait = self._reserve(estimate)
+            if wait:
+                time.sleep(wait)
+            parts: List[str] = []
+            usage = None
+            try:
+                for chunk in client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs):
+                    usage = getattr(chunk, 'usage', None) or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+            except Exception as e:
+                if parts:
+                    self.breaker.record_failure()
+                    llm_usage.record_failure(kwargs.get('model', ''), feature)
+                    raise
+                delay = self._handle_error(e, attempt, kwargs, feature)
+                time.sleep(delay)
+                continue
+            self._handle_success(_StreamResult(usage), estimate, kwargs, feature, started)
+            return "".join(parts)
+
+    def wrap(self, client, feature: str = "other") -> "GatewayClient":
+        """Client proxy for code that calls client.chat.completions.create itself (MarkItDown)
+
+        Args:
+            client: OpenAI client, or a function returning the current one
+            feature: Name the proxied calls are accounted under
+        """
+        return GatewayClient(self, client, feature)
+
+    def is_open(self) -> bool:
+        """Whether AI calls are currently being short-circuited"""
+        return self.breaker.is_open()
+
+    def _check_breaker(self):
+        job = llm_usage.exceeded_budget()
+        if job is not None:
+            raise LLMBudgetExceededError(
+                f"Token budget of job {job.job_id} used up ({job.total_tokens}/{job.token_budget})"
+            )
+        if not self.breaker.allow():
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise LLMUnavailableError("LLM provider unavailable (circuit breaker open)")
+
+    def _reserve(self, estimate: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimate))
+        if wait:
+            with self._lock:
+                self.stats['throttled_seconds'] += wait
+        return wait
+
+    def _handle_success(self, response, estimate: int, kwargs: Dict[str, Any], feature: str, started: float):
+        self.breaker.record_success()
+        with self._lock:
+            self.stats['calls'] += 1
+        usage = getattr(response, 'usage', None)
+        total = getattr(usage, 'total_tokens', None) if usage else None
+        if total is not None and total < estimate:
+            self.tokens.refund(estimate - total)
+        llm_usage.record(
+            kwargs.get('model', ''),
+            feature,
+            getattr(usage, 'prompt_tokens', None) or 0,
+            getattr(usage, 'completion_tokens', None) or 0,
+            time.monotonic() - started
+        )
+        return response
+
+    def _handle_error(self, error: Exception, attempt: int, kwargs: Dict[str, Any], feature: str) -> float:
+        """Record a failed attempt and return the backoff, or re-raise when giving up"""
+        if not self._is_retryable(error):
+            # Bad requests are the caller's problem; the provider did answer
+            if OPENAI_AVAILABLE and isinstance(error, openai.APIStatusError):
+                self.breaker.record_success()
+            llm_usage.record_failure(kwargs.get('model', ''), feature)
+            raise error
+
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.is_open():
+            with self._lock:
+                self.stats['failures'] += 1
+            llm_usage.record_failure(kwargs.get('model', ''), feature)
+            raise error
+
+        with self._lock:
+            self.stats['retries'] += 1
+        # Full jitter keeps a burst of jobs from retrying in lockstep
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempt)))
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_max))
+        logger.warning(f"LLM call failed ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if not OPENAI_AVAILABLE:
+            return False
+        if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        try:
+            return float(headers.get('retry-after')) if headers and headers.get('retry-after') else None
+        except (TypeError, ValueError):
+            return None
+
+    def _estimate_tokens(self, kwargs: Dict[str, Any]) -> int:
+        """Prompt characters / 4 plus image parts plus max_tokens"""
+        tokens = kwargs.get('max_tokens') or 1000
+        for message in kwargs.get('messages', []):
+            content = message.get('content')
+            if isinstance(content, str):
+                tokens += len(content) // 4
+                continue
+            for part in content or []:
+                if part.get('type') == 'text':
+                    tokens += len(part.get('text', '')) // 4
+                elif part.get('type') == 'image_url':
+                    tokens += IMAGE_TOKENS.get(part.get('image_url', {}).get('detail', 'auto'), 765)
+        return tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Gateway counters and breaker state"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'breaker_state': self.breaker.state,
+            'breaker_times_opened': self.breaker.times_opened,
+            'rpm_limit': self.requests.capacity,
+            'tpm_limit': self.tokens.capacity
+        })
+        return stats
+
+
+class _StreamResult:
+    """Usage of a finished stream, shaped like a response for _handle_success"""
+
+    def __init__(self, usage):
+        self.usage = usage
+
+
+class GatewayClient:
+    """OpenAI client proxy whose chat.completions.create goes through the gateway"""
+
+    def __init__(self, gateway: LLMGateway, client, feature: str = "other"):
+        self._gateway = gateway
+        self._feature = feature
+        # A provider function is called on each use so a rotated client is picked up
+        self._provider = client if callable(client) else (lambda: client)
+        self.chat = _GatewayChat(self)
+
+    @property
+    def _client(self):
+        return self._provider()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _GatewayChat:
+    def __init__(self, owner: GatewayClient):
+        self.completions = _GatewayCompletions(owner)
+
+
+class _GatewayCompletions:
+    def __init__(self, owner: GatewayClient):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        return self._owner._gateway.complete(self._owner._client, feature=self._owner._feature, **kwargs)
+
+
+# グローバルインスタンス
+llm_gateway = LLMGateway()
@@ -0,0 +1,311 @@
+"""
+LLM Usage
+Per-job and aggregate accounting of LLM tokens, latency, estimated cost and cache hits
+"""
+import os
+import time
+import logging
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens (prompt, completion); unknown models are counted without cost
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+
+
+class UsageCounter:
+    """Calls, tokens, latency and cost of a group of LLM calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.cost_usd = 0.0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency: float, cost: float):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.latency_seconds += latency
+        self.max_latency_seconds = max(self.max_latency_seconds, latency)
+        self.cost_usd += cost
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UsageCounter":
+        counter = cls()
+        counter.calls = data.get('calls', 0)
+        counter.failures = data.get('failures', 0)
+        counter.prompt_tokens = data.get('prompt_tokens', 0)
+        counter.completion_tokens = data.get('completion_tokens', 0)
+        counter.latency_seconds = data.get('latency_seconds', 0.0)
+        counter.max_latency_seconds = data.get('max_latency_seconds', 0.0)
+        counter.cost_usd = data.get('estimated_cost_usd', 0.0)
+        return counter
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens,
+            'latency_seconds': round(self.latency_seconds, 3),
+            'avg_latency_seconds': round(self.latency_seconds / self.calls, 3) if self.calls else 0.0,
+            'max_latency_seconds': round(self.max_latency_seconds, 3),
+            'estimated_cost_usd': round(self.cost_usd, 6)
+        }
+
+
+class JobUsage:
+    """LLM usage of one conversion job, broken down by feature and model"""
+
+    def __init__(self, job_id: str, label: str = "", token_budget: int = 0,
+                 previous: Optional[Dict[str, Any]] = None):
+        self.job_id = job_id
+        self.label = label
+        self.token_budget = token_budget
+        self.started = time.time()
+        self.total = UsageCounter()
+        self.by_feature: Dict[str, UsageCounter] = {}
+        self.by_model: Dict[str, UsageCounter] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+        if previous:
+            # Continue a job whose conversion already finished (e.g. API enhancement afterwards)
+            self.total = UsageCounter.from_dict(previous)
+            self.by_feature = {name: UsageCounter.from_dict(data) for name, data in previous.get('by_feature', {}).items()}
+            self.by_model = {name: UsageCounter.from_dict(data) for name, data in previous.get('by_model', {}).items()}
+            self.cache_hits = previous.get('cache_hits', 0)
+            self.cache_misses = previous.get('cache_misses', 0)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.total.prompt_tokens + self.total.completion_tokens
+
+    def over_budget(self) -> bool:
+        return bool(self.token_budget) and self.total_tokens >= self.token_budget
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals for ConversionResult.llm_usage"""
+        with self._lock:
+            summary = self.total.to_dict()
+            summary.update({
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'token_budget': self.token_budget or None,
+                'by_feature': {name: counter.to_dict() for name, counter in self.by_feature.items()},
+                'by_model': {name: counter.to_dict() for name, counter in self.by_model.items()}
+            })
+        return summary
+
+
+class LLMUsageTracker:
+    """Records every LLM call against the conversion job it belongs to
+
+    The current job travels in a context variable, so it follows the job
+    through ``await`` and ``asyncio.to_thread`` without being passed to every
+    service. Code that hops to other threads or loops itself (thread pools,
+    ``run_coroutine_threadsafe``) takes ``current()`` along and re-enters it
+    with ``activate``. Calls made outside a job only count in the aggregates.
+    """
+
+    def __init__(self):
+        self.job_token_budget = int(os.getenv("LLM_JOB_TOKEN_BUDGET", "0"))
+        self._current: contextvars.ContextVar[Optional[JobUsage]] = contextvars.ContextVar("llm_job_usage", default=None)
+        self._lock = threading.Lock()
+        self.total = UsageCounter()
+        self.by_feature: Dict[str, UsageCounter] = {}
+        self.by_model: Dict[str, UsageCounter] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.jobs = 0
+        self.budget_exceeded = 0
+        # Most recent finished jobs, to see which documents drive usage
+        self.recent_jobs: deque = deque(maxlen=int(os.getenv("LLM_USAGE_RECENT_JOBS", "50")))
+
+    @contextmanager
+    def track(self, job_id: str, label: str = "",
+              previous: Optional[Dict[str, Any]] = None) -> Iterator[JobUsage]:
+        """
+        Account the LLM calls made inside the block to a job
+
+        A block nested in another job's block (a service called from an
+        endpoint that already tracks) joins the outer job.
+
+        Args:
+            job_id: Conversion id
+            label: Input file name or URL, shown in recent jobs
+            previous: ConversionResult.llm_usage of the same job to continue from
+
+        Yields:
+            JobUsage whose summary() goes into ConversionResult.llm_usage
+        """
+        outer = self._current.get()
+        if outer is not None:
+            yield outer
+            return
+
+        usage = JobUsage(job_id, label, self.job_token_budget, previous)
+        token = self._current.set(usage)
+        try:
+            yield usage
+        finally:
+            self._current.reset(token)
+            self._finish(usage)
+
+    def track_conversion(self, func):
+        """
+        Decorator for async conversion methods returning a ConversionResult
+
+        The calls of the method are tracked as a job named after the result,
+        whose totals are stored in result.llm_usage.
+        """
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with self.track("") as usage:
+                result = await func(*args, **kwargs)
+                if result is not None and not usage.job_id:
+                    usage.job_id, usage.label = result.id, result.input_file or ""
+            if result is not None:
+                result.llm_usage = usage.summary()
+            return result
+        return wrapper
+
+    @contextmanager
+    def activate(self, usage: Optional[JobUsage]) -> Iterator[None]:
+        """Make a job current in another thread or event loop (see current())"""
+        token = self._current.set(usage)
+        try:
+            yield
+        finally:
+            self._current.reset(token)
+
+    def current(self) -> Optional[JobUsage]:
+        """The job the running code belongs to, if any"""
+        return self._current.get()
+
+    def exceeded_budget(self) -> Optional[JobUsage]:
+        """
+        The current job if it used up its token budget (LLM_JOB_TOKEN_BUDGET)
+
+        The gateway checks this before every call and refuses the call, so
+        the job finishes with its non-AI output instead of running up the bill.
+        """
+        usage = self._current.get()
+        if usage is None or not usage.over_budget():
+            return None
+        with self._lock:
+            self.budget_exceeded += 1
+        return usage
+
+    def record(self, model: str, feature: str, prompt_tokens: int, completion_tokens: int, latency: float):
+        """
+        Record a completed LLM call
+
+        Args:
+            model: Model name of the request
+            feature: Which prompt or code path made the call
+            prompt_tokens: Prompt tokens reported by the API
+            completion_tokens: Completion tokens reported by the API
+            latency: Seconds from the first attempt to the answer (retries included)
+        """
+        cost = self._cost(model, prompt_tokens, completion_tokens)
+        for lock, owner in self._owners():
+            with lock:
+                owner.total.add(prompt_tokens, completion_tokens, latency, cost)
+                owner.by_feature.setdefault(feature, UsageCounter()).add(prompt_tokens, completion_tokens, latency, cost)
+                owner.by_model.setdefault(model, UsageCounter()).add(prompt_tokens, completion_tokens, latency, cost)
+
+    def record_failure(self, model: str, feature: str):
+        """Record an LLM call that gave up (after retries)"""
+        for lock, owner in self._owners():
+            with lock:
+                owner.total.failures += 1
+                owner.by_feature.setdefault(feature, UsageCounter()).failures += 1
+                owner.by_model.setdefault(model, UsageCounter()).failures += 1
+
+    def record_cache(self, hit: bool):
+        """Record a response cache lookup"""
+        for lock, owner in self._owners():
+            with lock:
+                if hit:
+                    owner.cache_hits += 1
+                else:
+                    owner.cache_misses += 1
+
+    def _owners(self):
+        """(lock, counters) pairs a call is recorded in: the aggregates and the current job"""
+        owners = [(self._lock, self)]
+        usage = self._current.get()
+        if usage is not None:
+            owners.append((usage._lock, usage))
+        return owners
+
+    def _finish(self, usage: JobUsage):
+        summary = usage.summary()
+        with self._lock:
+            # A continued job replaces its earlier entry
+            started = usage.started
+            for entry in list(self.recent_jobs):
+                if entry['job_id'] == usage.job_id:
+                    self.recent_jobs.remove(entry)
+                    started = entry['started']
+                    break
+            else:
+                self.jobs += 1
+            self.recent_jobs.append({
+                'job_id': usage.job_id,
+                'label': usage.label,
+                'started': started,
+                'duration_seconds': round(time.time() - started, 3),
+                'calls': summary['calls'],
+                'total_tokens': summary['total_tokens'],
+                'latency_seconds': summary['latency_seconds'],
+                'estimated_cost_usd': summary['estimated_cost_usd'],
+                'cache_hits': summary['cache_hits']
+            })
+        if summary['calls']:
+            logger.info(f"LLM usage for {usage.label or usage.job_id}: {summary['calls']} calls, "
+                        f"{summary['total_tokens']} tokens, {summary['latency_seconds']:.1f}s, "
+                        f"~${summary['estimated_cost_usd']:.4f}")
+
+    def _cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        for name, (prompt_price, completion_price) in MODEL_PRICES.items():
+            # Dated snapshots ("gpt-4o-mini-2024-07-18") use their base model's price
+            if model == name or model.startswith(name + '-'):
+                return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        return 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Aggregate usage since start, slowest features first"""
+        with self._lock:
+            by_feature = {name: counter.to_dict() for name, counter in self.by_feature.items()}
+            stats = self.total.to_dict()
+            stats.update({
+                'jobs': self.jobs,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'job_token_budget': self.job_token_budget or None,
+                'budget_exceeded': self.budget_exceeded,
+                'by_feature': dict(sorted(by_feature.items(), key=lambda item: -item[1]['avg_latency_seconds'])),
+                'by_model': {name: counter.to_dict() for name, counter in self.by_model.items()},
+                'recent_jobs': list(self.recent_jobs)
+            })
+        return stats
+
+
+# グローバルインスタンス
+llm_usage = LLMUsageTracker()
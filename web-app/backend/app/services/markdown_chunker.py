@@ -0,0 +1,195 @@
+"""
+Markdown Chunker
+Token-aware splitting of Markdown on headings, tables and code blocks for map-reduce LLM calls
+"""
+import os
+import re
+from typing import List, Tuple
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Default chunk size in tokens (env: LLM_CHUNK_TOKENS)
+DEFAULT_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "2000"))
+
+_HEADING = re.compile(r'^#{1,6}\s')
+_FENCE = re.compile(r'^(```|~~~)')
+_TABLE_ROW = re.compile(r'^\s*\|')
+_TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-{3,}')
+
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Count the tokens of a text
+
+    Uses tiktoken when installed. Otherwise ASCII is counted as about four
+    characters per token and other characters (Japanese) as one token each,
+    which errs on the high side.
+    """
+    global _encoding
+    if TIKTOKEN_AVAILABLE:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def split_markdown(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    Split Markdown into chunks of at most max_tokens
+
+    Chunks break before headings where possible and never inside a table or
+    fenced code block, unless that block alone is larger than a chunk: then a
+    table is split between rows (repeating its header) and other blocks
+    between lines. Joining the chunks with blank lines gives back the document,
+    except that the header rows of a split table appear in each of its chunks.
+
+    Args:
+        text: Markdown text
+        max_tokens: Maximum tokens per chunk
+
+    Returns:
+        Chunks in document order (a single chunk when the text fits)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n\n".join(current))
+        current, current_tokens = [], 0
+
+    for section in _sections(_blocks(text)):
+        section_tokens = sum(tokens for _, tokens in section)
+        # Start a heading's section in a new chunk unless it fits in the current one
+        if current and current_tokens + section_tokens > max_tokens:
+            flush()
+        for block, tokens in section:
+            if tokens > max_tokens:
+                parts = _split_block(block, max_tokens)
+                # Keep the heading with the first part of its oversized block
+                if current and current_tokens + estimate_tokens(parts[0]) <= max_tokens:
+                    current.append(parts.pop(0))
+                flush()
+                chunks.extend(parts)
+                continue
+            if current and current_tokens + tokens > max_tokens:
+                flush()
+            current.append(block)
+            current_tokens += tokens
+    flush()
+    return chunks
+
+
+def _blocks(text: str) -> List[str]:
+    """Paragraphs, headings, tables and code blocks, without blank separator lines"""
+    blocks: List[str] = []
+    lines: List[str] = []
+    in_fence = False
+    in_table = False
+
+    def end_block():
+        nonlocal lines, in_table
+        if lines:
+            blocks.append("\n".join(lines))
+        lines, in_table = [], False
+
+    for line in text.split("\n"):
+        if in_fence:
+            lines.append(line)
+            if _FENCE.match(line.strip()):
+                in_fence = False
+                end_block()
+            continue
+        if _FENCE.match(line.strip()):
+            end_block()
+            lines.append(line)
+            in_fence = True
+        elif _HEADING.match(line):
+            end_block()
+            blocks.append(line)
+        elif _TABLE_ROW.match(line):
+            if not in_table:
+                end_block()
+                in_table = True
+            lines.append(line)
+        elif not line.strip():
+            end_block()
+        else:
+            if in_table:
+                end_block()
+            lines.append(line)
+    end_block()
+    return blocks
+
+
+def _sections(blocks: List[str]) -> List[List[tuple]]:
+    """Group blocks under their heading as [(block, tokens), ...]"""
+    sections: List[List[tuple]] = []
+    for block in blocks:
+        if _HEADING.match(block) or not sections:
+            sections.append([])
+        sections[-1].append((block, estimate_tokens(block)))
+    return sections
+
+
+def _split_block(block: str, max_tokens: int) -> List[str]:
+    """Split an oversized block between lines; tables keep their header in every part"""
+    lines = block.split("\n")
+    header: List[str] = []
+    if len(lines) > 2 and _TABLE_ROW.match(lines[0]) and _TABLE_SEPARATOR.match(lines[1]):
+        header, lines = lines[:2], lines[2:]
+    header_tokens = estimate_tokens("\n".join(header)) if header else 0
+
+    parts: List[str] = []
+    current: List[str] = []
+    current_tokens = header_tokens
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if current and current_tokens + tokens > max_tokens:
+            parts.append("\n".join(header + current))
+            current, current_tokens = [], header_tokens
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        parts.append("\n".join(header + current))
+    return parts
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    Split Markdown into heading sections
+
+    A section runs from a heading to the next heading (text before the first
+    heading is a section with an empty heading). Headings inside fenced code
+    blocks are ignored. Joining the section texts with newlines gives back
+    the document.
+
+    Args:
+        text: Markdown text
+
+    Returns:
+        (heading line, section text) pairs in document order
+    """
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    in_fence = False
+    for line in text.split("\n"):
+        if _FENCE.match(line.strip()):
+            in_fence = not in_fence
+        elif not in_fence and _HEADING.match(line):
+            sections.append((line.strip(), []))
+        sections[-1][1].append(line)
+    if not sections[0][1]:
+        sections.pop(0)
+    return [(heading, "\n".join(lines)) for heading, lines in sections]
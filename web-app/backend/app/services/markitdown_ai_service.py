@@ -6,9 +6,11 @@ import os
 import logging
 from typing import Optional, Dict, Any
 from markitdown import MarkItDown
-from openai import OpenAI
 from app.models.data_models import ConversionResult, ConversionStatus
 from app.services.cancel_manager import cancel_manager
+from app.services.llm_gateway import llm_gateway, LLMUnavailableError
+from app.services.openai_client_factory import openai_client_factory
+from app.services.llm_usage import llm_usage
 import time
 import uuid
 import asyncio
@@ -32,10 +34,11 @@ class MarkItDownAIService:
         self.md_normal = MarkItDown(enable_plugins=False)
         
         # AI mode用のMarkItDown（LLM統合）
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
+        if openai_client_factory.is_configured():
             try:
-                self.llm_client = OpenAI(api_key=api_key)
+                # MarkItDownの呼び出しも共有LLMゲートウェイ（レート制限・リトライ・サーキットブレーカー）を通す
+                # クライアントは呼び出しごとにファクトリから取得（APIキー切り替えを反映）
+                self.llm_client = llm_gateway.wrap(openai_client_factory.get_client, feature="markitdown")
                 # MarkItDownにLLMクライアントを直接渡す（MarkitDown.mdcのパターンに従う）
                 self.md_ai = MarkItDown(
                     llm_client=self.llm_client,
@@ -49,6 +52,7 @@ class MarkItDownAIService:
             logger.warning("OpenAI API key not found, AI mode disabled")
             self.md_ai = self.md_normal
     
+    @llm_usage.track_conversion
     async def convert_with_ai(
         self, 
         file_path: str, 
@@ -93,6 +97,11 @@ class MarkItDownAIService:
             if progress_callback:
                 await progress_callback(conversion_id, 20, "processing", "変換準備中...", os.path.basename(file_path))
             
+            # LLMが停止中（サーキットブレーカーが開いている）なら通常モードで変換
+            if use_ai_mode and self.is_ai_available() and llm_gateway.is_open():
+                logger.warning("LLM unavailable, converting without AI")
+                use_ai_mode = False
+            
             # 適切なMarkItDownインスタンスを選択
             md = self.md_ai if use_ai_mode and self.is_ai_available() else self.md_normal
             
@@ -113,10 +122,14 @@ class MarkItDownAIService:
                 if use_ai_mode and self.is_ai_available():
                     if progress_callback:
                         await progress_callback(conversion_id, 50, "processing", "AI分析中...", os.path.basename(file_path))
-                    # AI modeの場合、MarkItDownでAI分析を取得
-                    result = md.convert(file_path)
-                    if result and result.text_content:
-                        ai_description = result.text_content
+                    # AI modeの場合、MarkItDownでAI分析を取得（失敗時はOCRのみ）
+                    try:
+                        # ゲートウェイのレート制限待ち・リトライがイベントループを止めないようスレッドで実行
+                        result = await asyncio.to_thread(md.convert, file_path)
+                        if result and result.text_content:
+                            ai_description = result.text_content
+                    except LLMUnavailableError:
+                        logger.warning("LLM unavailable, image processed with OCR only")
                 
                 if progress_callback:
                     await progress_callback(conversion_id, 70, "processing", "OCR処理中...", os.path.basename(file_path))
@@ -125,7 +138,14 @@ class MarkItDownAIService:
             else:
                 # 他のファイル形式の変換
                 logger.info(f"Converting {file_path} with {'AI' if use_ai_mode else 'Normal'} mode")
-                result = md.convert(file_path)
+                try:
+                    # ゲートウェイのレート制限待ち・リトライがイベントループを止めないようスレッドで実行
+                    result = await asyncio.to_thread(md.convert, file_path)
+                except LLMUnavailableError:
+                    # 変換途中でブレーカーが開いた場合は通常モードでやり直す
+                    logger.warning("LLM unavailable during conversion, retrying without AI")
+                    use_ai_mode = False
+                    result = await asyncio.to_thread(self.md_normal.convert, file_path)
                 
                 if not result or not result.text_content:
                     raise ValueError("変換結果が空です")
@@ -0,0 +1,176 @@
+"""
+OCR Batch Scheduler
+Collects OCR requests from all in-flight conversions and runs them as batches
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OCRBatchScheduler:
+    """Dynamic micro-batching front end for an OCR service
+
+    Callers submit single images and get a Future back. A background worker
+    waits up to ``max_wait_ms`` after the first request arrives (or until
+    ``max_batch_size`` requests are queued), runs the whole batch through the
+    OCR service in one call and resolves each caller's future with its text.
+    The OCR service is only ever used under ``_ocr_lock`` (PaddleOCR is not
+    thread-safe), so callers that need more than text go through
+    ``extract_text_with_details`` instead of the service itself.
+    """
+
+    def __init__(self, ocr_service, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        """
+        Initialize the scheduler
+
+        Args:
+            ocr_service: OCR service instance (PaddleOCR or Mock)
+            max_batch_size: Maximum number of images per batch (env: OCR_BATCH_MAX_SIZE)
+            max_wait_ms: Maximum time to wait for a batch to fill (env: OCR_BATCH_MAX_WAIT_MS)
+        """
+        self.ocr_service = ocr_service
+        self.max_batch_size = max(1, max_batch_size or int(os.getenv("OCR_BATCH_MAX_SIZE", "8")))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("OCR_BATCH_MAX_WAIT_MS", "10"))) / 1000.0
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._ocr_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stopped = False
+
+        # Statistics
+        self.total_requests = 0
+        self.total_batches = 0
+
+    def submit(self, image_path: str) -> Future:
+        """
+        Queue an image for OCR
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            Future resolving to the extracted text
+        """
+        future: Future = Future()
+        if self._stopped:
+            future.set_exception(RuntimeError("OCR scheduler has been shut down"))
+            return future
+
+        self._ensure_worker()
+        self._queue.put((image_path, future))
+        return future
+
+    def extract_text(self, image_path: str) -> str:
+        """
+        Extract text from image through the batching queue (blocking)
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            Extracted text as string
+        """
+        return self.submit(image_path).result()
+
+    def extract_text_with_details(self, image_path: str) -> List[Tuple[str, float]]:
+        """
+        Extract text regions with confidence scores (blocking, not batched)
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            List of (text, confidence) tuples; empty if the service cannot provide them
+        """
+        if not hasattr(self.ocr_service, 'extract_text_with_details'):
+            return []
+        with self._ocr_lock:
+            return self.ocr_service.extract_text_with_details(image_path)
+
+    def _ensure_worker(self):
+        """Start the batching thread on first use"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="ocr-batch-scheduler", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """Worker loop: gather a batch, run it, resolve futures"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Re-queue stop marker after this batch
+                    break
+                batch.append(item)
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[str, Future]]):
+        """Run one batch through the OCR service"""
+        # Skip requests whose callers already gave up
+        batch = [(path, future) for path, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        paths = [path for path, _ in batch]
+        self.total_requests += len(batch)
+        self.total_batches += 1
+
+        try:
+            with self._ocr_lock:
+                if hasattr(self.ocr_service, 'extract_text_batch'):
+                    texts = self.ocr_service.extract_text_batch(paths)
+                else:
+                    texts = [self.ocr_service.extract_text(path) for path in paths]
+
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+        except Exception as e:
+            logger.error(f"Batched OCR error ({len(batch)} images): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def shutdown(self):
+        """Stop the batching thread after queued requests are processed"""
+        self._stopped = True
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+
+    def is_available(self) -> bool:
+        """Check if the underlying OCR service is available"""
+        return bool(getattr(self.ocr_service, 'is_available', lambda: True)())
+
+    def get_status(self) -> dict:
+        """Get status of the underlying OCR service with batching statistics"""
+        status = dict(self.ocr_service.get_status()) if hasattr(self.ocr_service, 'get_status') else {}
+        status['batching'] = {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'total_requests': self.total_requests,
+            'total_batches': self.total_batches,
+            'average_batch_size': (self.total_requests / self.total_batches) if self.total_batches else 0.0
+        }
+        return status
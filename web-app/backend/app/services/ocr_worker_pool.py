@@ -0,0 +1,148 @@
+"""
+OCR Worker Pool
+Runs PaddleOCR in several worker processes so pages can be recognized in parallel
+"""
+import os
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# PaddleOCR instance owned by each worker process
+_worker_ocr = None
+
+
+def _init_worker():
+    """Load the OCR model once per worker process"""
+    global _worker_ocr
+    from .paddle_ocr_service import PaddleOCRService
+    _worker_ocr = PaddleOCRService()
+
+
+def _worker_extract_text(image_path: str) -> str:
+    """Run OCR for one image inside a worker process"""
+    return _worker_ocr.extract_text(image_path)
+
+
+def _worker_extract_details(image_path: str) -> List[Tuple[str, float]]:
+    """Run OCR with confidence scores for one image inside a worker process"""
+    return _worker_ocr.extract_text_with_details(image_path)
+
+
+def configured_processes() -> int:
+    """
+    Number of OCR worker processes requested by OCR_WORKER_PROCESSES
+
+    "0" or "1" (default) keeps OCR in the server process, "auto" uses one
+    process per CPU core, any larger number that many processes.
+    """
+    value = os.getenv("OCR_WORKER_PROCESSES", "0").strip().lower()
+    if value == "auto":
+        return os.cpu_count() or 1
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid OCR_WORKER_PROCESSES={value!r}, running OCR in-process")
+        return 0
+
+
+class OCRProcessPool:
+    """Process pool exposing the PaddleOCRService text extraction interface
+
+    Each worker loads its own PaddleOCR model, so a batch of N pages is
+    recognized on up to N cores at once and results come back in input order.
+    Opt-in (OCR_WORKER_PROCESSES); the server process then loads no model.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        """
+        Initialize the pool
+
+        Args:
+            processes: Number of worker processes (env: OCR_WORKER_PROCESSES, default: CPU count)
+        """
+        self.processes = processes or configured_processes() or os.cpu_count() or 1
+        # spawn avoids forking a process that already holds OCR/BLAS threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        logger.info(f"OCR worker pool started with {self.processes} processes")
+
+    def submit(self, image_path: str) -> Future:
+        """
+        Queue an image for OCR on the next free worker
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            Future resolving to the extracted text
+        """
+        return self._executor.submit(_worker_extract_text, image_path)
+
+    def extract_text(self, image_path: str) -> str:
+        """
+        Extract text from image on a worker process
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            Extracted text as string
+        """
+        return self.submit(image_path).result()
+
+    def extract_text_with_details(self, image_path: str) -> List[Tuple[str, float]]:
+        """
+        Extract text regions with confidence scores on a worker process
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            List of (text, confidence) tuples
+        """
+        return self._executor.submit(_worker_extract_details, image_path).result()
+
+    def extract_text_batch(self, image_paths: List[str]) -> List[str]:
+        """
+        Extract text from several images spread over the worker processes
+
+        Args:
+            image_paths: Paths to the image files
+
+        Returns:
+            Extracted text for each image, in the same order as image_paths
+        """
+        futures = [self.submit(path) for path in image_paths]
+        results = []
+        for path, future in zip(image_paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"OCR worker error for {os.path.basename(path)}: {e}")
+                results.append(f"OCR extraction failed: {str(e)}")
+        return results
+
+    def shutdown(self):
+        """Stop all worker processes"""
+        self._executor.shutdown(wait=True)
+
+    def is_available(self) -> bool:
+        """The pool is usable whenever PaddleOCR is; checked by the caller before creating it"""
+        return True
+
+    def get_status(self) -> dict:
+        """Get status of the OCR worker pool"""
+        return {
+            'type': 'PaddleOCR',
+            'available': True,
+            'message': f'PaddleOCR running in {self.processes} worker processes',
+            'languages': ['en', 'japan', 'ch', 'korean'],
+            'gpu_enabled': False,
+            'worker_processes': self.processes
+        }
@@ -0,0 +1,219 @@
+"""
+OOXML Media Extractor
+Reads embedded images straight from the DOCX/PPTX/XLSX zip archive
+"""
+import os
+import zipfile
+import posixpath
+import logging
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+
+from .range_selector import RangeSelector
+
+logger = logging.getLogger(__name__)
+
+# XML namespaces used by the parts we read
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_DRAWING = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_WORD = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+NS_PRESENTATION = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_SHEET = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_SHEET_DRAWING = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_VML = "urn:schemas-microsoft-com:vml"
+
+# Image references: DrawingML <a:blip r:embed> and legacy VML <v:imagedata r:id>
+BLIP_TAG = f"{{{NS_DRAWING}}}blip"
+VML_IMAGE_TAG = f"{{{NS_VML}}}imagedata"
+EMBED_ATTR = f"{{{NS_REL}}}embed"
+ID_ATTR = f"{{{NS_REL}}}id"
+
+# Formats written to disk unchanged; anything else PIL can open is re-encoded to PNG
+NATIVE_EXTS = {'png', 'jpg', 'jpeg', 'bmp', 'tif', 'tiff', 'webp'}
+# Vector formats that neither PIL nor OCR can read
+SKIPPED_EXTS = {'emf', 'wmf', 'svg'}
+
+
+class OOXMLMediaExtractor:
+    """Stream images out of an OOXML package without building its object model
+
+    Only the relationship parts and the XML that references images are
+    parsed, to map each media entry to the slides, sheets or paragraphs where
+    it is used. Every media entry is then read from the archive once, in
+    order of first use, and yielded together with all of its locations.
+    Only media referenced from the document body, slides or sheets is read;
+    logos and backgrounds of headers, masters and layouts would otherwise be
+    OCRed and described for every document that uses the template.
+    """
+
+    def iter_media(self, file_path: str,
+                   selector: Optional[RangeSelector] = None) -> Iterator[Tuple[bytes, List[Dict[str, Any]], Optional[str]]]:
+        """
+        Yield the images of a .docx, .pptx or .xlsx file
+
+        With a selector, unselected slides/sheets are not parsed and media
+        that is not referenced from a selected one is not read.
+
+        Args:
+            file_path: Path to the document
+            selector: Slide (pages) / sheet selection; ignored for .docx
+
+        Yields:
+            Tuple of (image bytes, locations, native extension or None to re-encode)
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        with zipfile.ZipFile(file_path) as zf:
+            names = set(zf.namelist())
+            if ext == '.docx':
+                references = self._docx_references(zf, names)
+            elif ext == '.pptx':
+                references = self._pptx_references(zf, names, selector)
+            elif ext == '.xlsx':
+                references = self._xlsx_references(zf, names, selector)
+            else:
+                raise ValueError(f"Not an OOXML document: {file_path}")
+
+            for name, locations in references.items():
+                media_ext = posixpath.splitext(name)[1].lower().lstrip('.')
+                if name not in names or media_ext in SKIPPED_EXTS:
+                    continue
+                try:
+                    data = zf.read(name)
+                except Exception as e:
+                    logger.error(f"Error reading {name}: {e}")
+                    continue
+                yield data, locations, media_ext if media_ext in NATIVE_EXTS else None
+
+    def _docx_references(self, zf: zipfile.ZipFile, names: set) -> "OrderedDict[str, List[Dict[str, Any]]]":
+        """Map media in word/document.xml to the paragraphs that show it"""
+        references: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        part = 'word/document.xml'
+        rels = self._read_rels(zf, names, part)
+        if part not in names:
+            return references
+
+        paragraph = 0
+        paragraph_tag = f"{{{NS_WORD}}}p"
+        with zf.open(part) as stream:
+            # Stream the body; documents can be far larger than the images they hold
+            for event, elem in ET.iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == paragraph_tag:
+                        paragraph += 1
+                    continue
+                target = self._image_target(elem, rels)
+                if target:
+                    references.setdefault(target, []).append({'paragraph': paragraph})
+                if elem.tag == paragraph_tag:
+                    elem.clear()
+        return references
+
+    def _pptx_references(self, zf: zipfile.ZipFile, names: set,
+                         selector: Optional[RangeSelector] = None) -> "OrderedDict[str, List[Dict[str, Any]]]":
+        """Map media to slide numbers in presentation order"""
+        references: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        part = 'ppt/presentation.xml'
+        if part not in names:
+            return references
+        rels = self._read_rels(zf, names, part)
+        presentation = ET.fromstring(zf.read(part))
+
+        slide_ids = presentation.find(f"{{{NS_PRESENTATION}}}sldIdLst")
+        if slide_ids is None:
+            return references
+        for slide_num, slide_id in enumerate(slide_ids, 1):
+            if selector and not selector.includes_page(slide_num):
+                continue
+            slide_part = rels.get(slide_id.get(ID_ATTR))
+            if not slide_part or slide_part not in names:
+                continue
+            slide_rels = self._read_rels(zf, names, slide_part)
+            for elem in ET.fromstring(zf.read(slide_part)).iter():
+                target = self._image_target(elem, slide_rels)
+                if target:
+                    references.setdefault(target, []).append({'slide': slide_num})
+        return references
+
+    def _xlsx_references(self, zf: zipfile.ZipFile, names: set,
+                         selector: Optional[RangeSelector] = None) -> "OrderedDict[str, List[Dict[str, Any]]]":
+        """Map media to sheet names and anchor cells through each sheet's drawing part"""
+        references: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        part = 'xl/workbook.xml'
+        if part not in names:
+            return references
+        rels = self._read_rels(zf, names, part)
+        workbook = ET.fromstring(zf.read(part))
+
+        sheets = workbook.find(f"{{{NS_SHEET}}}sheets")
+        if sheets is None:
+            return references
+        for sheet_index, sheet in enumerate(sheets, 1):
+            sheet_name = sheet.get('name')
+            if selector and not selector.includes_sheet(sheet_name, sheet_index):
+                continue
+            sheet_part = rels.get(sheet.get(ID_ATTR))
+            if not sheet_part or sheet_part not in names:
+                continue
+            sheet_rels = self._read_rels(zf, names, sheet_part)
+            drawing_parts = [target for target in sheet_rels.values() if '/drawings/' in target and target.endswith('.xml')]
+
+            for drawing_part in drawing_parts:
+                if drawing_part not in names:
+                    continue
+                drawing_rels = self._read_rels(zf, names, drawing_part)
+                for anchor in ET.fromstring(zf.read(drawing_part)):
+                    cell = self._anchor_cell(anchor)
+                    for elem in anchor.iter(BLIP_TAG):
+                        target = self._image_target(elem, drawing_rels)
+                        if target:
+                            location = {'sheet': sheet_name}
+                            if cell:
+                                location['cell'] = cell
+                            references.setdefault(target, []).append(location)
+        return references
+
+    def _read_rels(self, zf: zipfile.ZipFile, names: set, part: str) -> Dict[str, str]:
+        """Read a part's relationships as {rId: absolute part name}"""
+        directory, filename = posixpath.split(part)
+        rels_part = posixpath.join(directory, '_rels', f"{filename}.rels")
+        if rels_part not in names:
+            return {}
+
+        rels = {}
+        for rel in ET.fromstring(zf.read(rels_part)).iter(f"{{{NS_PKG_REL}}}Relationship"):
+            target = rel.get('Target')
+            if not target or rel.get('TargetMode') == 'External':
+                continue
+            if target.startswith('/'):
+                rels[rel.get('Id')] = target.lstrip('/')
+            else:
+                rels[rel.get('Id')] = posixpath.normpath(posixpath.join(directory, target))
+        return rels
+
+    def _image_target(self, elem, rels: Dict[str, str]) -> Optional[str]:
+        """Media part referenced by a blip or VML imagedata element"""
+        if elem.tag == BLIP_TAG:
+            return rels.get(elem.get(EMBED_ATTR))
+        if elem.tag == VML_IMAGE_TAG:
+            return rels.get(elem.get(ID_ATTR))
+        return None
+
+    def _anchor_cell(self, anchor) -> Optional[str]:
+        """Top-left cell (e.g. "B3") of a spreadsheet drawing anchor"""
+        start = anchor.find(f"{{{NS_SHEET_DRAWING}}}from")
+        if start is None:
+            return None
+        try:
+            col = int(start.findtext(f"{{{NS_SHEET_DRAWING}}}col"))
+            row = int(start.findtext(f"{{{NS_SHEET_DRAWING}}}row"))
+        except (TypeError, ValueError):
+            return None
+
+        letters = ""
+        col += 1
+        while col:
+            col, rem = divmod(col - 1, 26)
+            letters = chr(ord('A') + rem) + letters
+        return f"{letters}{row + 1}"
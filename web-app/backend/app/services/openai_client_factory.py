@@ -0,0 +1,213 @@
+"""
+OpenAI Client Factory
+Process-wide OpenAI clients sharing one pooled keep-alive HTTP connection pool
+"""
+import os
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    from openai import OpenAI, AsyncOpenAI
+    import httpx
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+
+class OpenAIClientFactory:
+    """Hands out OpenAI clients that share one connection pool per process
+
+    A single ``httpx.Client`` (and one ``httpx.AsyncClient`` on the server's
+    event loop) keeps TLS connections to the API alive between requests;
+    every OpenAI client is a thin wrapper over it. HTTP/2 is used when the
+    ``h2`` package is installed, so concurrent requests share a connection.
+
+    Consumers ask for the client on every use instead of keeping one, so
+    ``rotate`` can swap the API key atomically: requests already in flight
+    finish with the old key, later ones use the new key, and the pool stays
+    warm. Retries are left to the LLM gateway (``max_retries=0``).
+    """
+
+    def __init__(self):
+        self.base_url = os.getenv("OPENAI_BASE_URL") or None
+        self.timeout = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+        self.max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+        self.max_keepalive = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+        self.keepalive_expiry = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "90"))
+        self.http2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true" and H2_AVAILABLE
+
+        self._lock = threading.Lock()
+        # Until rotate() is called the key is read from OPENAI_API_KEY, which the
+        # settings may load after this module is imported
+        self._api_key: Optional[str] = None
+        self._rotated = False
+        self._http_client = None
+        self._client = None
+        self._client_key: Optional[str] = None
+        self._main_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_http_client = None
+        self._async_client = None
+
+    @property
+    def api_key(self) -> Optional[str]:
+        if self._rotated:
+            return self._api_key
+        return os.getenv("OPENAI_API_KEY") or None
+
+    def is_configured(self) -> bool:
+        return OPENAI_AVAILABLE and bool(self.api_key)
+
+    def get_client(self, api_key: Optional[str] = None):
+        """
+        Sync OpenAI client on the shared pool
+
+        Args:
+            api_key: Use this key instead of the configured one (e.g. to test a
+                key before saving it); the client is not kept
+
+        Returns:
+            OpenAI client, or None when no key is configured
+        """
+        if not OPENAI_AVAILABLE:
+            return None
+        current_key = self.api_key
+        if api_key and api_key != current_key:
+            return OpenAI(api_key=api_key, base_url=self.base_url, max_retries=0,
+                          http_client=self._get_http_client())
+        with self._lock:
+            if self._client_key != current_key:
+                self._client = self._async_client = None
+                self._client_key = current_key
+            if self._client is None and current_key:
+                self._client = OpenAI(api_key=current_key, base_url=self.base_url, max_retries=0,
+                                      http_client=self._get_http_client_locked())
+            return self._client
+
+    @asynccontextmanager
+    async def async_client(self):
+        """
+        Async OpenAI client for the running event loop
+
+        On the server loop (see bind_loop) the shared pooled client is
+        returned. Other loops, such as ``asyncio.run`` in a worker thread, get
+        a client that is closed on exit, because async connections cannot
+        move between event loops.
+
+        Yields:
+            AsyncOpenAI client, or None when no key is configured
+        """
+        if not self.is_configured():
+            yield None
+            return
+
+        current_key = self.api_key
+        loop = asyncio.get_running_loop()
+        if loop is self._main_loop:
+            with self._lock:
+                if self._client_key != current_key:
+                    self._client = self._async_client = None
+                    self._client_key = current_key
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(api_key=current_key, base_url=self.base_url, max_retries=0,
+                                                     http_client=self._get_async_http_client_locked())
+                client = self._async_client
+            yield client
+            return
+
+        client = AsyncOpenAI(api_key=current_key, base_url=self.base_url, max_retries=0,
+                             http_client=httpx.AsyncClient(**self._http_options()))
+        try:
+            yield client
+        finally:
+            await client.close()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Register the server's event loop, whose async pool is shared"""
+        self._main_loop = loop
+
+    @property
+    def main_loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._main_loop
+
+    def rotate(self, api_key: str):
+        """
+        Switch to a new API key
+
+        The pooled connections are kept; only the client wrappers are
+        replaced, under the lock, so no caller ever sees a half-updated state.
+
+        Args:
+            api_key: New OpenAI API key
+        """
+        with self._lock:
+            self._api_key = api_key or None
+            self._rotated = True
+            self._client = self._async_client = None
+            self._client_key = self._api_key
+            if OPENAI_AVAILABLE and self._api_key:
+                self._client = OpenAI(api_key=self._api_key, base_url=self.base_url, max_retries=0,
+                                      http_client=self._get_http_client_locked())
+        logger.info("OpenAI API key rotated")
+
+    async def aclose(self):
+        """Close the shared pools (server shutdown)"""
+        with self._lock:
+            http_client, async_http_client = self._http_client, self._async_http_client
+            self._http_client = self._async_http_client = None
+            self._client = self._async_client = None
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+    def _get_http_client(self):
+        with self._lock:
+            return self._get_http_client_locked()
+
+    def _get_http_client_locked(self):
+        if self._http_client is None:
+            self._http_client = httpx.Client(**self._http_options())
+            logger.info(f"OpenAI HTTP pool created (http2={self.http2}, "
+                        f"max_connections={self.max_connections}, keepalive={self.max_keepalive})")
+        return self._http_client
+
+    def _get_async_http_client_locked(self):
+        if self._async_http_client is None:
+            self._async_http_client = httpx.AsyncClient(**self._http_options())
+        return self._async_http_client
+
+    def _http_options(self) -> Dict[str, Any]:
+        return {
+            'http2': self.http2,
+            'timeout': httpx.Timeout(self.timeout, connect=10.0),
+            'limits': httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'configured': self.is_configured(),
+            'base_url': self.base_url or 'https://api.openai.com/v1',
+            'http2': self.http2,
+            'max_connections': self.max_connections,
+            'max_keepalive': self.max_keepalive,
+            'shared_async_pool': self._main_loop is not None
+        }
+
+
+# グローバルインスタンス
+openai_client_factory = OpenAIClientFactory()
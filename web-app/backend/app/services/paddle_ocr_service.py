@@ -205,79 +205,118 @@ class PaddleOCRService:
             if not result or not result[0]:
                 return "No text detected in the image."
             
-            ocr_result = result[0]
-            extracted_lines = []
-            
-            # Check if it's the new OCRResult format
-            if hasattr(ocr_result, 'json'):
-                # New format - extract from JSON
-                result_json = ocr_result.json
-                if 'res' in result_json and 'rec_texts' in result_json['res']:
-                    texts = result_json['res']['rec_texts']
-                    scores = result_json['res'].get('rec_scores', [])
-                    
-                    for i, text in enumerate(texts):
-                        confidence = scores[i] if i < len(scores) else 0.0
-                        if text and text.strip():
-                            # Normalize Japanese text
-                            normalized_text = self.normalize_japanese_text(text)
-                            
-                            if confidence > 0.7:
-                                # High confidence - include as is
-                                extracted_lines.append(normalized_text)
-                            elif confidence > 0.4:
-                                # Medium confidence - include without marker for cleaner output
-                                extracted_lines.append(normalized_text)
-                            elif confidence > 0.2:
-                                # Low confidence - still include for completeness
-                                extracted_lines.append(normalized_text)
-                            else:
-                                # Very low confidence - include with warning
-                                extracted_lines.append(f"{normalized_text} [未確認]")
-            else:
-                # Old format - legacy support
-                for line in ocr_result:
-                    # Each line contains: [coordinates, (text, confidence)]
-                    if len(line) >= 2 and len(line[1]) >= 1:
-                        text = line[1][0]
-                        confidence = line[1][1] if len(line[1]) > 1 else 0.0
-                        
-                        # Include detected text with adjusted confidence thresholds
-                        if text and text.strip():
-                            # Normalize Japanese text
-                            normalized_text = self.normalize_japanese_text(text)
-                            
-                            if confidence > 0.7:
-                                # High confidence - include as is
-                                extracted_lines.append(normalized_text)
-                            elif confidence > 0.4:
-                                # Medium confidence - include without marker for cleaner output
-                                extracted_lines.append(normalized_text)
-                            elif confidence > 0.2:
-                                # Low confidence - still include for completeness
-                                extracted_lines.append(normalized_text)
-                            else:
-                                # Very low confidence - include with warning
-                                extracted_lines.append(f"{normalized_text} [未確認]")
-            
-            if extracted_lines:
-                # Log extraction statistics
-                logger.info(f"OCR extracted {len(extracted_lines)} text lines from {os.path.basename(image_path)}")
-                
-                # Log sample of extracted text for debugging (first 3 lines)
-                sample_lines = extracted_lines[:3]
-                if sample_lines:
-                    logger.debug(f"Sample extracted text: {sample_lines}")
-                
-                return "\n".join(extracted_lines)
-            else:
-                logger.warning(f"Text detected in {os.path.basename(image_path)} but confidence too low to extract reliably")
-                return "Text detected but confidence too low to extract reliably."
+            return self._format_ocr_result(result[0], image_path)
                 
         except Exception as e:
             logger.error(f"OCR extraction error for {os.path.basename(image_path)}: {e}")
             return f"OCR extraction failed: {str(e)}"
     
+    def extract_text_batch(self, image_paths: List[str]) -> List[str]:
+        """
+        Extract text from several images in one inference call
+        
+        PaddleOCR 3.x accepts a list of inputs and runs detection and
+        recognition over them as a batch. Older versions only take a single
+        image, so they fall back to one call per image.
+        
+        Args:
+            image_paths: Paths to the image files
+            
+        Returns:
+            Extracted text for each image, in the same order as image_paths
+        """
+        if not image_paths:
+            return []
+        
+        if not PADDLE_AVAILABLE or not self.ocr:
+            return [self.extract_text(path) for path in image_paths]
+        
+        if not hasattr(self.ocr, 'predict') or len(image_paths) == 1:
+            return [self.extract_text(path) for path in image_paths]
+        
+        try:
+            inputs = []
+            for path in image_paths:
+                preprocessed = self.preprocess_image(path)
+                inputs.append(preprocessed if preprocessed is not None else path)
+            
+            results = self.ocr.ocr(inputs)
+            if not results or len(results) != len(image_paths):
+                raise ValueError(f"expected {len(image_paths)} results, got {len(results) if results else 0}")
+            
+            logger.info(f"Batched OCR over {len(image_paths)} images")
+            return [
+                self._format_ocr_result(ocr_result, path) if ocr_result else "No text detected in the image."
+                for ocr_result, path in zip(results, image_paths)
+            ]
+            
+        except Exception as e:
+            logger.warning(f"Batched OCR failed, falling back to per-image OCR: {e}")
+            return [self.extract_text(path) for path in image_paths]
+    
+    def _format_ocr_result(self, ocr_result, image_path: str) -> str:
+        """
+        Turn the OCR result of a single image into normalized text lines
+        
+        Args:
+            ocr_result: PaddleOCR result for one image (OCRResult or legacy list)
+            image_path: Path of the source image, used for logging
+            
+        Returns:
+            Extracted text as string
+        """
+        extracted_lines = []
+        
+        # Check if it's the new OCRResult format
+        if hasattr(ocr_result, 'json'):
+            # New format - extract from JSON
+            result_json = ocr_result.json
+            if 'res' in result_json and 'rec_texts' in result_json['res']:
+                texts = result_json['res']['rec_texts']
+                scores = result_json['res'].get('rec_scores', [])
+                
+                for i, text in enumerate(texts):
+                    confidence = scores[i] if i < len(scores) else 0.0
+                    if text and text.strip():
+                        extracted_lines.append(self._format_line(text, confidence))
+        else:
+            # Old format - legacy support
+            for line in ocr_result:
+                # Each line contains: [coordinates, (text, confidence)]
+                if len(line) >= 2 and len(line[1]) >= 1:
+                    text = line[1][0]
+                    confidence = line[1][1] if len(line[1]) > 1 else 0.0
+                    
+                    # Include detected text with adjusted confidence thresholds
+                    if text and text.strip():
+                        extracted_lines.append(self._format_line(text, confidence))
+        
+        if extracted_lines:
+            # Log extraction statistics
+            logger.info(f"OCR extracted {len(extracted_lines)} text lines from {os.path.basename(image_path)}")
+            
+            # Log sample of extracted text for debugging (first 3 lines)
+            sample_lines = extracted_lines[:3]
+            if sample_lines:
+                logger.debug(f"Sample extracted text: {sample_lines}")
+            
+            return "\n".join(extracted_lines)
+        else:
+            logger.warning(f"Text detected in {os.path.basename(image_path)} but confidence too low to extract reliably")
+            return "Text detected but confidence too low to extract reliably."
+    
+    def _format_line(self, text: str, confidence: float) -> str:
+        """Normalize one recognized line and mark it if confidence is very low"""
+        # Normalize Japanese text
+        normalized_text = self.normalize_japanese_text(text)
+        
+        # High, medium and low confidence lines are included as is for cleaner output
+        if confidence > 0.2:
+            return normalized_text
+        
+        # Very low confidence - include with warning
+        return f"{normalized_text} [未確認]"
+    
     def extract_text_with_details(self, image_path: str) -> List[Tuple[str, float]]:
         """
         Extract text with confidence scores
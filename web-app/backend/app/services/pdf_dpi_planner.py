@@ -0,0 +1,195 @@
+"""
+PDF DPI Planner
+Chooses the lowest rasterization DPI per page that still keeps text legible for OCR
+"""
+import os
+import math
+import logging
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pdf2image import convert_from_path
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
+
+
+class PDFDPIPlanner:
+    """Plan a rasterization DPI for each page
+
+    Render time, memory and OCR time all grow with DPI squared, so each page
+    is rendered just sharp enough for its text to reach ``target_glyph_px``
+    pixels. The glyph height comes from the text layer when there is one and
+    from a low-resolution preview render otherwise; previews of consecutive
+    pages come from one pdftoppm run, so scans do not pay an extra process
+    per page. Scans are never rendered
+    above the resolution of their embedded page image, and the whole job is
+    scaled down if it would exceed the pixel budget.
+    """
+
+    # DPI values are rounded to this step so neighbouring pages share render windows
+    DPI_STEP = 25
+    # Pages per preview render
+    PREVIEW_WINDOW_PAGES = 16
+
+    def __init__(self, default_dpi: Optional[int] = None, min_dpi: Optional[int] = None,
+                 max_dpi: Optional[int] = None, target_glyph_px: Optional[float] = None,
+                 pixel_budget_mp: Optional[float] = None, preview_dpi: int = 50):
+        """
+        Initialize the planner
+
+        Args:
+            default_dpi: DPI when no glyph size can be estimated (env: PDF_DEFAULT_DPI)
+            min_dpi: Lowest DPI ever used (env: PDF_MIN_DPI)
+            max_dpi: Highest DPI ever used (env: PDF_MAX_DPI)
+            target_glyph_px: Wanted rendered font size in pixels (env: PDF_TARGET_GLYPH_PX)
+            pixel_budget_mp: Per-job budget in megapixels over all rendered pages (env: PDF_PIXEL_BUDGET_MP)
+            preview_dpi: DPI of the preview render used to measure text lines
+        """
+        self.default_dpi = default_dpi or int(os.getenv("PDF_DEFAULT_DPI", "200"))
+        self.min_dpi = min_dpi or int(os.getenv("PDF_MIN_DPI", "100"))
+        self.max_dpi = max_dpi or int(os.getenv("PDF_MAX_DPI", "300"))
+        # 26px puts 10-12pt body text at 175-200 dpi
+        self.target_glyph_px = target_glyph_px or float(os.getenv("PDF_TARGET_GLYPH_PX", "26"))
+        self.pixel_budget = (pixel_budget_mp or float(os.getenv("PDF_PIXEL_BUDGET_MP", "400"))) * 1_000_000
+        self.preview_dpi = preview_dpi
+
+    def plan(self, file_path: str, pages: List[Dict[str, Any]]) -> Dict[int, int]:
+        """
+        Plan the DPI of each page to be rasterized
+
+        Args:
+            file_path: Path to the PDF file
+            pages: Page dicts from PDFPageAnalyzer.analyze for the pages to render
+
+        Returns:
+            Mapping of 1-based page number to DPI
+        """
+        previews = self._estimate_glyphs_from_previews(
+            file_path, [page['page'] for page in pages if not page.get('glyph_pt')]
+        )
+        plan = {}
+        for page in pages:
+            plan[page['page']] = self._plan_page(page, previews.get(page['page']))
+
+        plan = self._apply_pixel_budget(plan, pages)
+        if plan:
+            logger.info(f"PDF DPI plan: {min(plan.values())}-{max(plan.values())} dpi over {len(plan)} pages")
+        return plan
+
+    def _plan_page(self, page: Dict[str, Any], preview_glyph_pt: Optional[float]) -> int:
+        """Pick the DPI for one page"""
+        glyph_pt = page.get('glyph_pt') or preview_glyph_pt
+
+        if glyph_pt:
+            dpi = self.target_glyph_px * 72.0 / glyph_pt
+        else:
+            dpi = self.default_dpi
+
+        # Rendering a scan above its native resolution adds pixels but no detail
+        native_dpi = self._native_image_dpi(page)
+        if native_dpi:
+            dpi = min(dpi, native_dpi)
+
+        return self._clamp(dpi)
+
+    def _native_image_dpi(self, page: Dict[str, Any]) -> Optional[float]:
+        """Resolution of the largest embedded image, assuming it spans the page"""
+        images = page.get('images') or []
+        width_pt, height_pt = page.get('width_pt'), page.get('height_pt')
+        if not images or not width_pt or not height_pt:
+            return None
+
+        largest = max(images, key=lambda img: img['width'] * img['height'])
+        if not largest['width'] or not largest['height']:
+            return None
+        return max(largest['width'] / (width_pt / 72.0), largest['height'] / (height_pt / 72.0))
+
+    def _estimate_glyphs_from_previews(self, file_path: str, page_numbers: List[int]) -> Dict[int, Optional[float]]:
+        """
+        Estimate the text height of pages from low-resolution grayscale previews
+
+        Consecutive pages are rendered together, PREVIEW_WINDOW_PAGES at a time.
+
+        Returns:
+            Mapping of page number to glyph height in points (None if unknown)
+        """
+        if not PDF2IMAGE_AVAILABLE or not page_numbers:
+            return {}
+
+        runs: List[List[int]] = []
+        for num in sorted(page_numbers):
+            if runs and num == runs[-1][-1] + 1 and len(runs[-1]) < self.PREVIEW_WINDOW_PAGES:
+                runs[-1].append(num)
+            else:
+                runs.append([num])
+
+        glyphs: Dict[int, Optional[float]] = {}
+        for run in runs:
+            try:
+                previews = convert_from_path(
+                    file_path, dpi=self.preview_dpi, first_page=run[0], last_page=run[-1], grayscale=True
+                )
+            except Exception as e:
+                logger.debug(f"Preview render failed for pages {run[0]}-{run[-1]}: {e}")
+                continue
+            for num, preview in zip(run, previews):
+                glyphs[num] = self._glyph_from_preview(np.asarray(preview, dtype=np.uint8))
+        return glyphs
+
+    def _glyph_from_preview(self, pixels: np.ndarray) -> Optional[float]:
+        """
+        Text height of a preview page in points
+
+        Rows containing ink are grouped into runs; the median run height is
+        taken as the line height of the page's body text.
+        """
+        ink_rows = (pixels < 128).mean(axis=1) > 0.01
+        # Boundaries of runs of consecutive ink rows
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], ink_rows.astype(np.int8), [0]))))
+        run_heights = edges[1::2] - edges[0::2]
+        run_heights = run_heights[run_heights >= 2]
+        if run_heights.size == 0:
+            return None
+
+        return float(np.median(run_heights)) * 72.0 / self.preview_dpi
+
+    def _apply_pixel_budget(self, plan: Dict[int, int], pages: List[Dict[str, Any]]) -> Dict[int, int]:
+        """
+        Scale every page down uniformly if the job would exceed the pixel budget
+
+        No page goes below min_dpi, so a long enough document still exceeds
+        the budget; all its pages are rendered at min_dpi and a warning is logged.
+        """
+        sizes = {page['page']: (page.get('width_pt') or 612.0, page.get('height_pt') or 792.0) for page in pages}
+
+        def total(dpis: Dict[int, int]) -> float:
+            return sum((sizes[num][0] / 72.0 * dpi) * (sizes[num][1] / 72.0 * dpi) for num, dpi in dpis.items())
+
+        total_pixels = total(plan)
+        if total_pixels <= self.pixel_budget:
+            return plan
+
+        # Pixels scale with DPI squared
+        scale = math.sqrt(self.pixel_budget / total_pixels)
+        scaled = {num: self._clamp(dpi * scale, round_down=True) for num, dpi in plan.items()}
+        logger.info(f"PDF pixel budget exceeded ({total_pixels / 1e6:.0f} MP), scaling DPI by {scale:.2f}")
+
+        # Clamping to min_dpi can push the total back over the budget
+        scaled_pixels = total(scaled)
+        if scaled_pixels > self.pixel_budget:
+            logger.warning(
+                f"PDF still exceeds the pixel budget at the minimum DPI: {scaled_pixels / 1e6:.0f} MP "
+                f"for {len(scaled)} pages (budget {self.pixel_budget / 1e6:.0f} MP, PDF_MIN_DPI={self.min_dpi})"
+            )
+        return scaled
+
+    def _clamp(self, dpi: float, round_down: bool = False) -> int:
+        """Clamp to [min_dpi, max_dpi] and round to DPI_STEP"""
+        steps = dpi / self.DPI_STEP
+        steps = math.floor(steps) if round_down else math.ceil(steps)
+        return int(min(self.max_dpi, max(self.min_dpi, steps * self.DPI_STEP)))
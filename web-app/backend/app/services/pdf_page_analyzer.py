@@ -0,0 +1,210 @@
+"""
+PDF Page Analyzer
+Inspects each PDF page's text layer and image XObjects to decide which pages need OCR
+"""
+import os
+import logging
+from typing import List, Dict, Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+try:
+    import PyPDF2
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+    logger.warning("PyPDF2 not available for PDF page analysis")
+
+
+class PDFPageAnalyzer:
+    """Decide per page whether rasterization and OCR are worth it
+
+    A page is sent to OCR when its text layer is (nearly) empty, as with
+    scanned documents, or when it carries an embedded image large enough to
+    hold text of its own. Pages whose content MarkItDown already extracted as
+    real text are skipped.
+    """
+
+    def __init__(self, min_text_chars: Optional[int] = None, min_image_pixels: Optional[int] = None):
+        """
+        Initialize the analyzer
+
+        Args:
+            min_text_chars: Pages with fewer extractable characters count as image-only
+                (env: PDF_TEXT_LAYER_MIN_CHARS)
+            min_image_pixels: Embedded images with at least this many pixels are significant
+                (env: PDF_OCR_MIN_IMAGE_PIXELS)
+        """
+        self.min_text_chars = min_text_chars if min_text_chars is not None else int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "50"))
+        self.min_image_pixels = min_image_pixels if min_image_pixels is not None else int(os.getenv("PDF_OCR_MIN_IMAGE_PIXELS", "250000"))
+
+    def analyze(self, file_path: str, page_numbers: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Analyze every page of a PDF
+
+        Args:
+            file_path: Path to the PDF file
+            page_numbers: Only analyze these 1-based pages (all when None)
+
+        Returns:
+            One dict per page with size, text_chars, glyph_pt (median text
+            height in points, None without a text layer), images, needs_ocr and reason
+        """
+        if not PYPDF2_AVAILABLE:
+            return []
+
+        reader = PyPDF2.PdfReader(file_path)
+        pages = []
+
+        for page_num, page in enumerate(reader.pages, 1):
+            if page_numbers is not None and page_num not in page_numbers:
+                continue
+            text_chars, glyph_pt = self._read_text_layer(page)
+            images = self._list_images(page)
+            significant_images = [img for img in images if img['width'] * img['height'] >= self.min_image_pixels]
+
+            if text_chars < self.min_text_chars:
+                needs_ocr, reason = True, 'no_text_layer'
+            elif significant_images:
+                needs_ocr, reason = True, 'embedded_images'
+            else:
+                needs_ocr, reason = False, 'text_layer'
+
+            pages.append({
+                'page': page_num,
+                'width_pt': float(page.mediabox.width),
+                'height_pt': float(page.mediabox.height),
+                'text_chars': text_chars,
+                'glyph_pt': glyph_pt,
+                'images': images,
+                'needs_ocr': needs_ocr,
+                'reason': reason
+            })
+
+        ocr_pages = sum(1 for p in pages if p['needs_ocr'])
+        logger.info(f"PDF page analysis: {ocr_pages}/{len(pages)} pages need OCR ({os.path.basename(file_path)})")
+        return pages
+
+    def extract_images(self, file_path: str, page_numbers: List[int]) -> List[Dict[str, Any]]:
+        """
+        Extract significant embedded images from the given pages
+
+        JPEG (DCTDecode) and JPEG 2000 streams come out as their native bytes;
+        other encodings are decoded by PyPDF2 into PNG.
+
+        Args:
+            file_path: Path to the PDF file
+            page_numbers: 1-based page numbers
+
+        Returns:
+            List of dicts with page, name, data, ext and position
+            (x, y, width, height in PDF points, origin bottom-left)
+        """
+        if not PYPDF2_AVAILABLE:
+            return []
+
+        reader = PyPDF2.PdfReader(file_path)
+        figures = []
+
+        for page_num in page_numbers:
+            page = reader.pages[page_num - 1]
+            significant = {
+                img['name'].lstrip('/')
+                for img in self._list_images(page)
+                if img['width'] * img['height'] >= self.min_image_pixels
+            }
+            if not significant:
+                continue
+
+            positions = self._image_positions(page)
+            for image_file in getattr(page, 'images', []):
+                stem, ext = os.path.splitext(image_file.name)
+                if stem not in significant:
+                    continue
+                figures.append({
+                    'page': page_num,
+                    'name': stem,
+                    'data': image_file.data,
+                    'ext': ext.lstrip('.').lower() or 'png',
+                    'position': positions.get(stem)
+                })
+
+        return figures
+
+    def _image_positions(self, page) -> Dict[str, Dict[str, float]]:
+        """Find where each image XObject is painted from the CTM at its Do operator"""
+        positions = {}
+
+        def visitor(operator, operands, cm, tm):
+            if operator == b'Do' and operands:
+                name = str(operands[0]).lstrip('/')
+                positions.setdefault(name, {
+                    'x': round(float(cm[4]), 1),
+                    'y': round(float(cm[5]), 1),
+                    'width': round(abs(float(cm[0])), 1),
+                    'height': round(abs(float(cm[3])), 1)
+                })
+
+        try:
+            page.extract_text(visitor_operand_before=visitor)
+        except Exception as e:
+            logger.debug(f"Could not locate images on page: {e}")
+        return positions
+
+    def _read_text_layer(self, page) -> tuple:
+        """
+        Count non-whitespace characters in the page's text layer and estimate glyph height
+
+        Returns:
+            Tuple of (character count, median rendered font size in points or None)
+        """
+        glyph_sizes = []
+
+        def visitor_text(text, cm, tm, font_dict, font_size):
+            if text and text.strip() and font_size:
+                # Rendered size = font size scaled by the text and user space matrices
+                size = abs(float(font_size) * float(tm[3]) * float(cm[3]))
+                if size > 0:
+                    glyph_sizes.append(size)
+
+        try:
+            text = page.extract_text(visitor_text=visitor_text) or ""
+        except Exception as e:
+            logger.debug(f"Text extraction failed during page analysis: {e}")
+            return 0, None
+
+        text_chars = sum(1 for ch in text if not ch.isspace())
+        glyph_pt = sorted(glyph_sizes)[len(glyph_sizes) // 2] if glyph_sizes else None
+        return text_chars, glyph_pt
+
+    def _list_images(self, page) -> List[Dict[str, Any]]:
+        """List image XObjects referenced from the page resources, including one level of forms"""
+        images = []
+        try:
+            resources = page.get('/Resources')
+            if resources is None:
+                return images
+            self._collect_images(resources.get_object(), images, depth=0)
+        except Exception as e:
+            logger.debug(f"Could not read image XObjects: {e}")
+        return images
+
+    def _collect_images(self, resources, images: List[Dict[str, Any]], depth: int):
+        """Walk an XObject dictionary, descending into form XObjects"""
+        xobjects = resources.get('/XObject')
+        if xobjects is None:
+            return
+
+        xobjects = xobjects.get_object()
+        for name in xobjects:
+            xobj = xobjects[name].get_object()
+            subtype = xobj.get('/Subtype')
+            if subtype == '/Image':
+                images.append({
+                    'name': str(name),
+                    'width': int(xobj.get('/Width', 0)),
+                    'height': int(xobj.get('/Height', 0)),
+                    'filter': xobj.get('/Filter')
+                })
+            elif subtype == '/Form' and depth < 2 and '/Resources' in xobj:
+                self._collect_images(xobj['/Resources'].get_object(), images, depth + 1)
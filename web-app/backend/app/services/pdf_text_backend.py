@@ -0,0 +1,154 @@
+"""
+PDF Text Backend
+Selectable PDF text extraction: MarkItDown (default) or pdfium split across worker processes
+"""
+import os
+import math
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+
+def _extract_page_range(file_path: str, first_page: int, last_page: int) -> List[str]:
+    """Extract text of pages first_page..last_page (1-based, inclusive) inside a worker process"""
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        texts = []
+        for index in range(first_page - 1, last_page):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                texts.append(_page_markdown(textpage.get_text_range()))
+            finally:
+                textpage.close()
+                page.close()
+        return texts
+    finally:
+        pdf.close()
+
+
+def _page_markdown(text: str) -> str:
+    """Normalize pdfium text output (CRLF line ends, trailing spaces) into Markdown paragraphs"""
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    return '\n'.join(lines).strip()
+
+
+class PDFTextBackend:
+    """Extract the text of a PDF with the configured backend
+
+    ``markitdown`` (default) uses MarkItDown's single-threaded pdfminer path.
+    ``pdfium`` uses pypdfium2: the page range is split into chunks that run
+    on a process pool (pdfium is not thread-safe), and page texts are joined
+    back in page order. Small PDFs are extracted in-process because starting
+    workers would cost more than it saves. If pdfium is not installed or fails
+    on a file, MarkItDown is used instead.
+    """
+
+    BACKENDS = ('markitdown', 'pdfium')
+
+    def __init__(self, backend: Optional[str] = None, workers: Optional[int] = None,
+                 parallel_min_pages: Optional[int] = None):
+        """
+        Initialize the backend
+
+        Args:
+            backend: "markitdown" or "pdfium" (env: PDF_TEXT_BACKEND)
+            workers: Worker processes for pdfium (env: PDF_TEXT_WORKERS, default: CPU count)
+            parallel_min_pages: PDFs with fewer pages are extracted in-process
+                (env: PDF_TEXT_PARALLEL_MIN_PAGES)
+        """
+        self.backend = (backend or os.getenv("PDF_TEXT_BACKEND", "markitdown")).lower()
+        if self.backend not in self.BACKENDS:
+            logger.warning(f"Unknown PDF_TEXT_BACKEND '{self.backend}', using markitdown")
+            self.backend = 'markitdown'
+        if self.backend == 'pdfium' and not PDFIUM_AVAILABLE:
+            logger.warning("pypdfium2 not installed, PDF text falls back to MarkItDown")
+
+        self.workers = workers or int(os.getenv("PDF_TEXT_WORKERS", "0")) or os.cpu_count() or 1
+        self.parallel_min_pages = parallel_min_pages or int(os.getenv("PDF_TEXT_PARALLEL_MIN_PAGES", "16"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def active_backend(self) -> str:
+        """Backend actually used, after availability checks"""
+        return 'pdfium' if self.backend == 'pdfium' and PDFIUM_AVAILABLE else 'markitdown'
+
+    def convert(self, file_path: str, md) -> str:
+        """
+        Extract the PDF's text as Markdown
+
+        Args:
+            file_path: Path to the PDF file
+            md: MarkItDown instance used by the default backend and as fallback
+
+        Returns:
+            Markdown text
+        """
+        if self.active_backend == 'pdfium':
+            try:
+                return self.convert_with_pdfium(file_path)
+            except Exception as e:
+                logger.warning(f"pdfium text extraction failed, falling back to MarkItDown: {e}")
+        return md.convert(file_path).text_content
+
+    def convert_with_pdfium(self, file_path: str) -> str:
+        """
+        Extract text with pdfium, in parallel for large documents
+
+        Args:
+            file_path: Path to the PDF file
+
+        Returns:
+            Page texts joined in page order
+        """
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            page_count = len(pdf)
+        finally:
+            pdf.close()
+
+        if page_count < self.parallel_min_pages or self.workers <= 1:
+            pages = _extract_page_range(file_path, 1, page_count) if page_count else []
+        else:
+            # About two chunks per worker so a slow chunk does not hold up the rest
+            chunk_size = max(4, math.ceil(page_count / (self.workers * 2)))
+            ranges = [(first, min(first + chunk_size - 1, page_count))
+                      for first in range(1, page_count + 1, chunk_size)]
+            executor = self._get_executor()
+            futures = [executor.submit(_extract_page_range, file_path, first, last) for first, last in ranges]
+            pages = [text for future in futures for text in future.result()]
+
+        return '\n\n'.join(text for text in pages if text)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"PDF text worker pool started with {self.workers} processes")
+            return self._executor
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+# グローバルインスタンス
+pdf_text_backend = PDFTextBackend()
@@ -0,0 +1,222 @@
+"""
+Preview Service
+Content-hash keyed image cache that renders small thumbnails on demand
+"""
+import io
+import os
+import re
+import hashlib
+import tempfile
+import threading
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logger.warning("Pillow not available, image previews disabled")
+
+
+class PreviewService:
+    """Serve image previews without encoding them during conversion
+
+    The conversion path only registers the source image and stores the
+    returned preview URL. Registration keeps a copy reduced to the largest
+    preview size (not the full-resolution page render), keyed by content
+    hash, so identical images from different documents share one entry and
+    are reduced only once. Thumbnails are rendered from that copy the first
+    time the preview endpoint asks for them. The cache is trimmed
+    oldest-first when it grows past ``PREVIEW_CACHE_MAX_MB``.
+    """
+
+    URL_PREFIX = "/api/v1/conversion/preview"
+    ALLOWED_SIZES = (128, 200, 400, 800)
+    MEDIA_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+    _ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, cache_dir: Optional[str] = None, max_cache_mb: Optional[float] = None):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Cache directory (env: PREVIEW_CACHE_DIR, default ./preview_cache)
+            max_cache_mb: Cache size limit in MB (env: PREVIEW_CACHE_MAX_MB, default 1024)
+        """
+        self.cache_dir = cache_dir or os.getenv("PREVIEW_CACHE_DIR", "./preview_cache")
+        self.max_cache_bytes = (max_cache_mb or float(os.getenv("PREVIEW_CACHE_MAX_MB", "1024"))) * 1024 * 1024
+        self.source_dir = os.path.join(self.cache_dir, "sources")
+        self.thumb_dir = os.path.join(self.cache_dir, "thumbs")
+        self._lock = threading.Lock()
+        self._cache_bytes = None  # Measured on first write
+
+    def register_bytes(self, data: bytes) -> str:
+        """
+        Store image bytes as a preview source
+
+        Args:
+            data: Encoded image bytes
+
+        Returns:
+            Preview ID (content hash)
+        """
+        preview_id = hashlib.sha256(data).hexdigest()[:32]
+        self._store_source(preview_id, lambda: io.BytesIO(data))
+        return preview_id
+
+    def register_file(self, path: str) -> str:
+        """
+        Store an image file as a preview source
+
+        Args:
+            path: Path to the image file; a reduced copy is kept, so it may be deleted afterwards
+
+        Returns:
+            Preview ID (content hash)
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        preview_id = digest.hexdigest()[:32]
+        self._store_source(preview_id, lambda: path)
+        return preview_id
+
+    def _store_source(self, preview_id: str, open_source):
+        """Keep the image reduced to the largest preview size, unless it is cached already"""
+        source_path = self._source_path(preview_id)
+        if not PIL_AVAILABLE or os.path.exists(source_path):
+            return
+        try:
+            size = self.ALLOWED_SIZES[-1]
+            with Image.open(open_source()) as img:
+                img.draft('RGB', (size, size))
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+                fmt, mode = ('PNG', 'RGBA') if has_alpha else ('JPEG', 'RGB')
+                if img.mode != mode:
+                    img = img.convert(mode)
+                self._write_atomic(source_path, lambda f: img.save(f, format=fmt, quality=90))
+            self._account(os.path.getsize(source_path))
+        except Exception as e:
+            # A missing preview must not fail the conversion
+            logger.debug(f"Preview source not stored: {e}")
+
+    def url(self, preview_id: str, size: Optional[int] = None) -> str:
+        """
+        Build the preview endpoint URL for a registered image
+
+        Args:
+            preview_id: ID returned by register_bytes/register_file
+            size: Thumbnail size (longest side); endpoint default when omitted
+
+        Returns:
+            Relative URL of the preview endpoint
+        """
+        url = f"{self.URL_PREFIX}/{preview_id}"
+        return f"{url}?size={size}" if size else url
+
+    def get_thumbnail(self, preview_id: str, size: int = 200, fmt: str = "webp") -> Optional[Tuple[str, str]]:
+        """
+        Get (rendering on first use) a cached thumbnail
+
+        Args:
+            preview_id: ID returned by register_bytes/register_file
+            size: Longest side in pixels, rounded up to one of ALLOWED_SIZES
+            fmt: "webp" or "jpeg" (webp falls back to jpeg if Pillow lacks support)
+
+        Returns:
+            Tuple of (thumbnail path, media type), or None if the ID is unknown
+
+        Raises:
+            ValueError: If the ID or format is invalid
+        """
+        if not self._ID_PATTERN.match(preview_id or ''):
+            raise ValueError(f"Invalid preview ID: {preview_id}")
+        if fmt not in self.MEDIA_TYPES:
+            raise ValueError(f"Unsupported preview format: {fmt}")
+        if not PIL_AVAILABLE:
+            return None
+
+        source_path = self._source_path(preview_id)
+        if not os.path.exists(source_path):
+            return None
+
+        if fmt == 'webp' and not features.check('webp'):
+            fmt = 'jpeg'
+        size = next((s for s in self.ALLOWED_SIZES if s >= size), self.ALLOWED_SIZES[-1])
+
+        thumb_path = os.path.join(self.thumb_dir, f"{preview_id}_{size}.{fmt}")
+        if not os.path.exists(thumb_path):
+            self._render_thumbnail(source_path, thumb_path, size, fmt)
+            self._account(os.path.getsize(thumb_path))
+        return thumb_path, self.MEDIA_TYPES[fmt]
+
+    def _render_thumbnail(self, source_path: str, thumb_path: str, size: int, fmt: str):
+        """Decode the source at reduced size and write the thumbnail"""
+        with Image.open(source_path) as img:
+            # JPEG sources decode directly at a fraction of full resolution
+            img.draft('RGB', (size, size))
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+            mode = 'RGBA' if fmt == 'webp' and has_alpha else 'RGB'
+            if img.mode != mode:
+                img = img.convert(mode)
+            self._write_atomic(thumb_path, lambda f: img.save(f, format=fmt.upper(), quality=80))
+
+    def _source_path(self, preview_id: str) -> str:
+        return os.path.join(self.source_dir, preview_id)
+
+    def _write_atomic(self, path: str, write):
+        """Write via a temp file so concurrent readers never see partial files"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _account(self, nbytes: int):
+        """Track cache size and evict the least recently written entries when over the limit"""
+        with self._lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(size for _, _, size in self._list_entries())
+            else:
+                self._cache_bytes += nbytes
+            if self._cache_bytes <= self.max_cache_bytes:
+                return
+
+            # Trim to 90% so eviction does not run on every write
+            target = self.max_cache_bytes * 0.9
+            for mtime, path, size in sorted(self._list_entries()):
+                if self._cache_bytes <= target:
+                    break
+                try:
+                    os.remove(path)
+                    self._cache_bytes -= size
+                except OSError:
+                    pass
+            logger.info(f"Preview cache trimmed to {self._cache_bytes / 1024 / 1024:.1f}MB")
+
+    def _list_entries(self):
+        """(mtime, path, size) of every cached file"""
+        entries = []
+        for directory in (self.source_dir, self.thumb_dir):
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith(".tmp_"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+
+# グローバルインスタンス
+preview_service = PreviewService()
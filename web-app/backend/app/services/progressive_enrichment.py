@@ -0,0 +1,232 @@
+"""
+Progressive Enrichment
+Two-phase AI conversion: the non-AI Markdown is returned at once, AI output patches the stored document later
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from .markdown_chunker import split_sections
+
+logger = logging.getLogger(__name__)
+
+
+def patch_sections(base: str, enriched: str) -> List[Dict[str, Any]]:
+    """
+    Section-level changes that turn the base document into the enriched one
+
+    Sections are matched by heading line and occurrence, so the nth
+    "### Image 3" of the base is compared with the nth one of the enriched
+    document.
+
+    Args:
+        base: Markdown delivered in the first phase
+        enriched: Markdown of the AI conversion
+
+    Returns:
+        Changes as {'action': 'update' | 'insert' | 'remove', 'section', 'index', 'markdown'},
+        where index is the position of the section in the enriched document
+        (in the base document for removals)
+    """
+    def keyed(text: str):
+        seen: Dict[str, int] = {}
+        sections = []
+        for heading, section in split_sections(text):
+            seen[heading] = seen.get(heading, 0) + 1
+            sections.append(((heading, seen[heading]), section))
+        return sections
+
+    base_sections = keyed(base)
+    base_by_key = dict(base_sections)
+    changes: List[Dict[str, Any]] = []
+    enriched_keys = set()
+    for index, (key, section) in enumerate(keyed(enriched)):
+        enriched_keys.add(key)
+        if key not in base_by_key:
+            changes.append({'action': 'insert', 'section': key[0], 'index': index, 'markdown': section})
+        elif base_by_key[key] != section:
+            changes.append({'action': 'update', 'section': key[0], 'index': index, 'markdown': section})
+    for index, (key, _) in enumerate(base_sections):
+        if key not in enriched_keys:
+            changes.append({'action': 'remove', 'section': key[0], 'index': index, 'markdown': ""})
+    return changes
+
+
+class ProgressiveEnrichment:
+    """Runs the AI phase of two-phase conversions in the background
+
+    The endpoint returns the fast MarkItDown/OCR result and hands a coroutine
+    producing the AI Markdown to ``start``. When it finishes, the stored
+    output file is replaced section by section (atomically), each changed
+    section is pushed to the clients, and a final event carries the whole
+    document. If the AI phase fails, the first-phase document simply stays.
+    The file is only patched while the job is still current: a newer job for
+    the same output, or any other write to it since the first phase (a
+    re-upload of the same name), supersedes the job. Jobs can be cancelled.
+    At most AI_ENRICHMENT_MAX_JOBS enrichments run at once so background
+    work does not crowd out new conversions.
+    """
+
+    def __init__(self):
+        self.max_jobs = max(1, int(os.getenv("AI_ENRICHMENT_MAX_JOBS", "4")))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Output path -> conversion id of the newest job writing it
+        self._current: Dict[str, str] = {}
+        self.stats = {'started': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'superseded': 0,
+                      'sections_patched': 0, 'total_seconds': 0.0}
+
+    def start(self, conversion_id: str, output_path: str,
+              enrich: Callable[[], Awaitable[Optional[str]]],
+              notify: Callable[[Dict[str, Any]], Awaitable[None]],
+              cleanup: Optional[Callable[[], None]] = None):
+        """
+        Schedule the AI phase of a conversion (call on the event loop)
+
+        Args:
+            conversion_id: Conversion id the events are sent under
+            output_path: Stored Markdown of the first phase, patched in place
+            enrich: Coroutine function returning the AI Markdown (None if it failed)
+            notify: Coroutine function sending an event dict to the clients
+            cleanup: Called when the job is over (e.g. removes the uploaded file)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_jobs)
+        self.stats['started'] += 1
+        output_path = os.path.abspath(output_path)
+        self._current[output_path] = conversion_id
+        base_version = self._file_version(output_path)
+        task = asyncio.create_task(self._run(conversion_id, output_path, base_version, enrich, notify, cleanup))
+        self._tasks[conversion_id] = task
+
+        def finished(task: asyncio.Task):
+            self._forget(conversion_id, output_path)
+            if task.cancelled():
+                # Cancelled before _run started, so it could not clean up or report
+                self.stats['cancelled'] += 1
+                if cleanup:
+                    try:
+                        cleanup()
+                    except Exception as e:
+                        logger.warning(f"Enrichment cleanup failed for {conversion_id}: {e}")
+                asyncio.ensure_future(notify({'conversion_id': conversion_id, 'done': True, 'success': False,
+                                              'markdown': None}))
+        task.add_done_callback(finished)
+
+    def cancel(self, conversion_id: str) -> bool:
+        """
+        Cancel the AI phase of a conversion
+
+        Returns:
+            True if a running job was cancelled
+        """
+        task = self._tasks.get(conversion_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def is_pending(self, conversion_id: str) -> bool:
+        """Whether the AI phase of a conversion is still running"""
+        return conversion_id in self._tasks
+
+    def _forget(self, conversion_id: str, output_path: str):
+        self._tasks.pop(conversion_id, None)
+        if self._current.get(output_path) == conversion_id:
+            del self._current[output_path]
+
+    def _file_version(self, path: str):
+        """Modification time and size, to notice writes by other conversions"""
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    async def _run(self, conversion_id: str, output_path: str, base_version,
+                   enrich: Callable[[], Awaitable[Optional[str]]],
+                   notify: Callable[[Dict[str, Any]], Awaitable[None]],
+                   cleanup: Optional[Callable[[], None]]):
+        started = time.monotonic()
+        enriched = None
+        try:
+            async with self._semaphore:
+                try:
+                    enriched = await enrich()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"AI enrichment of {conversion_id} failed: {e}")
+
+                if enriched:
+                    changes = await asyncio.to_thread(
+                        self._patch_file, output_path, enriched, conversion_id, base_version
+                    )
+                    if changes is None:
+                        logger.info(f"AI enrichment of {conversion_id} superseded, output left unchanged")
+                        self.stats['superseded'] += 1
+                        enriched = None
+                    else:
+                        self.stats['sections_patched'] += len(changes)
+                        for change in changes:
+                            await notify({'conversion_id': conversion_id, 'done': False, **change})
+                        self.stats['completed'] += 1
+                else:
+                    self.stats['failed'] += 1
+        except asyncio.CancelledError:
+            logger.info(f"AI enrichment of {conversion_id} cancelled")
+            self.stats['cancelled'] += 1
+            enriched = None
+        except Exception as e:
+            logger.error(f"Could not apply AI enrichment of {conversion_id}: {e}")
+            self.stats['failed'] += 1
+            enriched = None
+        finally:
+            self.stats['total_seconds'] += time.monotonic() - started
+            if cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    logger.warning(f"Enrichment cleanup failed for {conversion_id}: {e}")
+
+        try:
+            await notify({'conversion_id': conversion_id, 'done': True, 'success': enriched is not None,
+                          'markdown': enriched})
+        except Exception as e:
+            logger.warning(f"Enrichment result of {conversion_id} not delivered: {e}")
+
+    def _patch_file(self, output_path: str, enriched: str, conversion_id: str,
+                    base_version) -> Optional[List[Dict[str, Any]]]:
+        """
+        Replace the stored document with the enriched one
+
+        Returns:
+            The section changes, or None if the job is no longer current
+        """
+        if self._current.get(output_path) != conversion_id or self._file_version(output_path) != base_version:
+            return None
+        with open(output_path, 'r', encoding='utf-8') as f:
+            base = f.read()
+        changes = patch_sections(base, enriched)
+        if changes:
+            # Readers (download/preview) see either the old or the new document, never a partial one
+            temp_path = f"{output_path}.enriching"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(enriched)
+            os.replace(temp_path, output_path)
+        return changes
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'running': len(self._tasks),
+            'max_jobs': self.max_jobs,
+            'avg_seconds': round(stats['total_seconds'] / stats['started'], 3) if stats['started'] else 0.0
+        })
+        return stats
+
+
+# グローバルインスタンス
+progressive_enrichment = ProgressiveEnrichment()
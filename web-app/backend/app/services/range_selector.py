@@ -0,0 +1,325 @@
+"""
+Range Selector
+Page/slide/sheet selection for partial conversion, and subset copies of documents
+"""
+import os
+import re
+import zipfile
+import logging
+from typing import Optional, Set, List, Tuple
+
+from .scratch_workspace import ScratchWorkspace
+
+logger = logging.getLogger(__name__)
+
+try:
+    import PyPDF2
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+
+# Formats that can be reduced to the selected parts
+SUBSET_FORMATS = {'pdf', 'pptx', 'xlsx'}
+
+
+class RangeSelector:
+    """Which parts of a document to convert
+
+    ``pages`` holds 1-based PDF page or PPTX slide numbers, ``sheets`` holds
+    XLSX sheet names and/or 1-based sheet positions. None means "all".
+    """
+
+    def __init__(self, pages: Optional[Set[int]] = None, sheet_names: Optional[Set[str]] = None,
+                 sheet_indexes: Optional[Set[int]] = None):
+        self.pages = pages
+        self.sheet_names = sheet_names
+        self.sheet_indexes = sheet_indexes
+
+    @classmethod
+    def parse(cls, pages: Optional[str] = None, sheets: Optional[str] = None) -> Optional["RangeSelector"]:
+        """
+        Build a selector from API parameters
+
+        Args:
+            pages: Page/slide ranges, e.g. "1-10,15"
+            sheets: Sheet names or positions, e.g. "Summary,3" or "1-2"
+
+        Returns:
+            RangeSelector, or None when nothing was specified
+
+        Raises:
+            ValueError: If a range is malformed
+        """
+        page_set = parse_number_ranges(pages) if pages and pages.strip() else None
+
+        sheet_names, sheet_indexes = None, None
+        if sheets and sheets.strip():
+            sheet_names, sheet_indexes = set(), set()
+            for token in (t.strip() for t in sheets.split(',')):
+                if not token:
+                    continue
+                if re.fullmatch(r'\d+(\s*-\s*\d+)?', token):
+                    sheet_indexes |= parse_number_ranges(token)
+                else:
+                    sheet_names.add(token)
+
+        if page_set is None and sheet_names is None:
+            return None
+        return cls(page_set, sheet_names, sheet_indexes)
+
+    def includes_page(self, page_num: int) -> bool:
+        """Whether a 1-based PDF page or PPTX slide is selected"""
+        return self.pages is None or page_num in self.pages
+
+    def includes_sheet(self, name: str, index: int) -> bool:
+        """Whether a sheet (by name or 1-based position) is selected"""
+        if self.sheet_names is None:
+            return True
+        return name in self.sheet_names or index in (self.sheet_indexes or set())
+
+    def filter_pages(self, page_numbers: List[int]) -> List[int]:
+        """Keep only selected page numbers"""
+        return [n for n in page_numbers if self.includes_page(n)]
+
+    def describe(self) -> str:
+        """Short human readable form for logs and Markdown"""
+        parts = []
+        if self.pages is not None:
+            parts.append(f"pages {format_number_ranges(self.pages)}")
+        if self.sheet_names is not None:
+            sheets = sorted(self.sheet_names) + [str(i) for i in sorted(self.sheet_indexes or [])]
+            parts.append(f"sheets {', '.join(sheets)}")
+        return "; ".join(parts)
+
+
+def parse_number_ranges(spec: str) -> Set[int]:
+    """
+    Parse "1-3,7,10-12" into {1, 2, 3, 7, 10, 11, 12}
+
+    Raises:
+        ValueError: If the spec is malformed or contains numbers below 1
+    """
+    numbers = set()
+    for token in (t.strip() for t in spec.split(',')):
+        if not token:
+            continue
+        match = re.fullmatch(r'(\d+)(?:\s*-\s*(\d+))?', token)
+        if not match:
+            raise ValueError(f"Invalid range: {token}")
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid range: {token}")
+        if end - start > 100000:
+            raise ValueError(f"Range too large: {token}")
+        numbers.update(range(start, end + 1))
+    if not numbers:
+        raise ValueError(f"Empty range: {spec}")
+    return numbers
+
+
+def format_number_ranges(numbers: Set[int]) -> str:
+    """Format {1, 2, 3, 7} as "1-3,7\""""
+    ranges = []
+    for n in sorted(numbers):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def create_subset(file_path: str, selector: Optional[RangeSelector],
+                  workspace: ScratchWorkspace) -> Tuple[str, Optional[List[int]]]:
+    """
+    Write a copy of the document that contains only the selected parts
+
+    MarkItDown (and the libraries under it) then never parse the rest. The
+    copy keeps the original file name, inside the workspace. Pages and slides
+    of the copy are numbered 1..k; pass the returned page map to
+    restore_page_numbers so the output uses the original numbers.
+
+    Args:
+        file_path: Path to the original document
+        selector: Range selection (None returns file_path unchanged)
+        workspace: Scratch workspace of the conversion job
+
+    Returns:
+        Tuple of (path of the subset copy or file_path when no subset applies,
+        original page/slide number of each page of the copy or None)
+
+    Raises:
+        ValueError: If the selection matches nothing in the document
+    """
+    ext = os.path.splitext(file_path)[1].lower()[1:]
+    if selector is None or ext not in SUBSET_FORMATS:
+        return file_path, None
+
+    subset_path = workspace.file_path(os.path.basename(file_path))
+    page_map = None
+    if ext == 'pdf':
+        if selector.pages is None or not PYPDF2_AVAILABLE:
+            return file_path, None
+        page_map = _subset_pdf(file_path, subset_path, selector)
+    elif ext == 'pptx':
+        if selector.pages is None:
+            return file_path, None
+        page_map = _subset_pptx(file_path, subset_path, selector)
+    elif ext == 'xlsx':
+        if selector.sheet_names is None:
+            return file_path, None
+        _subset_xlsx(file_path, subset_path, selector)
+
+    workspace.track(subset_path)
+    logger.info(f"Converting {selector.describe()} of {os.path.basename(file_path)}")
+    return subset_path, page_map
+
+
+# Page/slide numbers the pipeline writes into Markdown: MarkItDown's slide
+# markers and the image location lines of DocumentProcessor
+_SLIDE_MARKER = re.compile(r'(<!-- Slide number: )(\d+)( -->)')
+_LOCATION_LINE = re.compile(r'^\*Locations?\b.*$', re.M)
+_LOCATION_NUMBER = re.compile(r'\b(Page|Slide) (\d+)\b')
+
+
+def restore_page_numbers(markdown: str, page_map: Optional[List[int]]) -> str:
+    """
+    Renumber pages/slides of Markdown converted from a subset copy to the original numbers
+
+    Args:
+        markdown: Markdown produced from the subset copy
+        page_map: Page map returned by create_subset (None leaves the text unchanged)
+
+    Returns:
+        Markdown with original page and slide numbers
+    """
+    if not page_map:
+        return markdown
+
+    def original(number: str) -> str:
+        n = int(number)
+        return str(page_map[n - 1]) if 1 <= n <= len(page_map) else number
+
+    markdown = _SLIDE_MARKER.sub(lambda m: m.group(1) + original(m.group(2)) + m.group(3), markdown)
+    return _LOCATION_LINE.sub(
+        lambda line: _LOCATION_NUMBER.sub(lambda m: f"{m.group(1)} {original(m.group(2))}", line.group(0)),
+        markdown
+    )
+
+
+def _subset_pdf(file_path: str, subset_path: str, selector: RangeSelector) -> List[int]:
+    """Copy the selected pages; PyPDF2 only resolves objects those pages reference"""
+    reader = PyPDF2.PdfReader(file_path)
+    writer = PyPDF2.PdfWriter()
+    kept = []
+    for page_num in range(1, len(reader.pages) + 1):
+        if selector.includes_page(page_num):
+            writer.add_page(reader.pages[page_num - 1])
+            kept.append(page_num)
+    if not writer.pages:
+        raise ValueError(f"Selected pages do not exist (document has {len(reader.pages)} pages)")
+    with open(subset_path, 'wb') as f:
+        writer.write(f)
+    return kept
+
+
+# The XML is edited in place rather than re-serialized so namespace prefixes
+# and markup-compatibility attributes stay exactly as the producer wrote them.
+_SLIDE_ID = re.compile(rb'<(?:\w+:)?sldId\b[^>]*?/>')
+_SHEET = re.compile(rb'<(?:\w+:)?sheet\b[^>]*?/>')
+_LOCAL_DEFINED_NAME = re.compile(rb'<(?:\w+:)?definedName\b[^>]*\blocalSheetId="\d+"[^>]*>.*?</(?:\w+:)?definedName>', re.S)
+_REL_ID = re.compile(rb'\br:id="([^"]+)"')
+_NAME = re.compile(rb'\bname="([^"]*)"')
+
+
+def _subset_pptx(file_path: str, subset_path: str, selector: RangeSelector) -> List[int]:
+    """Drop unselected slides from sldIdLst and their presentation relationships"""
+    state = {'slide': 0, 'kept': [], 'dropped': set()}
+
+    def keep_slide(match):
+        state['slide'] += 1
+        if selector.includes_page(state['slide']):
+            state['kept'].append(state['slide'])
+            return match.group(0)
+        rel_id = _REL_ID.search(match.group(0))
+        if rel_id:
+            state['dropped'].add(rel_id.group(1))
+        return b''
+
+    def edit(name: str, data: bytes) -> bytes:
+        if name == 'ppt/presentation.xml':
+            data = _SLIDE_ID.sub(keep_slide, data)
+            if not state['kept']:
+                raise ValueError(f"Selected slides do not exist (presentation has {state['slide']} slides)")
+        return data
+
+    def edit_rels(name: str, data: bytes) -> bytes:
+        # Without the relationship, python-pptx never loads the slide part
+        if name == 'ppt/_rels/presentation.xml.rels':
+            data = _drop_relationships(data, state['dropped'])
+        return data
+
+    _rewrite_zip(file_path, subset_path, [edit, edit_rels], first='ppt/presentation.xml')
+    return state['kept']
+
+
+def _subset_xlsx(file_path: str, subset_path: str, selector: RangeSelector):
+    """Drop unselected sheets from workbook.xml"""
+    state = {'sheet': 0, 'kept': 0}
+
+    def keep_sheet(match):
+        state['sheet'] += 1
+        name = _NAME.search(match.group(0))
+        sheet_name = _unescape(name.group(1).decode('utf-8')) if name else ""
+        if selector.includes_sheet(sheet_name, state['sheet']):
+            state['kept'] += 1
+            return match.group(0)
+        return b''
+
+    def edit(name: str, data: bytes) -> bytes:
+        if name == 'xl/workbook.xml':
+            data = _SHEET.sub(keep_sheet, data)
+            if not state['kept']:
+                raise ValueError(f"Selected sheets do not exist (workbook has {state['sheet']} sheets)")
+            # Sheet positions changed: drop sheet-local names and reset the active tab
+            data = _LOCAL_DEFINED_NAME.sub(b'', data)
+            data = re.sub(rb'\b(activeTab|firstSheet)="\d+"', rb'\1="0"', data)
+        return data
+
+    _rewrite_zip(file_path, subset_path, [edit], first='xl/workbook.xml')
+
+
+def _drop_relationships(data: bytes, rel_ids: Set[bytes]) -> bytes:
+    """Remove <Relationship> elements with the given Ids"""
+    def keep(match):
+        rel_id = re.search(rb'\bId="([^"]+)"', match.group(0))
+        return b'' if rel_id and rel_id.group(1) in rel_ids else match.group(0)
+    return re.sub(rb'<Relationship\b[^>]*?/>', keep, data)
+
+
+def _rewrite_zip(file_path: str, subset_path: str, edits, first: str):
+    """Copy an OOXML package, passing each entry through the edit functions
+
+    ``first`` is processed before everything else because later edits depend
+    on what it removed.
+    """
+    with zipfile.ZipFile(file_path) as src, zipfile.ZipFile(subset_path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        edited = {}
+        if first in src.namelist():
+            edited[first] = src.read(first)
+            for edit in edits:
+                edited[first] = edit(first, edited[first])
+
+        # Keep the original entry order ([Content_Types].xml first)
+        for info in src.infolist():
+            data = edited.get(info.filename)
+            if data is None:
+                data = src.read(info.filename)
+                for edit in edits:
+                    data = edit(info.filename, data)
+            dst.writestr(info, data)
+
+
+def _unescape(text: str) -> str:
+    return (text.replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"')
+            .replace('&apos;', "'").replace('&amp;', '&'))
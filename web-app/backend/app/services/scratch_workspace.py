@@ -0,0 +1,145 @@
+"""
+Scratch Workspace
+Per-conversion temporary directory with a byte quota and guaranteed cleanup
+"""
+import os
+import uuid
+import shutil
+import tempfile
+import threading
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ScratchQuotaExceeded(Exception):
+    """Raised when a job writes more scratch data than its quota allows"""
+
+
+class ScratchWorkspace:
+    """Private scratch directory for one conversion job
+
+    Every stage of a conversion (image extraction, PDF rasterization, OCR
+    temp files, legacy format conversion) writes into the same workspace, so
+    names never collide between concurrent jobs and one ``cleanup()`` removes
+    everything. The directory is created under ``SCRATCH_DIR`` when it is set
+    (e.g. a tmpfs such as /dev/shm) and under the system temp dir otherwise.
+
+    Usage:
+        with ScratchWorkspace(conversion_id) as workspace:
+            path = workspace.file_path("page_1.png")
+    """
+
+    def __init__(self, job_id: Optional[str] = None, quota_bytes: Optional[int] = None, base_dir: Optional[str] = None):
+        """
+        Create the workspace directory
+
+        Args:
+            job_id: Conversion ID used in the directory name
+            quota_bytes: Maximum bytes the job may write (env: SCRATCH_QUOTA_MB, default 512MB)
+            base_dir: Parent directory (env: SCRATCH_DIR, default: system temp dir)
+        """
+        self.job_id = job_id or uuid.uuid4().hex
+        self.quota_bytes = quota_bytes or int(float(os.getenv("SCRATCH_QUOTA_MB", "512")) * 1024 * 1024)
+        self.used_bytes = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        base_dir = base_dir or os.getenv("SCRATCH_DIR") or tempfile.gettempdir()
+        try:
+            os.makedirs(base_dir, exist_ok=True)
+            self.path = tempfile.mkdtemp(prefix=f"markitdown_{self.job_id}_", dir=base_dir)
+        except OSError as e:
+            logger.warning(f"Scratch dir {base_dir} unusable, falling back to system temp dir: {e}")
+            self.path = tempfile.mkdtemp(prefix=f"markitdown_{self.job_id}_")
+
+    def file_path(self, name: str) -> str:
+        """
+        Get a path for a file inside the workspace
+
+        Args:
+            name: File name (no directories)
+
+        Returns:
+            Absolute path inside the workspace
+        """
+        return os.path.join(self.path, os.path.basename(name))
+
+    def subdir(self, name: str) -> str:
+        """
+        Create (if needed) and return a subdirectory of the workspace
+
+        Args:
+            name: Subdirectory name
+
+        Returns:
+            Absolute path of the subdirectory
+        """
+        path = os.path.join(self.path, os.path.basename(name))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def charge(self, nbytes: int):
+        """
+        Account for bytes written to the workspace
+
+        Args:
+            nbytes: Number of bytes
+
+        Raises:
+            ScratchQuotaExceeded: If the job's quota is exceeded
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Scratch workspace for job {self.job_id} has been cleaned up")
+            self.used_bytes += nbytes
+            if self.used_bytes > self.quota_bytes:
+                raise ScratchQuotaExceeded(
+                    f"Scratch quota exceeded for job {self.job_id}: "
+                    f"{self.used_bytes / 1024 / 1024:.1f}MB > {self.quota_bytes / 1024 / 1024:.1f}MB"
+                )
+
+    def track(self, path: str) -> str:
+        """
+        Charge the size of a file that a library has already written into the workspace
+
+        Args:
+            path: Path of the written file
+
+        Returns:
+            The same path
+        """
+        self.charge(os.path.getsize(path))
+        return path
+
+    def write_bytes(self, name: str, data: bytes) -> str:
+        """
+        Write bytes to a new file in the workspace after checking the quota
+
+        Args:
+            name: File name
+            data: File contents
+
+        Returns:
+            Path of the written file
+        """
+        self.charge(len(data))
+        path = self.file_path(name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def cleanup(self):
+        """Remove the workspace and everything in it"""
+        with self._lock:
+            self._closed = True
+        shutil.rmtree(self.path, ignore_errors=True)
+        logger.debug(f"Removed scratch workspace {self.path} ({self.used_bytes / 1024:.1f}KB used)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
@@ -0,0 +1,149 @@
+"""
+Vision Payload
+Downscales and re-encodes images before they are sent to a vision model
+"""
+import io
+import os
+import base64
+import logging
+import threading
+from typing import Dict, Any, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Formats the vision API accepts as-is
+PASSTHROUGH_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+
+
+class VisionPayload:
+    """Prepare images as compact data URLs for the vision API
+
+    With ``detail: high`` the model fits an image into 2048x2048 and then
+    scales its short side to 768px before tiling it, so anything larger only
+    costs upload bytes. Images are downscaled to that size and re-encoded as
+    JPEG or WebP. Images that fit in 512x512 are sent with ``detail: low``,
+    which gives the model the same pixels for a fraction of the tokens.
+    Small files that are already in an accepted format and within the size
+    limits are passed through with their real MIME type.
+    """
+
+    LOW_DETAIL_SIZE = 512
+
+    def __init__(self):
+        self.max_long_side = int(os.getenv("VISION_MAX_LONG_SIDE", "2048"))
+        self.max_short_side = int(os.getenv("VISION_MAX_SHORT_SIDE", "768"))
+        self.format = os.getenv("VISION_FORMAT", "jpeg").lower()
+        if self.format not in ('jpeg', 'webp'):
+            logger.warning(f"Unknown VISION_FORMAT '{self.format}', using jpeg")
+            self.format = 'jpeg'
+        self.quality = int(os.getenv("VISION_QUALITY", "85"))
+        # auto: low for small images, high otherwise; or force low / high
+        self.detail = os.getenv("VISION_DETAIL", "auto").lower()
+        # Files up to this size are sent unchanged when no resize is needed
+        self.passthrough_bytes = int(os.getenv("VISION_PASSTHROUGH_KB", "256")) * 1024
+
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def signature(self) -> str:
+        """Settings that change the payload, for LLM cache keys"""
+        return f"{self.max_long_side}x{self.max_short_side}:{self.format}:{self.quality}:{self.detail}"
+
+    def prepare_file(self, image_path: str) -> Tuple[str, str]:
+        """
+        Prepare an image file for the vision API
+
+        Args:
+            image_path: Path to the image
+
+        Returns:
+            Tuple of (data URL, detail level)
+        """
+        with open(image_path, 'rb') as f:
+            return self.prepare_bytes(f.read())
+
+    def prepare_bytes(self, data: bytes) -> Tuple[str, str]:
+        """
+        Prepare image bytes for the vision API
+
+        Args:
+            data: Encoded image
+
+        Returns:
+            Tuple of (data URL, detail level)
+        """
+        with Image.open(io.BytesIO(data)) as img:
+            source_format = img.format
+            width, height = img.size
+            target = self._target_size(width, height)
+            detail = self._detail_for(*target)
+
+            if (target == (width, height) and source_format in PASSTHROUGH_FORMATS
+                    and len(data) <= self.passthrough_bytes):
+                payload, mime = data, PASSTHROUGH_FORMATS[source_format]
+            else:
+                if source_format == 'JPEG' and target != (width, height):
+                    # Let the JPEG decoder downscale by a power of two first
+                    img.draft('RGB', target)
+                payload, mime = self._encode(img, target)
+
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(payload)
+
+        return f"data:{mime};base64,{base64.b64encode(payload).decode('utf-8')}", detail
+
+    def image_content(self, data_url: str, detail: str) -> Dict[str, Any]:
+        """Chat message content part for a prepared image"""
+        return {"type": "image_url", "image_url": {"url": data_url, "detail": detail}}
+
+    def _target_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Largest size within the long/short side limits, never upscaled"""
+        long_side, short_side = max(width, height), min(width, height)
+        scale = min(1.0, self.max_long_side / long_side, self.max_short_side / short_side)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _detail_for(self, width: int, height: int) -> str:
+        if self.detail in ('low', 'high'):
+            return self.detail
+        return 'low' if max(width, height) <= self.LOW_DETAIL_SIZE else 'high'
+
+    def _encode(self, img: Image.Image, size: Tuple[int, int]) -> Tuple[bytes, str]:
+        """Resize and encode as JPEG or WebP"""
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Flatten transparency onto white; black text on a transparent PNG stays readable
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[-1])
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        if self.format == 'webp':
+            img.save(buffer, 'WEBP', quality=self.quality, method=4)
+            return buffer.getvalue(), 'image/webp'
+        img.save(buffer, 'JPEG', quality=self.quality, optimize=True)
+        return buffer.getvalue(), 'image/jpeg'
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Upload size reduction so far"""
+        return {
+            'images': self.images,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'reduction': 1 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0,
+            'settings': self.signature
+        }
+
+
+# グローバルインスタンス
+vision_payload = VisionPayload()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+OpenAI互換のローカルモックサーバー（オフライン負荷試験用）
+バックエンドが使うチャット補完APIのサブセットを、決定的な応答・遅延分布・エラー注入付きで提供します
+
+使い方:
+    python mock_openai_server.py --port 8099 --latency-ms 800 --latency-dist lognormal --rate-limit-rate 0.05
+
+    # バックエンド側（.env）
+    OPENAI_BASE_URL=http://localhost:8099/v1
+    OPENAI_API_KEY=sk-mock
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 決定的な応答の元になる文（リクエスト内容のハッシュで選ぶ）
+CANNED_SENTENCES = [
+    "The image shows a bar chart comparing quarterly revenue across four regions.",
+    "This is a screenshot of a settings dialog with several labelled input fields.",
+    "The diagram illustrates a three-stage processing pipeline connected by arrows.",
+    "A photo of a whiteboard with handwritten notes and a simple flow chart.",
+    "The table lists product names, unit prices and stock levels.",
+    "The document describes the project schedule, milestones and responsible teams.",
+    "A line graph shows a steady upward trend over twelve months.",
+    "The slide summarizes key findings in four bullet points.",
+]
+
+
+class MockConfig:
+    """Latency, error injection and response settings from the command line"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency_ms = args.latency_ms
+        self.latency_jitter_ms = args.latency_jitter_ms
+        self.latency_dist = args.latency_dist
+        self.token_ms = args.token_ms
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.retry_after = args.retry_after
+        self.response_words = args.response_words
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'streamed': 0, 'errors_500': 0, 'errors_429': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def latency(self) -> float:
+        """Seconds until the response (or first token) is sent"""
+        mean = self.latency_ms / 1000
+        jitter = self.latency_jitter_ms / 1000
+        with self.lock:
+            if self.latency_dist == 'uniform':
+                value = self.rng.uniform(mean - jitter, mean + jitter)
+            elif self.latency_dist == 'normal':
+                value = self.rng.gauss(mean, jitter)
+            elif self.latency_dist == 'lognormal':
+                # Long tail like real API latencies; median is latency_ms
+                sigma = jitter / mean if mean else 0.5
+                value = self.rng.lognormvariate(0, sigma) * mean
+            else:
+                value = mean
+        return max(0.0, value)
+
+    def injected_error(self):
+        """(status, message) of an injected failure, or None"""
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return 429, "Rate limit reached (injected by mock server)"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, "Internal server error (injected by mock server)"
+        return None
+
+    def count(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+
+def request_digest(body: Dict[str, Any]) -> str:
+    """Stable hash of what determines the answer (model and messages)"""
+    payload = json.dumps({'model': body.get('model'), 'messages': body.get('messages')}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def count_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    tokens = 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get('type') == 'text':
+                tokens += len(part.get('text', '')) // 4
+            elif part.get('type') == 'image_url':
+                tokens += 85 if part.get('image_url', {}).get('detail') == 'low' else 765
+    return tokens
+
+
+def count_images(messages: List[Dict[str, Any]]) -> int:
+    return sum(1 for message in messages if isinstance(message.get('content'), list)
+               for part in message['content'] if part.get('type') == 'image_url')
+
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    texts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(part.get('text', '') for part in content or [] if part.get('type') == 'text')
+    return "\n".join(texts)
+
+
+def canned_text(digest: str, words: int, index: int = 0) -> str:
+    """Deterministic response text: same request, same answer"""
+    seed = int(digest[:16], 16) + index
+    rng = random.Random(seed)
+    sentences = []
+    while sum(len(s.split()) for s in sentences) < words:
+        sentences.append(rng.choice(CANNED_SENTENCES))
+    return f"[mock {digest[:8]}] " + " ".join(sentences)
+
+
+def build_answer(body: Dict[str, Any], config: MockConfig) -> str:
+    digest = request_digest(body)
+    messages = body.get('messages', [])
+    words = min(config.response_words, max(8, (body.get('max_tokens') or 500) * 3 // 4))
+    if (body.get('response_format') or {}).get('type') == 'json_object':
+        if '"descriptions"' in prompt_text(messages):
+            # Batched vision request: one description per image
+            images = max(1, count_images(messages))
+            return json.dumps({'descriptions': [
+                {'image': i, 'description': canned_text(digest, words, i)} for i in range(1, images + 1)
+            ]})
+        # Structured single-image analysis
+        is_chart = int(digest[16], 16) % 2 == 0
+        return json.dumps({
+            'description': canned_text(digest, words),
+            'visible_text': f"Mock label {digest[:4]}",
+            'content_type': 'chart' if is_chart else 'photo',
+            'chart': {
+                'type': 'bar',
+                'columns': ['label', 'value'],
+                'rows': [[f"Q{i}", str(int(digest[i * 2:i * 2 + 2], 16))] for i in range(1, 5)],
+                'insights': 'Values vary between quarters.'
+            } if is_chart else None
+        })
+    return canned_text(digest, words)
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI API")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {'object': 'list', 'data': [
+            {'id': model, 'object': 'model', 'created': 0, 'owned_by': 'mock'}
+            for model in ('gpt-4o-mini', 'gpt-3.5-turbo')
+        ]}
+
+    @app.get("/_stats")
+    async def stats():
+        with config.lock:
+            return dict(config.stats)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.count(requests=1)
+
+        await asyncio.sleep(config.latency())
+        error = config.injected_error()
+        if error:
+            status, message = error
+            config.count(**{f'errors_{status}': 1})
+            headers = {'retry-after': str(config.retry_after)} if status == 429 else {}
+            error_type = 'rate_limit_exceeded' if status == 429 else 'server_error'
+            return JSONResponse(status_code=status, headers=headers,
+                                content={'error': {'message': message, 'type': error_type, 'code': error_type}})
+
+        answer = build_answer(body, config)
+        prompt_tokens = count_prompt_tokens(body.get('messages', []))
+        completion_tokens = max(1, len(answer) // 4)
+        config.count(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-mock-{request_digest(body)[:12]}"
+        model = body.get('model', 'gpt-4o-mini')
+
+        if not body.get('stream'):
+            return {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                             'finish_reason': 'stop'}],
+                'usage': usage
+            }
+
+        config.count(streamed=1)
+        include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+
+        async def events():
+            def event(choices: List[Dict[str, Any]], **extra) -> str:
+                data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                        'model': model, 'choices': choices}
+                data.update(extra)
+                return f"data: {json.dumps(data)}\n\n"
+
+            def delta(content: Dict[str, Any], finish_reason=None) -> str:
+                return event([{'index': 0, 'delta': content, 'finish_reason': finish_reason}])
+
+            yield delta({'role': 'assistant', 'content': ''})
+            words = answer.split(' ')
+            for i, word in enumerate(words):
+                await asyncio.sleep(config.token_ms / 1000)
+                yield delta({'content': word if i == len(words) - 1 else word + ' '})
+            yield delta({}, finish_reason='stop')
+            if include_usage:
+                # Like the real API: a final chunk with no choices carries the usage
+                yield event([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=500, help="Mean (or median for lognormal) latency")
+    parser.add_argument("--latency-jitter-ms", type=float, default=200, help="Spread of the latency distribution")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--token-ms", type=float, default=15, help="Delay between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--response-words", type=int, default=60, help="Approximate words per answer")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and error injection")
+    args = parser.parse_args()
+
+    if args.error_rate + args.rate_limit_rate > 1:
+        print("--error-rate + --rate-limit-rate must not exceed 1")
+        return 1
+
+    config = MockConfig(args)
+    print(f"Mock OpenAI API on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency_dist} {args.latency_ms:.0f}ms, 429 {args.rate_limit_rate:.0%}, "
+          f"500 {args.error_rate:.0%})")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
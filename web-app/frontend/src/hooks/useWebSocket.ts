@@ -1,7 +1,7 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
 
 interface ProgressData {
-  type: 'progress' | 'batch_progress' | 'completion';
+  type: 'progress' | 'batch_progress' | 'completion' | 'stream' | 'enrichment';
   conversion_id?: string;
   batch_id?: string;
   progress?: number;
@@ -11,21 +11,59 @@ interface ProgressData {
   files?: Record<string, any>;
   success?: boolean;
   error_message?: string;
+  section?: string;
+  delta?: string;
+  done?: boolean;
+  action?: 'update' | 'insert' | 'remove';
+  index?: number;
+  markdown?: string | null;
+}
+
+// Background AI enrichment of a progressive conversion
+// (sections patched so far; markdown is the whole enriched document once done)
+export interface EnrichmentState {
+  sections: string[];
+  done: boolean;
+  success: boolean;
+  markdown: string | null;
+}
+
+// Streamed AI output of one conversion, per section
+// ("enhanced_markdown", "enhanced_markdown:2", "image_description", "document_analysis")
+export interface StreamSection {
+  text: string;
+  done: boolean;
 }
 
 interface UseWebSocketReturn {
   isConnected: boolean;
   progressData: Record<string, ProgressData>;
+  streamData: Record<string, Record<string, StreamSection>>;
+  enrichmentData: Record<string, EnrichmentState>;
   connect: () => void;
   disconnect: () => void;
   clearProgress: (id: string) => void;
 }
 
+// Join the streamed sections of a conversion in document order (chunk parts by number)
+export const streamText = (sections: Record<string, StreamSection> = {}): string => {
+  const order = (name: string) => {
+    const part = name.split(':')[1];
+    return part ? parseInt(part, 10) : 0;
+  };
+  return Object.keys(sections)
+    .sort((a, b) => a.split(':')[0].localeCompare(b.split(':')[0]) || order(a) - order(b))
+    .map(name => sections[name].text)
+    .join('\n\n');
+};
+
 export const useWebSocket = (url: string = 'ws://localhost:8000/ws'): UseWebSocketReturn => {
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [progressData, setProgressData] = useState<Record<string, ProgressData>>({});
+  const [streamData, setStreamData] = useState<Record<string, Record<string, StreamSection>>>({});
+  const [enrichmentData, setEnrichmentData] = useState<Record<string, EnrichmentState>>({});
 
   const connect = useCallback(() => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
@@ -73,6 +111,31 @@ export const useWebSocket = (url: string = 'ws://localhost:8000/ws'): UseWebSock
                 [data.conversion_id!]: data
               };
             });
+          } else if (data.type === 'stream' && data.conversion_id && data.section) {
+            setStreamData(prev => {
+              const sections = prev[data.conversion_id!] || {};
+              const current = sections[data.section!] || { text: '', done: false };
+              return {
+                ...prev,
+                [data.conversion_id!]: {
+                  ...sections,
+                  [data.section!]: {
+                    text: current.text + (data.delta || ''),
+                    done: !!data.done
+                  }
+                }
+              };
+            });
+          } else if (data.type === 'enrichment' && data.conversion_id) {
+            setEnrichmentData(prev => {
+              const current = prev[data.conversion_id!] || { sections: [], done: false, success: false, markdown: null };
+              return {
+                ...prev,
+                [data.conversion_id!]: data.done
+                  ? { ...current, done: true, success: !!data.success, markdown: data.markdown || null }
+                  : { ...current, sections: [...current.sections, data.section || ''] }
+              };
+            });
           } else if (data.type === 'batch_progress' && data.batch_id) {
             setProgressData(prev => ({
               ...prev,
@@ -142,6 +205,16 @@ export const useWebSocket = (url: string = 'ws://localhost:8000/ws'): UseWebSock
       delete newData[id];
       return newData;
     });
+    setStreamData(prev => {
+      const newData = { ...prev };
+      delete newData[id];
+      return newData;
+    });
+    setEnrichmentData(prev => {
+      const newData = { ...prev };
+      delete newData[id];
+      return newData;
+    });
   }, []);
 
   useEffect(() => {
@@ -155,6 +228,8 @@ export const useWebSocket = (url: string = 'ws://localhost:8000/ws'): UseWebSock
   return {
     isConnected,
     progressData,
+    streamData,
+    enrichmentData,
     connect,
     disconnect,
     clearProgress
@@ -4,7 +4,7 @@ import { convertFiles, convertUrl, cancelConversion } from '../services/api';
 import { ConversionResult } from '../types';
 import ProgressBar from '../components/ProgressBar';
 import PreviewModal from '../components/PreviewModal';
-import { useWebSocket } from '../hooks/useWebSocket';
+import { useWebSocket, streamText } from '../hooks/useWebSocket';
 
 interface StatCardProps {
   icon: string;
@@ -91,7 +91,7 @@ const Dashboard: React.FC = () => {
   const fileInputRef = useRef<HTMLInputElement>(null);
   
   // WebSocket for progress updates
-  const { isConnected, progressData } = useWebSocket();
+  const { isConnected, progressData, streamData, enrichmentData, clearProgress } = useWebSocket();
   
   // Update current conversion ID when progress data changes
   React.useEffect(() => {
@@ -104,6 +104,26 @@ const Dashboard: React.FC = () => {
     }
   }, [progressData, isConverting, currentConversionId]);
 
+  // Replace the first-phase Markdown once the background AI enrichment is done
+  React.useEffect(() => {
+    setConversionResults(prev => {
+      let changed = false;
+      const next = prev.map(result => {
+        const enrichment = enrichmentData[result.id];
+        if (!result.enrichment_pending || !enrichment?.done) {
+          return result;
+        }
+        changed = true;
+        return {
+          ...result,
+          enrichment_pending: false,
+          markdown_content: enrichment.markdown || result.markdown_content
+        };
+      });
+      return changed ? next : prev;
+    });
+  }, [enrichmentData, conversionResults]);
+
   const handleDragOver = (e: React.DragEvent) => {
     e.preventDefault();
     setIsDragging(true);
@@ -187,6 +207,19 @@ const Dashboard: React.FC = () => {
     }
   };
 
+  // Stop the background AI enrichment of a result; the Markdown without AI stays
+  const handleCancelEnrichment = async (conversionId: string) => {
+    try {
+      await cancelConversion(conversionId);
+    } catch (error) {
+      console.error('Failed to cancel AI enrichment:', error);
+    }
+    setConversionResults(prev => prev.map(result =>
+      result.id === conversionId ? { ...result, enrichment_pending: false } : result
+    ));
+    clearProgress(conversionId);
+  };
+
   const handleCancelConversion = async () => {
     // Cancel using the current conversion ID if available
     if (currentConversionId) {
@@ -405,6 +438,10 @@ const Dashboard: React.FC = () => {
                     currentStep="変換処理を開始中..."
                   />
                 )}
+                {/* AI output as it is generated */}
+                {currentConversionId && streamData[currentConversionId] && (
+                  <pre className="stream-preview">{streamText(streamData[currentConversionId])}</pre>
+                )}
                 {/* Cancel button during conversion */}
                 <button 
                   className="btn btn-danger cancel-btn" 
@@ -540,6 +577,24 @@ const Dashboard: React.FC = () => {
                       処理時間: {result.processing_time?.toFixed(2)}秒 | 
                       文字数: {result.markdown_content.length}
                     </p>
+                    {result.enrichment_pending && (
+                      <p className="result-info">
+                        <i className="fas fa-spinner fa-spin"></i> AI処理中...
+                        {enrichmentData[result.id]?.sections.length ? ` (${enrichmentData[result.id].sections.length}セクション更新)` : ''}
+                      </p>
+                    )}
+                    {result.enrichment_pending && (
+                      <button
+                        className="btn btn-danger cancel-btn"
+                        onClick={() => handleCancelEnrichment(result.id)}
+                      >
+                        <i className="fas fa-stop-circle"></i> AI処理を中止
+                      </button>
+                    )}
+                    {/* AI output of the background enrichment as it is generated */}
+                    {result.enrichment_pending && streamData[result.id] && (
+                      <pre className="stream-preview">{streamText(streamData[result.id])}</pre>
+                    )}
                   </>
                 )}
                 {result.status === 'completed' && result.output_file && (
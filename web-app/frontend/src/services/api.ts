@@ -37,8 +37,9 @@ export const convertFiles = async (files: File[], useAiMode: boolean): Promise<C
       const formData = new FormData();
       formData.append('file', regularFiles[0]);
       
+      // AIモードではAIなしの結果を先に受け取り、AI結果はWebSocketで反映（段階的変換）
       const response = await api.post<ConversionResult>(
-        `/api/v1/conversion/upload?use_ai_mode=${useAiMode}`,
+        `/api/v1/conversion/upload?use_ai_mode=${useAiMode}${useAiMode ? '&progressive=true' : ''}`,
         formData,
         {
           headers: {
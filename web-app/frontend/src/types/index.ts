@@ -8,6 +8,7 @@ export interface ConversionResult {
   markdown_content?: string;
   created_at: string;
   completed_at?: string;
+  enrichment_pending?: boolean;
 }
 
 export interface BatchConversionResult {